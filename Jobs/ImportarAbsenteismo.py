@@ -6,38 +6,66 @@ This script fetches absenteeism data from an external API and imports it into th
 It's designed to run independently of the main application.
 
 Usage:
-    python ImportarAbsenteismo.py [--months MONTHS] [--empresa CODIGO]
+    python ImportarAbsenteismo.py [--months MONTHS] [--empresa CODIGO] [--workers N] [--resume]
 
 Options:
     --months MONTHS   Number of months to look back (default: 6)
     --empresa CODE    Import absenteeism for a specific company code
+    --workers N       Number of companies processed concurrently (default: IMPORT_WORKERS or 1)
+    --resume          Skip company intervals completed by the previous run (see checkpoints.py)
+
+Date intervals:
+    Each company's period is split into windows sized from its stored volume
+    (atestados per day) so a window holds about SOC_INTERVAL_TARGET_ROWS rows.
+    Each response is streamed and saved in chunks of SOC_SAVE_CHUNK_ROWS, so
+    a large window costs no extra memory; a window that times out is split
+    in half and fetched again.
 
 Environment variables:
     SOC_API_URL - Base URL for the SOC API (default: https://ws1.soc.com.br/WebSoc)
     SOC_EMPRESA - Enterprise code for API calls
     SOC_CODIGO - Code for API authentication
     SOC_CHAVE - API key for authentication
+    SOC_API_CONCURRENCY - Date intervals fetched in parallel (default: 4)
+    SOC_API_RATE - API requests per second across all threads (default: 3)
+    IMPORT_WORKERS - Default for --workers (default: 1)
+    SOC_INTERVAL_TARGET_ROWS - Rows a planned window should hold (default: 2000)
+    SOC_SAVE_CHUNK_ROWS - Records saved per database batch (default: 1000)
+    SOC_INTERVAL_MIN_DAYS / SOC_INTERVAL_MAX_DAYS - Window size bounds (default: 1 / 90)
     DATABASE_URL or EXTERNAL_URL_DB - PostgreSQL connection string
 """
 
 import os
 import sys
-import json
 import logging
 import argparse
-import requests
 import time
-from urllib.parse import quote
 from datetime import datetime, date, timedelta
+from itertools import islice
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from pathlib import Path
+import requests
+
+import api_client
+from bulk_loader import copy_upsert_isolated
+from concurrency import IMPORT_WORKERS, TokenBucket, fetch_concurrently, process_companies
+from intervals import plan_date_intervals, subtract_intervals
+from checkpoints import (
+    STATUS_COMPLETED, STATUS_FAILED, load_completed_units, record_checkpoint, reset_checkpoints
+)
+
+# SQL shared with the Django app (absenteismo.regras has no Django imports)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from absenteismo.regras import ATUALIZAR_RESUMOS, normalizar_cid
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description="Import absenteeism data from SOC API")
 parser.add_argument("--months", type=int, default=6, help="Number of months to look back (default: 6)")
 parser.add_argument("--empresa", type=str, help="Import absenteeism for specific company code")
+parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="Number of companies processed concurrently")
+parser.add_argument("--resume", action="store_true", help="Skip intervals completed by the previous run and retry only the rest")
 args = parser.parse_args()
 
 # Get the script's directory path
@@ -75,6 +103,9 @@ SOC_EMPRESA = os.getenv('SOC_EMPRESA', '423')
 SOC_CODIGO = os.getenv('SOC_CODIGO', '183868')
 SOC_CHAVE = os.getenv('SOC_CHAVE', '6dff7b9a8a635edaddf5')
 
+# Streamed records are saved in batches of this size
+SAVE_CHUNK_ROWS = int(os.getenv('SOC_SAVE_CHUNK_ROWS', '1000'))
+
 # Database configuration - handle multiple possible env var names
 DATABASE_URL = os.getenv('DATABASE_URL') or os.getenv('EXTERNAL_URL_DB')
 if not DATABASE_URL:
@@ -101,23 +132,11 @@ else:
     logger.error("No database URL configured")
     sys.exit(1)
 
-class RateLimiter:
-    """Simple rate limiter to avoid overwhelming the API"""
-    def __init__(self, max_calls_per_second=3):
-        self.min_interval = 1.0 / max_calls_per_second
-        self.last_call_time = 0
-    
-    def wait(self):
-        current_time = time.time()
-        elapsed = current_time - self.last_call_time
-        
-        if elapsed < self.min_interval:
-            sleep_time = self.min_interval - elapsed
-            time.sleep(sleep_time)
-        
-        self.last_call_time = time.time()
+# Shared by all fetch threads (see concurrency.TokenBucket)
+api_rate_limiter = TokenBucket()
 
-api_rate_limiter = RateLimiter(max_calls_per_second=3)
+# Job name in dashboard_checkpointimportacao
+CHECKPOINT_JOB = "absenteismo"
 
 def get_database_connection():
     """Get a database connection using the DATABASE_URL"""
@@ -125,30 +144,60 @@ def get_database_connection():
         raise ValueError("DATABASE_URL not configured")
     return psycopg2.connect(DATABASE_URL)
 
-def generate_date_intervals(months_back=6):
+def import_period(months_back=6):
     """
-    Generate a list of date intervals (30-day periods) going back a specified number of months
+    Date range covered by the import, in 30-day months ending today
     
     Args:
         months_back (int): Number of months to look back
         
     Returns:
-        list: List of tuples (start_date, end_date) in 'dd/mm/yyyy' format
+        tuple: (start_date, end_date) as dates
     """
-    intervals = []
     today = date.today()
+    return today - timedelta(days=months_back * 30 - 1), today
+
+def get_company_daily_volume(company_id, period):
+    """
+    Average atestados per day already stored for a company in the period
     
-    # Generate intervals in 30-day chunks, going back from today
-    end_date = today
-    for _ in range(months_back * 30 // 30):  # Convert months to 30-day chunks
-        start_date = end_date - timedelta(days=29)  # 30 days including end date
-        intervals.append((
-            start_date.strftime('%d/%m/%Y'),
-            end_date.strftime('%d/%m/%Y')
-        ))
-        end_date = start_date - timedelta(days=1)
-    
-    return intervals
+    Args:
+        company_id (int): Company ID
+        period (tuple): (start_date, end_date) as dates
+        
+    Returns:
+        float: Rows per day (0 when the company has no history)
+    """
+    start_date, end_date = period
+    connection = get_database_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*) FROM absenteismo_absenteismo
+                WHERE empresa_id = %s AND "DT_INICIO_ATESTADO" BETWEEN %s AND %s
+            """, (company_id, start_date, end_date))
+            rows = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    return rows / ((end_date - start_date).days + 1)
+
+def save_checkpoint(company_id, interval, status, inserted=0, updated=0, errors=0, message=''):
+    """
+    Record the outcome of one company interval for --resume
+
+    A failure here is only logged: losing a checkpoint costs a re-fetch on
+    the next resumed run, not data.
+    """
+    connection = get_database_connection()
+    try:
+        record_checkpoint(connection, CHECKPOINT_JOB, company_id, *interval,
+                          status, inserted, updated, errors, message)
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        logger.warning(f"Could not record checkpoint for company {company_id}, interval {interval}: {str(e)}")
+    finally:
+        connection.close()
 
 def get_companies_from_db(company_code=None):
     """
@@ -306,7 +355,7 @@ def create_generic_employee(company_id, company_code, name):
             connection.rollback()
         return None
 
-def get_absenteeism_data(company_code, date_start, date_end, tipo_saida='json'):
+def get_absenteeism_data(company_code, date_start, date_end, tipo_saida='json', retry_timeouts=True):
     """
     Fetch absenteeism data from the SOC API for a specific company and date range.
     
@@ -315,16 +364,15 @@ def get_absenteeism_data(company_code, date_start, date_end, tipo_saida='json'):
         date_start (str): Start date in dd/mm/yyyy format
         date_end (str): End date in dd/mm/yyyy format
         tipo_saida (str): Output format (json, html, txt, csv, xml)
+        retry_timeouts (bool): Retry read timeouts instead of raising them
         
     Returns:
-        dict or list: API response data
+        iterator or str: Records parsed as they arrive (json), or the response text
     """
     if not all([SOC_EMPRESA, SOC_CODIGO, SOC_CHAVE]):
         raise ValueError("Missing API configuration")
     
     try:
-        api_rate_limiter.wait()
-        
         params = {
             'empresa': SOC_EMPRESA,
             'codigo': SOC_CODIGO,
@@ -335,31 +383,109 @@ def get_absenteeism_data(company_code, date_start, date_end, tipo_saida='json'):
             'dataFim': date_end
         }
 
-        param_json = json.dumps(params, separators=(',', ':'))
-        quoted_param = quote(param_json)
-        
-        url = f"{SOC_API_URL}/exportadados?parametro={quoted_param}"
         logger.info(f"Fetching absenteeism data from API for company {company_code} from {date_start} to {date_end}")
         
-        response = requests.get(url, timeout=60)
+        response = api_client.get_soc_export(
+            SOC_API_URL, params, timeout=60, limiter=api_rate_limiter, stream=(tipo_saida == 'json'),
+            retry_timeouts=retry_timeouts
+        )
         
         if response.status_code != 200:
             logger.error(f"API response: {response.text}")
             raise Exception(f"API request failed: {response.status_code}")
         
         if tipo_saida == 'json':
-            data = response.json()
-            if isinstance(data, list):
-                logger.info(f"API response: list with {len(data)} items for company {company_code}")
-            elif isinstance(data, dict):
-                logger.info(f"API response: dict with keys {list(data.keys())}")
-            return data
+            return api_client.iter_json_records(response)
         return response.text
     
     except Exception as e:
         logger.error(f"Error fetching absenteeism data for company {company_code}: {str(e)}")
         raise
 
+def fetch_interval(company_code, start_date, end_date):
+    """
+    Request one date window and return its records as a stream
+    
+    A read timeout on a window longer than a day is raised at once instead
+    of being retried, so import_interval can split the window.
+    
+    Args:
+        company_code (str): Company code to fetch data for
+        start_date (date): First day of the window
+        end_date (date): Last day of the window
+        
+    Returns:
+        iterator: Absenteeism rows, parsed as they arrive
+    """
+    return get_absenteeism_data(
+        company_code, start_date.strftime('%d/%m/%Y'), end_date.strftime('%d/%m/%Y'),
+        retry_timeouts=(start_date == end_date)
+    )
+
+def import_interval(company, interval, employee_map, ntep_cids, records=None, fetch_error=None):
+    """
+    Save the records of one date window in chunks of SAVE_CHUNK_ROWS,
+    halving the window while the API times out
+    
+    Args:
+        company (dict): Company record with id and code
+        interval (tuple): (start_date, end_date) of the window
+        employee_map (dict): Employees of the company keyed by matricula
+        ntep_cids (set): Normalized NTEP CIDs of the company (see load_ntep_cids)
+        records (iterator): Rows already requested with fetch_interval; fetched here when None
+        fetch_error (Exception): Error raised while requesting records, if any
+        
+    Returns:
+        tuple: (inserted, updated, errors) counts
+    """
+    company_id = company['id']
+    company_code = company['CODIGO']
+    start_date, end_date = interval
+    inserted = updated = errors = 0
+    dates = set()
+    
+    try:
+        if fetch_error:
+            raise fetch_error
+        if records is None:
+            records = fetch_interval(company_code, start_date, end_date)
+        
+        processed = process_absenteeism_data(records, company_id, company_code, employee_map)
+        while True:
+            chunk = list(islice(processed, SAVE_CHUNK_ROWS))
+            if not chunk:
+                break
+            for record in chunk:
+                record['ntep_positivo'] = normalizar_cid(record.get('CID_PRINCIPAL')) in ntep_cids
+                dates.add(record['DT_INICIO_ATESTADO'])
+            chunk_inserted, chunk_updated, chunk_errors = save_absenteeism_to_database(chunk)
+            inserted += chunk_inserted
+            updated += chunk_updated
+            errors += chunk_errors
+        
+        logger.info(f"Results for interval {start_date} to {end_date}: "
+                   f"{inserted} inserted, {updated} updated, {errors} errors")
+        return inserted, updated, errors
+    
+    except requests.Timeout:
+        if start_date == end_date:
+            raise
+        logger.warning(f"Company {company_code}: timeout from {start_date} to {end_date}, splitting the interval")
+    
+    finally:
+        if hasattr(records, 'close'):
+            records.close()
+        refresh_daily_rollup(company_id, dates)
+    
+    # Rows saved before the timeout are fetched again and upserted over themselves
+    middle = start_date + (end_date - start_date) // 2
+    for half in ((start_date, middle), (middle + timedelta(days=1), end_date)):
+        half_inserted, half_updated, half_errors = import_interval(company, half, employee_map, ntep_cids)
+        inserted += half_inserted
+        updated += half_updated
+        errors += half_errors
+    return inserted, updated, errors
+
 def parse_date(date_str):
     """
     Parse a date string to a Python date object.
@@ -438,142 +564,162 @@ def map_absenteeism_to_db_schema(item_data, company_id, company_code):
         logger.error(f"Error mapping absenteeism data: {str(e)}")
         raise
 
-def find_employee_by_matricula(matricula, company_code):
+def load_ntep_cids(company_id):
     """
-    Find an employee by matricula and company code
+    Normalized CIDs of the NTEP lists of the company's CNAEs
     
     Args:
-        matricula (str): Employee matricula
-        company_code (str): Company code
+        company_id (int): Company ID
         
     Returns:
-        dict: Employee record or None if not found
+        set: CID codes that make an atestado NTEP positive
     """
-    if not matricula or not company_code:
-        return None
-    
+    connection = get_database_connection()
     try:
-        connection = get_database_connection()
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
+        with connection.cursor() as cursor:
+            # ntep_cid holds the NTEP lists already normalized
+            cursor.execute("""
+                SELECT DISTINCT nc.cid
+                FROM cnae_empresas ce
+                JOIN ntep_cid nc ON nc.cnae_id = ce.cnae_id
+                WHERE ce.empresa_id = %s
+            """, (company_id,))
+            return {cid for (cid,) in cursor}
+    finally:
+        connection.close()
+
+def load_employee_map(company_code):
+    """
+    Load all employees of a company keyed by matricula, in a single query
+    
+    Args:
+        company_code (str): Company code
         
-        cursor.execute("""
-            SELECT id, "NOME", "DATA_NASCIMENTO", "SEXO"
-            FROM funcionarios_funcionario 
-            WHERE "MATRICULAFUNCIONARIO" = %s AND "CODIGOEMPRESA" = %s
-        """, (matricula, company_code))
+    Returns:
+        dict: matricula -> employee record (id, NOME, DATA_NASCIMENTO, SEXO)
         
-        employee = cursor.fetchone()
-        cursor.close()
-        connection.close()
+    Raises:
+        psycopg2.Error: When the employees cannot be read. The company fails
+            instead of importing every atestado as a generic employee.
+    """
+    connection = get_database_connection()
+    try:
+        with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT id, "MATRICULAFUNCIONARIO", "NOME", "DATA_NASCIMENTO", "SEXO"
+                FROM funcionarios_funcionario 
+                WHERE "CODIGOEMPRESA" = %s AND "MATRICULAFUNCIONARIO" IS NOT NULL
+                ORDER BY id DESC
+            """, (company_code,))
+            
+            # Ordered by id DESC so the oldest employee wins on duplicated matriculas
+            employee_map = {row['MATRICULAFUNCIONARIO']: row for row in cursor.fetchall()}
         
-        return employee
+        logger.info(f"Loaded {len(employee_map)} employees for company {company_code}")
+        return employee_map
     
     except Exception as e:
-        logger.error(f"Error finding employee with matricula {matricula}: {str(e)}")
-        return None
+        logger.error(f"Error loading employees for company {company_code}: {str(e)}")
+        raise
+    
+    finally:
+        connection.close()
 
-def process_absenteeism_data(api_data, company_id, company_code):
+def process_absenteeism_data(records, company_id, company_code, employee_map):
     """
-    Process the absenteeism data from the API and prepare it for database insertion
+    Process the absenteeism data from the API and prepare it for database insertion,
+    one record at a time
     
     Args:
-        api_data (dict or list): API response data
+        records (iterable): Records of the API response (see api_client.iter_json_records)
         company_id (int): Database ID of the company
         company_code (str): Company code
+        employee_map (dict): Employees of the company keyed by matricula (see load_employee_map)
         
-    Returns:
-        list: List of absenteeism records ready for database insertion
+    Yields:
+        dict: Absenteeism record ready for database insertion
     """
-    absenteeism_records = []
-    generic_employee_counter = get_next_generic_employee_counter()
+    generic_employee_counter = None
+    processed = 0
     
-    try:
-        # Handle different API response formats
-        data_list = []
-        if isinstance(api_data, list):
-            data_list = api_data
-        elif isinstance(api_data, dict) and 'data' in api_data:
-            data_list = api_data.get('data', [])
-        elif isinstance(api_data, dict):
-            for key, value in api_data.items():
-                if isinstance(value, list):
-                    data_list = value
-                    break
-            if not data_list and api_data:
-                # Single record as a dict
-                data_list = [api_data]
-                
-        if not data_list:
-            logger.info(f"No absenteeism data found for company {company_code}")
-            return []
-
-        for i, item in enumerate(data_list):
-            if not isinstance(item, dict):
-                logger.warning(f"Skipping non-dict item in data: {type(item)}")
-                continue
-                
-            try:
-                # Map the API data to our schema
-                absenteeism = map_absenteeism_to_db_schema(item, company_id, company_code)
-                
-                # Skip if missing required fields
-                if not absenteeism['DT_INICIO_ATESTADO'] or not absenteeism['DT_FIM_ATESTADO']:
-                    logger.warning(f"Skipping record missing required date fields: {item}")
-                    continue
-                
-                # Calculate days absent if not provided
-                if not absenteeism['DIAS_AFASTADOS'] and absenteeism['DT_INICIO_ATESTADO'] and absenteeism['DT_FIM_ATESTADO']:
-                    delta = absenteeism['DT_FIM_ATESTADO'] - absenteeism['DT_INICIO_ATESTADO']
-                    absenteeism['DIAS_AFASTADOS'] = delta.days + 1
-                
-                # Link to existing employee if matricula is provided
-                if absenteeism['MATRICULA_FUNC']:
-                    employee = find_employee_by_matricula(absenteeism['MATRICULA_FUNC'], company_code)
-                    if employee:
-                        absenteeism['funcionario_id'] = employee['id']
-                        
-                        # Update with employee data if not provided in the API
-                        if not absenteeism['NOME_FUNCIONARIO']:
-                            absenteeism['NOME_FUNCIONARIO'] = employee['NOME']
-                        if not absenteeism['DT_NASCIMENTO'] and employee['DATA_NASCIMENTO']:
-                            absenteeism['DT_NASCIMENTO'] = employee['DATA_NASCIMENTO']
-                        if not absenteeism['SEXO'] and employee['SEXO']:
-                            absenteeism['SEXO'] = employee['SEXO']
-                    else:
-                        # Missing employee - we'll handle this later
-                        logger.warning(f"Employee with matricula {absenteeism['MATRICULA_FUNC']} not found")
-                
-                # Add to our records list
-                absenteeism_records.append(absenteeism)
-                
-            except Exception as e:
-                logger.error(f"Error processing absenteeism record: {str(e)}")
+    for item in records:
+        if not isinstance(item, dict):
+            logger.warning(f"Skipping non-dict item in data: {type(item)}")
+            continue
+            
+        try:
+            # Map the API data to our schema
+            absenteeism = map_absenteeism_to_db_schema(item, company_id, company_code)
+            
+            # Skip if missing required fields
+            if not absenteeism['DT_INICIO_ATESTADO'] or not absenteeism['DT_FIM_ATESTADO']:
+                logger.warning(f"Skipping record missing required date fields: {item}")
                 continue
-                
-        # Process records with missing employee matricula
-        for record in absenteeism_records:
-            if not record.get('funcionario_id') and not record.get('MATRICULA_FUNC'):
+            
+            # Calculate days absent if not provided
+            if not absenteeism['DIAS_AFASTADOS'] and absenteeism['DT_INICIO_ATESTADO'] and absenteeism['DT_FIM_ATESTADO']:
+                delta = absenteeism['DT_FIM_ATESTADO'] - absenteeism['DT_INICIO_ATESTADO']
+                absenteeism['DIAS_AFASTADOS'] = delta.days + 1
+            
+            # Link to existing employee if matricula is provided
+            if absenteeism['MATRICULA_FUNC']:
+                employee = employee_map.get(absenteeism['MATRICULA_FUNC'])
+                if employee:
+                    absenteeism['funcionario_id'] = employee['id']
+                    
+                    # Update with employee data if not provided in the API
+                    if not absenteeism['NOME_FUNCIONARIO']:
+                        absenteeism['NOME_FUNCIONARIO'] = employee['NOME']
+                    if not absenteeism['DT_NASCIMENTO'] and employee['DATA_NASCIMENTO']:
+                        absenteeism['DT_NASCIMENTO'] = employee['DATA_NASCIMENTO']
+                    if not absenteeism['SEXO'] and employee['SEXO']:
+                        absenteeism['SEXO'] = employee['SEXO']
+                else:
+                    # Missing employee - we'll handle this later
+                    logger.warning(f"Employee with matricula {absenteeism['MATRICULA_FUNC']} not found")
+            else:
                 # Create a generic employee for records without matricula
+                if generic_employee_counter is None:
+                    generic_employee_counter = get_next_generic_employee_counter()
                 generic_name = f"nomegenerico{generic_employee_counter}"
                 new_employee = create_generic_employee(company_id, company_code, generic_name)
                 
                 if new_employee:
-                    record['funcionario_id'] = new_employee['id']
-                    record['MATRICULA_FUNC'] = new_employee['MATRICULAFUNCIONARIO']
-                    if not record['NOME_FUNCIONARIO']:
-                        record['NOME_FUNCIONARIO'] = new_employee['NOME']
+                    absenteeism['funcionario_id'] = new_employee['id']
+                    absenteeism['MATRICULA_FUNC'] = new_employee['MATRICULAFUNCIONARIO']
+                    if not absenteeism['NOME_FUNCIONARIO']:
+                        absenteeism['NOME_FUNCIONARIO'] = new_employee['NOME']
                     generic_employee_counter += 1
+            
+        except Exception as e:
+            logger.error(f"Error processing absenteeism record: {str(e)}")
+            continue
         
-        logger.info(f"Processed {len(absenteeism_records)} absenteeism records for company {company_code}")
-        return absenteeism_records
+        processed += 1
+        yield absenteeism
     
-    except Exception as e:
-        logger.error(f"Error processing absenteeism data for company {company_code}: {str(e)}")
-        raise
+    logger.info(f"Processed {processed} absenteeism records for company {company_code}")
+
+# Columns written by the importer, in VALUES order
+ABSENTEEISM_COLUMNS = [
+    'empresa_id', 'codigo_empresa', 'funcionario_id', 'MATRICULA_FUNC', 'NOME_FUNCIONARIO',
+    'UNIDADE', 'SETOR', 'DT_NASCIMENTO', 'SEXO', 'TIPO_ATESTADO', 'DT_INICIO_ATESTADO',
+    'DT_FIM_ATESTADO', 'HORA_INICIO_ATESTADO', 'HORA_FIM_ATESTADO', 'DIAS_AFASTADOS',
+    'HORAS_AFASTADO', 'CID_PRINCIPAL', 'DESCRICAO_CID', 'GRUPO_PATOLOGICO', 'TIPO_LICENCA',
+    'ntep_positivo'
+]
+
+# Natural key of absenteismo_absenteismo (constraint absenteismo_chave_natural)
+ABSENTEEISM_KEY = ['empresa_id', 'MATRICULA_FUNC', 'DT_INICIO_ATESTADO', 'DT_FIM_ATESTADO', 'CID_PRINCIPAL']
 
 def save_absenteeism_to_database(records):
     """
-    Save absenteeism records to the database
+    Save absenteeism records to the database with a COPY-staged upsert on
+    the natural key (empresa, matricula, start/end dates, CID)
+    
+    Rows rejected because of their data (e.g. a value too long for its
+    column) are isolated by bulk_loader.copy_upsert_isolated and counted as
+    errors; the rest of the batch is saved.
     
     Args:
         records (list): List of absenteeism records
@@ -584,114 +730,90 @@ def save_absenteeism_to_database(records):
     if not records:
         return (0, 0, 0)
     
-    inserted = 0
-    updated = 0
-    errors = 0
+    # The key columns must not be NULL, otherwise ON CONFLICT never matches
+    for record in records:
+        record['MATRICULA_FUNC'] = record.get('MATRICULA_FUNC') or ''
+        record['CID_PRINCIPAL'] = record.get('CID_PRINCIPAL') or ''
     
+    connection = get_database_connection()
     try:
-        connection = get_database_connection()
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        
-        for record in records:
-            try:
-                # Check for existing record by date range and employee
-                if record.get('funcionario_id'):
-                    cursor.execute("""
-                        SELECT id FROM absenteismo_absenteismo
-                        WHERE funcionario_id = %s 
-                          AND "DT_INICIO_ATESTADO" = %s
-                          AND "DT_FIM_ATESTADO" = %s
-                    """, (
-                        record['funcionario_id'],
-                        record['DT_INICIO_ATESTADO'],
-                        record['DT_FIM_ATESTADO']
-                    ))
-                elif record.get('MATRICULA_FUNC'):
-                    cursor.execute("""
-                        SELECT id FROM absenteismo_absenteismo
-                        WHERE "MATRICULA_FUNC" = %s 
-                          AND codigo_empresa = %s
-                          AND "DT_INICIO_ATESTADO" = %s
-                          AND "DT_FIM_ATESTADO" = %s
-                    """, (
-                        record['MATRICULA_FUNC'],
-                        record['codigo_empresa'],
-                        record['DT_INICIO_ATESTADO'],
-                        record['DT_FIM_ATESTADO']
-                    ))
-                else:
-                    # No way to uniquely identify - skip duplicate check
-                    existing_id = None
-                    
-                existing = cursor.fetchone() if 'cursor' in locals() else None
-                
-                if existing:
-                    # Update existing record
-                    query_parts = []
-                    params = []
-                    
-                    for key, value in record.items():
-                        if key != 'id' and key != 'data_criacao' and key != 'data_atualizacao':
-                            query_parts.append(f'"{key}" = %s')
-                            params.append(value)
-                    
-                    params.append(existing['id'])
-                    
-                    update_query = f"""
-                    UPDATE absenteismo_absenteismo SET 
-                        {", ".join(query_parts)}
-                    WHERE id = %s
-                    """
-                    
-                    cursor.execute(update_query, params)
-                    updated += 1
-                else:
-                    # Insert new record
-                    record_keys = [k for k in record.keys() if k != 'id' and k != 'data_criacao' and k != 'data_atualizacao']
-                    placeholders = ["%s"] * len(record_keys)
-                    
-                    insert_query = f"""
-                    INSERT INTO absenteismo_absenteismo (
-                        {", ".join([f'"{k}"' for k in record_keys])},
-                        data_criacao, 
-                        data_atualizacao
-                    ) VALUES (
-                        {", ".join(placeholders)},
-                        NOW(),
-                        NOW()
-                    )
-                    """
-                    
-                    cursor.execute(insert_query, [record[k] for k in record_keys])
-                    inserted += 1
-                
-                connection.commit()
-                
-            except Exception as e:
-                connection.rollback()
-                errors += 1
-                logger.error(f"Error saving absenteeism record: {str(e)}")
-                logger.error(f"Record data: {record}")
-                continue
-        
-        cursor.close()
-        connection.close()
-        
-        return (inserted, updated, errors)
+        counts = copy_upsert_isolated(
+            connection,
+            "absenteismo_absenteismo",
+            ABSENTEEISM_COLUMNS,
+            (tuple(record.get(c) for c in ABSENTEEISM_COLUMNS) for record in records),
+            conflict_columns=ABSENTEEISM_KEY,
+            update_expressions={
+                # A matricula missing from a stale employee map must not unlink the atestado
+                'funcionario_id': 'COALESCE(EXCLUDED.funcionario_id, absenteismo_absenteismo.funcionario_id)',
+                'data_atualizacao': 'NOW()',
+            },
+            insert_expressions={'data_criacao': 'NOW()', 'data_atualizacao': 'NOW()'}
+        )
+        connection.commit()
+        return counts
     
     except Exception as e:
-        logger.error(f"Database error: {str(e)}")
-        if 'connection' in locals() and connection:
-            connection.rollback()
+        connection.rollback()
+        logger.error(f"Error saving {len(records)} absenteeism records: {str(e)}")
+        return (0, 0, len(records))
+    
+    finally:
+        connection.close()
+
+def refresh_daily_rollup(company_id, dates):
+    """
+    Rebuild the daily rollup tables (absenteismo_absenteismodiario and
+    absenteismo_absenteismociddiario) for the given company and dates
+
+    The dashboard reads its breakdowns from these tables, so they must be
+    refreshed for every DT_INICIO_ATESTADO touched by the import.
+
+    Args:
+        company_id (int): Company ID
+        dates (iterable): Dates whose daily totals must be recomputed
+    """
+    dates = sorted(set(d for d in dates if d))
+    if not dates:
+        return
+
+    connection = get_database_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(ATUALIZAR_RESUMOS, {'empresa': company_id, 'datas': dates})
+        connection.commit()
+    except Exception:
+        connection.rollback()
         raise
+    finally:
+        connection.close()
+
+def bump_company_data_version(company_id):
+    """
+    Increment dashboard_empresa.versao_dados so cached dashboard pages of the
+    company are recomputed on the next request
 
-def process_company(company, date_intervals):
+    Args:
+        company_id (int): Company ID
+    """
+    connection = get_database_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE dashboard_empresa SET versao_dados = versao_dados + 1
+                WHERE id = %s
+            """, (company_id,))
+        connection.commit()
+    finally:
+        connection.close()
+
+def process_company(company, period):
     """
-    Process absenteeism data for a single company across multiple date intervals
+    Process absenteeism data for a single company across adaptive date intervals
     
     Args:
         company (dict): Company record with id and code
-        date_intervals (list): List of (start_date, end_date) tuples
+        period (tuple): (start_date, end_date) dates covered by the import
         
     Returns:
         tuple: (company_code, processed, errors) counts
@@ -702,30 +824,62 @@ def process_company(company, date_intervals):
     total_processed = 0
     total_errors = 0
     
-    logger.info(f"Processing company {company_code} with {len(date_intervals)} date intervals")
+    if args.resume:
+        connection = get_database_connection()
+        try:
+            completed = load_completed_units(connection, CHECKPOINT_JOB, company_id)
+        finally:
+            connection.close()
+        pending_ranges = subtract_intervals(period, completed)
+        if pending_ranges != [period]:
+            logger.info(f"Company {company_code}: skipping dates completed by the previous run")
+    else:
+        pending_ranges = [period]
+    
+    if not pending_ranges:
+        return company_code, 0, 0
+    
+    rows_per_day = get_company_daily_volume(company_id, period)
+    pending_intervals = [
+        interval
+        for start_date, end_date in pending_ranges
+        for interval in plan_date_intervals(start_date, end_date, rows_per_day)
+    ]
+    
+    logger.info(f"Processing company {company_code} with {len(pending_intervals)} date intervals "
+                f"({rows_per_day:.1f} stored rows per day)")
+    
+    employee_map = load_employee_map(company_code)
+    ntep_cids = load_ntep_cids(company_id)
     
-    for i, (start_date, end_date) in enumerate(date_intervals):
+    # Intervals are requested in parallel (sharing the API rate limiter) and
+    # streamed into the database here, one at a time, as each response arrives
+    responses = fetch_concurrently(
+        lambda interval: fetch_interval(company_code, *interval),
+        pending_intervals
+    )
+    
+    for interval, records, fetch_error in responses:
+        start_date, end_date = interval
         try:
-            logger.info(f"Fetching interval {i+1}/{len(date_intervals)}: {start_date} to {end_date}")
-            api_data = get_absenteeism_data(company_code, start_date, end_date)
-            
-            # Process data and save to database
-            records = process_absenteeism_data(api_data, company_id, company_code)
-            
-            if records:
-                inserted, updated, errors = save_absenteeism_to_database(records)
-                total_processed += inserted + updated
-                total_errors += errors
-                
-                logger.info(f"Results for interval {start_date} to {end_date}: "
-                           f"{inserted} inserted, {updated} updated, {errors} errors")
-            else:
-                logger.info(f"No records to process for interval {start_date} to {end_date}")
+            inserted, updated, errors = import_interval(
+                company, interval, employee_map, ntep_cids, records, fetch_error
+            )
+            total_processed += inserted + updated
+            total_errors += errors
                 
         except Exception as e:
             logger.error(f"Error processing interval {start_date} to {end_date} for company {company_code}: {str(e)}")
             total_errors += 1
+            save_checkpoint(company_id, interval, STATUS_FAILED, 0, 0, 1, str(e))
             continue
+        
+        save_checkpoint(company_id, interval, STATUS_FAILED if errors else STATUS_COMPLETED,
+                        inserted, updated, errors)
+
+    # A failed interval may still have saved some chunks before the error
+    if total_processed or total_errors:
+        bump_company_data_version(company_id)
     
     return company_code, total_processed, total_errors
 
@@ -735,35 +889,54 @@ def main():
     logger.info(f"Absenteeism import job started at {start_time}")
     
     try:
-        # Generate date intervals
-        date_intervals = generate_date_intervals(months_back=args.months)
-        logger.info(f"Using {len(date_intervals)} date intervals covering {args.months} months")
+        period = import_period(months_back=args.months)
+        logger.info(f"Importing {period[0]} to {period[1]} ({args.months} months)")
         
         # Get companies to process
         companies = get_companies_from_db(args.empresa) if args.empresa else get_companies_from_db()
-        logger.info(f"Processing {len(companies)} companies")
+        logger.info(f"Processing {len(companies)} companies with {args.workers} worker(s)")
+        
+        if args.resume:
+            logger.info("Resuming: intervals completed by the previous run will be skipped")
+        else:
+            connection = get_database_connection()
+            try:
+                reset_checkpoints(connection, CHECKPOINT_JOB, [c['id'] for c in companies if c])
+                connection.commit()
+            finally:
+                connection.close()
         
         total_processed = 0
         total_errors = 0
         processed_companies = 0
+        failed_companies = []
         
-        for company in companies:
-            if not company:
+        results = process_companies(
+            lambda company: process_company(company, period),
+            companies,
+            workers=args.workers
+        )
+        
+        for company, result, error in results:
+            processed_companies += 1
+            logger.info(f"Progress: {processed_companies}/{len(companies)} companies processed")
+            
+            if error:
+                logger.error(f"Failed to process company {company['CODIGO']}: {str(error)}")
+                failed_companies.append(company['CODIGO'])
                 continue
-                
-            company_code, processed, errors = process_company(company, date_intervals)
             
+            company_code, processed, errors = result
             total_processed += processed
             total_errors += errors
-            processed_companies += 1
-            
-            logger.info(f"Progress: {processed_companies}/{len(companies)} companies processed")
             logger.info(f"Company {company_code} results: {processed} records processed, {errors} errors")
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         logger.info(f"Import completed in {duration:.2f} seconds")
         logger.info(f"Total records: {total_processed} processed, {total_errors} errors")
+        if failed_companies:
+            logger.error(f"{len(failed_companies)} companies failed: {', '.join(map(str, failed_companies))}")
         
     except Exception as e:
         logger.error(f"Import failed: {str(e)}")
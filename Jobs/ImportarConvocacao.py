@@ -4,18 +4,20 @@ import sys
 import json
 import logging
 import argparse
-import requests
-import time
-from urllib.parse import quote
 from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extras import RealDictCursor
 from pathlib import Path
 
+import api_client
+from bulk_loader import copy_upsert_isolated
+from concurrency import IMPORT_WORKERS, TokenBucket, fetch_concurrently, process_companies
+
 parser = argparse.ArgumentParser(description="Importar dados de convocação das APIs Connect e SOC")
 parser.add_argument("--empresa", type=str, help="Importar convocações para uma empresa específica")
 parser.add_argument("--dry-run", action="store_true", help="Executar em modo de teste sem alterar o banco de dados")
+parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="Número de empresas processadas em paralelo")
 args = parser.parse_args()
 
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -73,21 +75,8 @@ else:
     logger.error("Nenhuma URL de banco de dados configurada")
     sys.exit(1)
 
-class LimitadorDeTaxa:
-    def __init__(self, max_chamadas_por_segundo=3):
-        self.intervalo_minimo = 1.0 / max_chamadas_por_segundo
-        self.tempo_ultima_chamada = 0
-    
-    def esperar(self):
-        tempo_atual = time.time()
-        tempo_decorrido = tempo_atual - self.tempo_ultima_chamada
-        
-        if tempo_decorrido < self.intervalo_minimo:
-            time.sleep(self.intervalo_minimo - tempo_decorrido)
-        
-        self.tempo_ultima_chamada = time.time()
-
-limitador_api = LimitadorDeTaxa(max_chamadas_por_segundo=3)
+# Limitador compartilhado por todas as threads (ver concurrency.TokenBucket)
+limitador_api = TokenBucket()
 
 def obter_conexao_banco():
     if not DATABASE_URL:
@@ -151,8 +140,6 @@ def carregar_mapeamento_funcionarios(id_empresa):
 
 def obter_token_connect():
     try:
-        limitador_api.esperar()
-        
         url = f"{CONNECT_URL}get_token"
         params = {
             'username': CONNECT_USERNAME,
@@ -160,7 +147,7 @@ def obter_token_connect():
         }
         
         logger.info("Solicitando token de autenticação da API Connect")
-        response = requests.get(url, params=params, timeout=30)
+        response = api_client.get(url, params=params, timeout=30, limiter=limitador_api)
         
         if response.status_code != 200:
             raise Exception(f"Falha na solicitação de token da API Connect: {response.status_code}")
@@ -177,13 +164,11 @@ def obter_token_connect():
 
 def obter_pedidos_exames(token):
     try:
-        limitador_api.esperar()
-        
         url = f"{CONNECT_URL}get_ped_proc"
         params = {'token': token}
         
         logger.info("Buscando pedidos de exames da API Connect")
-        response = requests.get(url, params=params, timeout=60)
+        response = api_client.get(url, params=params, timeout=60, limiter=limitador_api)
         
         if response.status_code != 200:
             raise Exception(f"Falha na solicitação de pedidos de exames da API Connect: {response.status_code}")
@@ -207,8 +192,6 @@ def obter_dados_exame_soc(codigo_empresa, codigo_solicitacao):
         raise ValueError("Configuração da API SOC ausente")
     
     try:
-        limitador_api.esperar()
-        
         params = {
             'empresa': SOC_EMPRESA,
             'codigo': SOC_CODIGO,
@@ -218,13 +201,9 @@ def obter_dados_exame_soc(codigo_empresa, codigo_solicitacao):
             'codigoSolicitacao': codigo_solicitacao
         }
 
-        param_json = json.dumps(params, separators=(',', ':'))
-        quoted_param = quote(param_json)
-        
-        url = f"{SOC_API_URL}/exportadados?parametro={quoted_param}"
         logger.info(f"Buscando dados de exame da API SOC para empresa {codigo_empresa}, solicitação {codigo_solicitacao}")
         
-        response = requests.get(url, timeout=60)
+        response = api_client.get_soc_export(SOC_API_URL, params, timeout=60, limiter=limitador_api)
         
         if response.status_code != 200:
             logger.error(f"Resposta da API SOC: {response.text}")
@@ -327,9 +306,20 @@ def mapear_exames_para_esquema_db(dados_exames, id_empresa, codigo_empresa, mape
     logger.info(f"Mapeados {len(exames_mapeados)} exames com {exames_com_erro} erros")
     return exames_mapeados
 
+# Colunas gravadas pelo importador, na ordem de cada linha
+COLUNAS_CONVOCACAO = [
+    'empresa_id', 'CODIGOEMPRESA', 'funcionario_id', 'CODIGOFUNCIONARIO',
+    'NOMEABREVIADO', 'UNIDADE', 'CIDADE', 'ESTADO', 'BAIRRO', 'ENDERECO',
+    'CEP', 'CNPJUNIDADE', 'SETOR', 'CARGO', 'CPFFUNCIONARIO', 'MATRICULA',
+    'DATAADMISSAO', 'NOME', 'EMAILFUNCIONARIO', 'TELEFONEFUNCIONARIO',
+    'CODIGOEXAME', 'EXAME', 'ULTIMOPEDIDO', 'DATARESULTADO', 'PERIODICIDADE', 'REFAZER'
+]
+
 def salvar_exames_em_lote(exames, dry_run=False):
     """
-    Salva exames em lote usando o método de UPSERT otimizado
+    Salva exames em lote: COPY para uma tabela temporária e UPSERT. Exames
+    recusados pelo banco por causa dos dados são isolados e contados como erro
+    (bulk_loader.copy_upsert_isolated); os demais são gravados.
     """
     if not exames:
         return (0, 0, 0)
@@ -338,107 +328,32 @@ def salvar_exames_em_lote(exames, dry_run=False):
         logger.info(f"SIMULAÇÃO: Processaria {len(exames)} registros de exames")
         return (len(exames), 0, 0)
     
-    # Tamanho do lote para processamento eficiente
-    BATCH_SIZE = 500
-    total_inseridos = 0
-    total_atualizados = 0
-    total_erros = 0
-    
     try:
         conexao = obter_conexao_banco()
-        
-        # Dividir em lotes
-        lotes = [exames[i:i + BATCH_SIZE] for i in range(0, len(exames), BATCH_SIZE)]
-        logger.info(f"Processando {len(lotes)} lotes de exames (tamanho do lote: {BATCH_SIZE})")
-        
-        for i, lote in enumerate(lotes):
-            try:
-                cursor = conexao.cursor()
-                
-                # Consulta UPSERT para processamento em lote
-                consulta_upsert = """
-                INSERT INTO convocacao_convocacao (
-                    empresa_id, "CODIGOEMPRESA", funcionario_id, "CODIGOFUNCIONARIO",
-                    "NOMEABREVIADO", "UNIDADE", "CIDADE", "ESTADO", "BAIRRO", "ENDERECO",
-                    "CEP", "CNPJUNIDADE", "SETOR", "CARGO", "CPFFUNCIONARIO", "MATRICULA",
-                    "DATAADMISSAO", "NOME", "EMAILFUNCIONARIO", "TELEFONEFUNCIONARIO",
-                    "CODIGOEXAME", "EXAME", "ULTIMOPEDIDO", "DATARESULTADO", "PERIODICIDADE", "REFAZER"
-                ) VALUES %s
-                ON CONFLICT ("CODIGOFUNCIONARIO", "CODIGOEXAME") 
-                DO UPDATE SET
-                    empresa_id = EXCLUDED.empresa_id,
-                    "CODIGOEMPRESA" = EXCLUDED."CODIGOEMPRESA",
-                    funcionario_id = EXCLUDED.funcionario_id,
-                    "NOMEABREVIADO" = EXCLUDED."NOMEABREVIADO",
-                    "UNIDADE" = EXCLUDED."UNIDADE",
-                    "CIDADE" = EXCLUDED."CIDADE",
-                    "ESTADO" = EXCLUDED."ESTADO",
-                    "BAIRRO" = EXCLUDED."BAIRRO",
-                    "ENDERECO" = EXCLUDED."ENDERECO",
-                    "CEP" = EXCLUDED."CEP",
-                    "CNPJUNIDADE" = EXCLUDED."CNPJUNIDADE",
-                    "SETOR" = EXCLUDED."SETOR",
-                    "CARGO" = EXCLUDED."CARGO",
-                    "CPFFUNCIONARIO" = EXCLUDED."CPFFUNCIONARIO",
-                    "MATRICULA" = EXCLUDED."MATRICULA",
-                    "DATAADMISSAO" = EXCLUDED."DATAADMISSAO",
-                    "NOME" = EXCLUDED."NOME",
-                    "EMAILFUNCIONARIO" = EXCLUDED."EMAILFUNCIONARIO",
-                    "TELEFONEFUNCIONARIO" = EXCLUDED."TELEFONEFUNCIONARIO",
-                    "EXAME" = EXCLUDED."EXAME",
-                    "ULTIMOPEDIDO" = EXCLUDED."ULTIMOPEDIDO",
-                    "DATARESULTADO" = EXCLUDED."DATARESULTADO", 
-                    "PERIODICIDADE" = EXCLUDED."PERIODICIDADE",
-                    "REFAZER" = EXCLUDED."REFAZER"
-                RETURNING 
-                    (xmax = 0) AS inserted
-                """
-                
-                # Preparar os valores para inserção em lote
-                valores = []
-                for exame in lote:
-                    valores.append((
-                        exame['empresa_id'], exame['CODIGOEMPRESA'], exame['funcionario_id'], exame['CODIGOFUNCIONARIO'],
-                        exame['NOMEABREVIADO'], exame['UNIDADE'], exame['CIDADE'], exame['ESTADO'], exame['BAIRRO'], exame['ENDERECO'],
-                        exame['CEP'], exame['CNPJUNIDADE'], exame['SETOR'], exame['CARGO'], exame['CPFFUNCIONARIO'], exame['MATRICULA'],
-                        exame['DATAADMISSAO'], exame['NOME'], exame['EMAILFUNCIONARIO'], exame['TELEFONEFUNCIONARIO'],
-                        exame['CODIGOEXAME'], exame['EXAME'], exame['ULTIMOPEDIDO'], exame['DATARESULTADO'], exame['PERIODICIDADE'], exame['REFAZER']
-                    ))
-                
-                # Executar a operação em lote e obter resultados
-                resultados = execute_values(
-                    cursor, 
-                    consulta_upsert, 
-                    valores, 
-                    fetch=True
-                )
-                
-                # Contar inserções e atualizações
-                inseridos = sum(1 for r in resultados if r[0])
-                atualizados = len(resultados) - inseridos
-                
-                conexao.commit()
-                
-                total_inseridos += inseridos
-                total_atualizados += atualizados
-                
-                logger.info(f"Lote {i+1}/{len(lotes)}: {inseridos} inseridos, {atualizados} atualizados")
-                
-            except Exception as e:
-                conexao.rollback()
-                total_erros += len(lote)
-                logger.error(f"Erro ao processar lote {i+1}: {str(e)}")
-                continue
-                
-        conexao.close()
-        
-        return (total_inseridos, total_atualizados, total_erros)
-    
     except Exception as e:
         logger.error(f"Erro de banco de dados: {str(e)}")
-        if 'conexao' in locals():
-            conexao.close()
         return (0, 0, len(exames))
+    
+    try:
+        inseridos, atualizados, recusados = copy_upsert_isolated(
+            conexao,
+            "convocacao_convocacao",
+            COLUNAS_CONVOCACAO,
+            (tuple(exame[c] for c in COLUNAS_CONVOCACAO) for exame in exames),
+            conflict_columns=['CODIGOFUNCIONARIO', 'CODIGOEXAME']
+        )
+        conexao.commit()
+        
+        logger.info(f"{len(exames)} exames gravados: {inseridos} inseridos, {atualizados} atualizados, {recusados} recusados")
+        return (inseridos, atualizados, recusados)
+    
+    except Exception as e:
+        conexao.rollback()
+        logger.error(f"Erro ao gravar {len(exames)} exames: {str(e)}")
+        return (0, 0, len(exames))
+    
+    finally:
+        conexao.close()
 
 def processar_exames_empresa(empresa, pedidos_connect, dry_run=False):
     id_empresa = empresa['id']
@@ -460,24 +375,27 @@ def processar_exames_empresa(empresa, pedidos_connect, dry_run=False):
     todos_exames = []
     solicitacoes_com_erro = 0
     
+    codigos_solicitacao = []
     for pedido in pedidos_empresa:
-        try:
-            codigo_solicitacao = pedido.get('cod_solicitacao')
-            
-            if not codigo_solicitacao:
-                logger.warning(f"Código de solicitação ausente para pedido {pedido.get('id_proc')}")
-                continue
-            
-            dados_exame = obter_dados_exame_soc(codigo_empresa, str(codigo_solicitacao))
-            
-            if dados_exame:
-                todos_exames.extend(dados_exame)
-            else:
-                logger.warning(f"Nenhum dado de exame retornado para solicitação {codigo_solicitacao}")
-                solicitacoes_com_erro += 1
-            
-        except Exception as e:
-            logger.error(f"Erro ao processar solicitação {pedido.get('cod_solicitacao')}: {str(e)}")
+        codigo_solicitacao = pedido.get('cod_solicitacao')
+        if not codigo_solicitacao:
+            logger.warning(f"Código de solicitação ausente para pedido {pedido.get('id_proc')}")
+            continue
+        codigos_solicitacao.append(str(codigo_solicitacao))
+    
+    # As solicitações são buscadas em paralelo; o limitador compartilhado mantém a cota da API
+    resultados = fetch_concurrently(
+        lambda codigo: obter_dados_exame_soc(codigo_empresa, codigo),
+        codigos_solicitacao
+    )
+    for codigo_solicitacao, dados_exame, erro in resultados:
+        if erro:
+            logger.error(f"Erro ao processar solicitação {codigo_solicitacao}: {str(erro)}")
+            solicitacoes_com_erro += 1
+        elif dados_exame:
+            todos_exames.extend(dados_exame)
+        else:
+            logger.warning(f"Nenhum dado de exame retornado para solicitação {codigo_solicitacao}")
             solicitacoes_com_erro += 1
     
     if not todos_exames:
@@ -577,33 +495,41 @@ def main():
         pedidos_connect = obter_pedidos_exames(token)
         
         empresas = obter_empresas_do_banco(args.empresa) if args.empresa else obter_empresas_do_banco()
-        logger.info(f"Processando {len(empresas)} empresas")
+        logger.info(f"Processando {len(empresas)} empresas com {args.workers} worker(s)")
         
         total_inseridos = 0
         total_atualizados = 0
         total_erros = 0
         empresas_processadas = 0
+        empresas_com_falha = []
         
-        for empresa in empresas:
-            if not empresa:
+        resultados = process_companies(
+            lambda empresa: processar_exames_empresa(empresa, pedidos_connect, args.dry_run),
+            empresas,
+            workers=args.workers
+        )
+        
+        for empresa, resultado, erro in resultados:
+            empresas_processadas += 1
+            logger.info(f"Progresso: {empresas_processadas}/{len(empresas)} empresas processadas")
+            
+            if erro:
+                logger.error(f"Falha ao processar empresa {empresa['CODIGO']}: {str(erro)}")
+                empresas_com_falha.append(empresa['CODIGO'])
                 continue
-                
-            codigo_empresa, inseridos, atualizados, erros = processar_exames_empresa(
-                empresa, pedidos_connect, args.dry_run
-            )
             
+            codigo_empresa, inseridos, atualizados, erros = resultado
             total_inseridos += inseridos
             total_atualizados += atualizados
             total_erros += erros
-            empresas_processadas += 1
-            
-            logger.info(f"Progresso: {empresas_processadas}/{len(empresas)} empresas processadas")
             logger.info(f"Empresa {codigo_empresa} resultados: {inseridos} inseridos, {atualizados} atualizados, {erros} erros")
         
         hora_fim = datetime.now()
         duracao = (hora_fim - hora_inicio).total_seconds()
         logger.info(f"Importação concluída em {duracao:.2f} segundos")
         logger.info(f"Total de registros: {total_inseridos} inseridos, {total_atualizados} atualizados, {total_erros} erros")
+        if empresas_com_falha:
+            logger.error(f"{len(empresas_com_falha)} empresas falharam: {', '.join(map(str, empresas_com_falha))}")
         
         if args.dry_run:
             logger.info("SIMULAÇÃO: Nenhuma alteração real foi feita no banco de dados")
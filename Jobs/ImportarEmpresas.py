@@ -18,17 +18,16 @@ Environment variables:
 
 import os
 import sys
-import json
 import uuid
 import logging
-import requests
-from urllib.parse import quote
 from datetime import datetime
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import RealDictCursor
 from pathlib import Path
 
+import api_client
+from bulk_loader import copy_upsert_isolated
+
 # Get the script's directory path
 SCRIPT_DIR = Path(__file__).resolve().parent
 BASE_DIR = Path(SCRIPT_DIR).resolve().parent
@@ -113,14 +112,8 @@ def get_company_data(tipo_saida='json'):
             'chave': SOC_CHAVE,
             'tipoSaida': tipo_saida
         }
-        param_json = json.dumps(params, separators=(',', ':'))
-        quoted_param = quote(param_json)
-        
-        # Build URL
-        url = f"{SOC_API_URL}/exportadados?parametro={quoted_param}"
-        
-        logger.info(f"Fetching company data from API: {url}")
-        response = requests.get(url, timeout=30)
+        logger.info("Fetching company data from API")
+        response = api_client.get_soc_export(SOC_API_URL, params, timeout=30)
         
         if response.status_code != 200:
             logger.error(f"API request failed with status code {response.status_code}")
@@ -220,10 +213,17 @@ def map_api_to_db_schema(api_data):
                 logger.error(f"First item keys: {list(api_data[0].keys())}")
         raise
 
+# Columns written by the importer, in row order
+COMPANY_COLUMNS = [
+    'CODIGO', 'RAZAOSOCIAL', 'ENDERECO', 'NUMEROENDERECO', 'COMPLEMENTOENDERECO',
+    'BAIRRO', 'CIDADE', 'CEP', 'UF', 'CNPJ', 'ATIVO'
+]
+
 def save_to_database(companies):
     """
     Save company data to database.
-    Handles both inserts and updates.
+    Handles both inserts and updates with a COPY-staged upsert on CODIGO;
+    companies rejected because of their data are logged and skipped.
     
     Args:
         companies (list): List of company records
@@ -240,64 +240,17 @@ def save_to_database(companies):
     try:
         logger.info(f"Connecting to database...")
         connection = psycopg2.connect(DATABASE_URL)
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
         
-        inserted = 0
-        updated = 0
-        errors = 0
-        
-        for company in companies:
-            try:
-                # Check if company already exists
-                cursor.execute(
-                    "SELECT id FROM dashboard_empresa WHERE \"CODIGO\" = %s",
-                    (company['CODIGO'],)
-                )
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing company
-                    update_query = """
-                    UPDATE dashboard_empresa SET
-                        "RAZAOSOCIAL" = %(RAZAOSOCIAL)s,
-                        "ENDERECO" = %(ENDERECO)s,
-                        "NUMEROENDERECO" = %(NUMEROENDERECO)s,
-                        "COMPLEMENTOENDERECO" = %(COMPLEMENTOENDERECO)s,
-                        "BAIRRO" = %(BAIRRO)s,
-                        "CIDADE" = %(CIDADE)s,
-                        "CEP" = %(CEP)s,
-                        "UF" = %(UF)s,
-                        "CNPJ" = %(CNPJ)s,
-                        "ATIVO" = %(ATIVO)s
-                    WHERE "CODIGO" = %(CODIGO)s
-                    """
-                    cursor.execute(update_query, company)
-                    updated += 1
-                else:
-                    # Insert new company
-                    insert_query = """
-                    INSERT INTO dashboard_empresa (
-                        "CODIGO", "RAZAOSOCIAL", "ENDERECO", "NUMEROENDERECO",
-                        "COMPLEMENTOENDERECO", "BAIRRO", "CIDADE", "CEP", "UF", "CNPJ", "ATIVO"
-                    ) VALUES (
-                        %(CODIGO)s, %(RAZAOSOCIAL)s, %(ENDERECO)s, %(NUMEROENDERECO)s,
-                        %(COMPLEMENTOENDERECO)s, %(BAIRRO)s, %(CIDADE)s, %(CEP)s, %(UF)s, %(CNPJ)s, %(ATIVO)s
-                    )
-                    """
-                    cursor.execute(insert_query, company)
-                    inserted += 1
-            
-            except Exception as e:
-                errors += 1
-                logger.error(f"Error processing company {company['CODIGO']}: {str(e)}")
-                # Rollback transaction for this company and continue with next one
-                connection.rollback()
-                continue
-            
-            # Commit after each successful company operation
-            connection.commit()
+        inserted, updated, rejected = copy_upsert_isolated(
+            connection,
+            "dashboard_empresa",
+            COMPANY_COLUMNS,
+            (tuple(company[c] for c in COMPANY_COLUMNS) for company in companies),
+            conflict_columns=['CODIGO']
+        )
+        connection.commit()
         
-        logger.info(f"Database update completed: {inserted} inserted, {updated} updated, {errors} errors")
+        logger.info(f"Database update completed: {inserted} inserted, {updated} updated, {rejected} rejected")
     
     except Exception as e:
         logger.error(f"Database error: {str(e)}")
@@ -306,8 +259,6 @@ def save_to_database(companies):
         raise
     
     finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
         if 'connection' in locals() and connection:
             connection.close()
 
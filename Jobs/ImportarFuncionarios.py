@@ -6,38 +6,62 @@ This script fetches employee data from an external API and imports it into the d
 It's designed to run independently of the main application.
 
 Usage:
-    python ImportarFuncionarios.py [--all] [--empresa CODIGO]
+    python ImportarFuncionarios.py [--all] [--empresa CODIGO] [--full] [--workers N]
 
 Options:
     --all           Import all employees, including inactive ones
     --empresa CODE  Import employees for a specific company code
+    --full          Rewrite every employee, ignoring watermarks and content hashes
+    --workers N     Number of companies processed concurrently (default: IMPORT_WORKERS or 1)
+
+Incremental mode (default):
+    Each row carries an MD5 of the data received from the API (hash_conteudo);
+    rows whose hash did not change are not written. When SOC_DELTA_PARAM is
+    set, the company's highest DATAULTALTERACAO is also sent in that API
+    parameter so only employees changed since then are exported.
+
+    Funcionario.save() clears hash_conteudo, so an employee edited in the
+    admin is rewritten the next time the API sends it. Changes that bypass
+    save() (QuerySet.update(), raw SQL) keep the old hash, and with
+    SOC_DELTA_PARAM the API may not send an unchanged employee at all; run
+    with --full after those.
 
 Environment variables:
     SOC_API_URL - Base URL for the SOC API (default: https://ws1.soc.com.br/WebSoc)
     SOC_CODIGO - Code for API authentication
     SOC_CHAVE - API key for authentication
+    SOC_DELTA_PARAM - Export parameter that filters by last change date (optional)
+    SOC_API_RATE - API requests per second across all workers (default: 3)
+    IMPORT_WORKERS - Default for --workers (default: 1)
     DATABASE_URL or EXTERNAL_URL_DB - PostgreSQL connection string
 """
 
 import os
 import sys
-import json
 import uuid
+import hashlib
 import logging
 import argparse
-import requests
-import time
-from urllib.parse import quote
 from datetime import datetime
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extras import RealDictCursor
 from pathlib import Path
 
+import api_client
+from bulk_loader import copy_upsert_isolated
+from concurrency import IMPORT_WORKERS, TokenBucket, process_companies
+
+# SQL shared with the Django app (absenteismo.regras has no Django imports)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from absenteismo.regras import ATUALIZAR_RESUMOS
+
 # Parse command line arguments
 parser = argparse.ArgumentParser(description="Import employee data from SOC API")
 parser.add_argument("--all", action="store_true", help="Import all employees, including inactive ones")
 parser.add_argument("--empresa", type=str, help="Import employees for specific company code")
+parser.add_argument("--full", action="store_true", help="Rewrite every employee, ignoring watermarks and content hashes")
+parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="Number of companies processed concurrently")
 args = parser.parse_args()
 
 # Get the script's directory path
@@ -73,6 +97,7 @@ else:
 SOC_API_URL = os.getenv('SOC_API_URL', 'https://ws1.soc.com.br/WebSoc')
 SOC_CODIGO = os.getenv('SOC_CODIGO', '25722')
 SOC_CHAVE = os.getenv('SOC_CHAVE', 'b4c740208036d64c467b')
+SOC_DELTA_PARAM = os.getenv('SOC_DELTA_PARAM', '')
 
 # Database configuration - handle multiple possible env var names
 DATABASE_URL = os.getenv('DATABASE_URL') or os.getenv('EXTERNAL_URL_DB')
@@ -100,22 +125,7 @@ else:
     logger.error("No database URL configured")
     sys.exit(1)
 
-class RateLimiter:
-    def __init__(self, max_calls_per_second=3):
-        self.min_interval = 1.0 / max_calls_per_second
-        self.last_call_time = 0
-    
-    def wait(self):
-        current_time = time.time()
-        elapsed = current_time - self.last_call_time
-        
-        if elapsed < self.min_interval:
-            sleep_time = self.min_interval - elapsed
-            time.sleep(sleep_time)
-        
-        self.last_call_time = time.time()
-
-api_rate_limiter = RateLimiter(max_calls_per_second=3)
+api_rate_limiter = TokenBucket()
 
 def get_database_connection():
     """Get a database connection using the DATABASE_URL"""
@@ -162,7 +172,7 @@ def get_companies_from_db(company_code=None):
         logger.error(f"Error fetching companies from database: {str(e)}")
         raise
 
-def get_employee_data(company_code, tipo_saida='json', include_inactive=False):
+def get_employee_data(company_code, tipo_saida='json', include_inactive=False, changed_since=None):
     """
     Fetch employee data from the SOC API for a specific company.
     
@@ -170,16 +180,15 @@ def get_employee_data(company_code, tipo_saida='json', include_inactive=False):
         company_code (str): Company code to fetch employees for.
         tipo_saida (str): Output format (json, html, txt, csv, xml).
         include_inactive (bool): Whether to include inactive employees.
+        changed_since (date): Only employees changed since this date, if SOC_DELTA_PARAM is set.
         
     Returns:
-        dict or list: API response data.
+        iterator or str: Records parsed as they arrive (json), or the response text.
     """
     if not all([SOC_CODIGO, SOC_CHAVE]):
         raise ValueError("Missing API configuration")
     
     try:
-        api_rate_limiter.wait()
-        
         params = {
             'empresa': str(company_code),
             'codigo': SOC_CODIGO,
@@ -191,23 +200,21 @@ def get_employee_data(company_code, tipo_saida='json', include_inactive=False):
             "pendente": "",
             "ferias": "Sim"
         }
+        if SOC_DELTA_PARAM and changed_since:
+            params[SOC_DELTA_PARAM] = changed_since.strftime('%d/%m/%Y')
 
-        param_json = json.dumps(params, separators=(',', ':'))
-        quoted_param = quote(param_json)
-        
-        url = f"{SOC_API_URL}/exportadados?parametro={quoted_param}"
         logger.info(f"Fetching employee data from API for company {company_code}")
         
-        response = requests.get(url, timeout=60)
+        response = api_client.get_soc_export(
+            SOC_API_URL, params, timeout=60, limiter=api_rate_limiter, stream=(tipo_saida == 'json')
+        )
         
         if response.status_code != 200:
+            response.close()
             raise Exception(f"API request failed: {response.status_code}")
         
         if tipo_saida == 'json':
-            data = response.json()
-            if isinstance(data, list):
-                logger.info(f"API response: list with {len(data)} items for company {company_code}")
-            return data
+            return api_client.iter_json_records(response)
         return response.text
     
     except Exception as e:
@@ -369,220 +376,240 @@ def get_next_matricula_counter(company_code):
         logger.error(f"Error getting next matricula counter for company {company_code}: {str(e)}")
         return 1  # Default to 1 if there's an error
 
-def map_api_to_db_schema(api_data, company_id, company_code):
+def map_api_to_db_schema(records, company_id, company_code):
     """
-    Map API response data to database schema for all employees.
+    Map API records to database schema, one employee at a time.
+    
+    Employees without a matricula get a generated 'semmatricula<n>' one.
     
     Args:
-        api_data (dict or list): API response data.
+        records (iterable): Records of the API response (see api_client.iter_json_records).
         company_id (str): Database ID of the company.
         company_code (str): Company code.
         
-    Returns:
-        list: List of employee records ready for database insertion.
+    Yields:
+        dict: Employee record ready for database insertion.
     """
-    employees = []
+    # Get the next available matricula counter for this company
+    next_matricula_counter = get_next_matricula_counter(company_code)
+    mapped = 0
+    generated = 0
     
-    try:
-        data_list = []
-        if isinstance(api_data, list):
-            data_list = api_data
-        elif isinstance(api_data, dict) and 'data' in api_data:
-            data_list = api_data.get('data', [])
-        elif isinstance(api_data, dict):
-            for key, value in api_data.items():
-                if isinstance(value, list):
-                    data_list = value
-                    break
-            if not data_list:
-                data_list = [api_data]
-
-        # Get the next available matricula counter for this company
-        next_matricula_counter = get_next_matricula_counter(company_code)
-        
-        # Track employees needing a generated matricula
-        employees_without_matricula = []
-        employees_with_matricula = []
-        
-        for item in data_list:
-            if not isinstance(item, dict):
-                continue
-            
-            try:
-                employee = map_employee_to_db_schema(item, company_id, company_code)
-                
-                # Check if the employee has a matricula
-                if not employee['MATRICULAFUNCIONARIO'] or employee['MATRICULAFUNCIONARIO'].strip() == '':
-                    employees_without_matricula.append(employee)
-                else:
-                    employees_with_matricula.append(employee)
-                    
-            except Exception as e:
-                logger.error(f"Error processing employee {item.get('NOME', 'Unknown')}: {str(e)}")
-        
-        # Assign generated matriculas to employees without one
-        for i, employee in enumerate(employees_without_matricula):
-            matricula = f"semmatricula{next_matricula_counter + i}"
+    for item in records:
+        if not isinstance(item, dict):
+            continue
+        
+        try:
+            employee = map_employee_to_db_schema(item, company_id, company_code)
+        except Exception as e:
+            logger.error(f"Error processing employee {item.get('NOME', 'Unknown')}: {str(e)}")
+            continue
+        
+        # Assign a generated matricula to employees without one
+        if not employee['MATRICULAFUNCIONARIO'] or employee['MATRICULAFUNCIONARIO'].strip() == '':
+            matricula = f"semmatricula{next_matricula_counter + generated}"
             employee['MATRICULAFUNCIONARIO'] = matricula
+            generated += 1
             logger.info(f"Generated matricula '{matricula}' for employee {employee['NOME']} (ID: {employee['CODIGO']}) from company {company_code}")
         
-        # Combine both lists
-        employees = employees_with_matricula + employees_without_matricula
+        mapped += 1
+        yield employee
+    
+    logger.info(f"Processed {mapped} employees for company {company_code} ({generated} with generated matriculas)")
+
+# Columns written by the importer, in row order
+EMPLOYEE_COLUMNS = [
+    'empresa_id', 'CODIGOEMPRESA', 'NOMEEMPRESA', 'CODIGO', 'NOME', 'CODIGOUNIDADE',
+    'NOMEUNIDADE', 'CODIGOSETOR', 'NOMESETOR', 'CODIGOCARGO', 'NOMECARGO', 'CBOCARGO',
+    'CCUSTO', 'NOMECENTROCUSTO', 'MATRICULAFUNCIONARIO', 'CPF', 'RG', 'UFRG', 'ORGAOEMISSORRG',
+    'SITUACAO', 'SEXO', 'PIS', 'CTPS', 'SERIECTPS', 'ESTADOCIVIL', 'TIPOCONTATACAO',
+    'DATA_NASCIMENTO', 'DATA_ADMISSAO', 'DATA_DEMISSAO', 'ENDERECO', 'NUMERO_ENDERECO',
+    'BAIRRO', 'CIDADE', 'UF', 'CEP', 'TELEFONERESIDENCIAL', 'TELEFONECELULAR', 'EMAIL',
+    'DEFICIENTE', 'DEFICIENCIA', 'NM_MAE_FUNCIONARIO', 'DATAULTALTERACAO', 'MATRICULARH',
+    'COR', 'ESCOLARIDADE', 'NATURALIDADE', 'RAMAL', 'REGIMEREVEZAMENTO', 'REGIMETRABALHO',
+    'TELCOMERCIAL', 'TURNOTRABALHO', 'hash_conteudo'
+]
+
+# Columns covered by hash_conteudo. The matricula is left out: generated ones
+# change on every run and a filled one is never overwritten anyway
+HASHED_COLUMNS = [c for c in EMPLOYEE_COLUMNS if c not in ('MATRICULAFUNCIONARIO', 'hash_conteudo')]
+
+def employee_content_hash(employee):
+    """
+    MD5 of the employee data received from the API.
+    
+    Args:
+        employee (dict): Mapped employee record.
+        
+    Returns:
+        str: Hex digest.
+    """
+    payload = "\x1f".join("" if employee[c] is None else str(employee[c]) for c in HASHED_COLUMNS)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+def load_employee_state(company_id):
+    """
+    Load what the incremental import needs to know about a company's employees.
+    
+    Args:
+        company_id (int): Company ID.
         
-        logger.info(f"Processed {len(employees)} employees for company {company_code} ({len(employees_without_matricula)} with generated matriculas)")
-        return employees
+    Returns:
+        tuple: ({CODIGO: hash_conteudo}, highest DATAULTALTERACAO or None)
+    """
+    connection = get_database_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT "CODIGO", hash_conteudo, "DATAULTALTERACAO"
+                FROM funcionarios_funcionario
+                WHERE empresa_id = %s
+            """, (company_id,))
+            hashes = {}
+            watermark = None
+            for codigo, content_hash, changed_at in cursor:
+                hashes[codigo] = content_hash
+                if changed_at and (watermark is None or changed_at > watermark):
+                    watermark = changed_at
+        return hashes, watermark
+    finally:
+        connection.close()
+
+def snapshot_birth_dates(cursor, company_id):
+    """
+    Keep the company's current birth dates in a temporary table so the
+    rollup can be refreshed for the employees whose date the upsert changes.
     
-    except Exception as e:
-        logger.error(f"Error mapping API data to DB schema for company {company_code}: {str(e)}")
-        raise
+    Args:
+        cursor: Cursor of the transaction that runs the upsert.
+        company_id (int): Company ID.
+    """
+    cursor.execute("DROP TABLE IF EXISTS previous_birth_dates")
+    cursor.execute("""
+        CREATE TEMP TABLE previous_birth_dates ON COMMIT DROP AS
+        SELECT id, "DATA_NASCIMENTO"
+        FROM funcionarios_funcionario
+        WHERE empresa_id = %s
+    """, (company_id,))
+
+def refresh_rollup_for_birth_dates(cursor, company_id):
+    """
+    Rebuild the daily rollup on the atestado dates of employees whose
+    DATA_NASCIMENTO differs from snapshot_birth_dates, since the age band
+    of those atestados may have moved.
+    
+    Args:
+        cursor: Cursor of the transaction that ran the upsert.
+        company_id (int): Company ID.
+        
+    Returns:
+        int: Number of dates rebuilt.
+    """
+    cursor.execute("""
+        SELECT DISTINCT a."DT_INICIO_ATESTADO"
+        FROM previous_birth_dates p
+        JOIN funcionarios_funcionario f ON f.id = p.id
+        JOIN absenteismo_absenteismo a ON a.funcionario_id = f.id
+        WHERE a.empresa_id = %s
+          AND f."DATA_NASCIMENTO" IS DISTINCT FROM p."DATA_NASCIMENTO"
+    """, (company_id,))
+    dates = [row[0] for row in cursor.fetchall()]
+    if dates:
+        cursor.execute(ATUALIZAR_RESUMOS, {'empresa': company_id, 'datas': dates})
+    return len(dates)
 
-def save_employees_to_database(employees, company_code):
+def save_employees_to_database(employees, company_id, company_code):
     """
-    Save employee data to database using efficient batch processing with UPSERT.
+    Save employee data to database with a COPY-staged UPSERT.
     Utiliza a restrição unique_together = ['CODIGOEMPRESA', 'CODIGO'] do modelo Django.
     
+    Employees rejected because of their data (e.g. a value too long for its
+    column) are isolated by bulk_loader.copy_upsert_isolated and counted as
+    errors. When a birth date changes, the daily rollup of that employee's
+    atestado dates is rebuilt in the same transaction.
+    
     Args:
-        employees (list): List of employee records.
+        employees (iterable): Employee records; streamed straight into COPY.
+        company_id (int): Company ID.
         company_code (str): Company code.
         
     Returns:
-        tuple: (total_processed, total_updated, total_errors) counts.
+        tuple: (total_inserted, total_updated, total_errors) counts.
     """
     if not DATABASE_URL:
         raise ValueError("DATABASE_URL not configured")
     
-    if not employees:
-        return (0, 0, 0)
-    
-    total_processed = 0
-    total_errors = 0
+    sent = 0
     
-    # Agrupar em lotes maiores para processamento eficiente
-    batch_size = 500
-    batches = [employees[i:i + batch_size] for i in range(0, len(employees), batch_size)]
+    def rows():
+        nonlocal sent
+        for employee in employees:
+            sent += 1
+            yield tuple(employee[c] for c in EMPLOYEE_COLUMNS)
     
+    connection = get_database_connection()
     try:
-        connection = get_database_connection()
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        
-        for batch in batches:
-            try:
-                # Preparar para upsert em lote usando a restrição unique_together do modelo
-                upsert_query = """
-                INSERT INTO funcionarios_funcionario (
-                    empresa_id, "CODIGOEMPRESA", "NOMEEMPRESA", "CODIGO", "NOME", 
-                    "CODIGOUNIDADE", "NOMEUNIDADE", "CODIGOSETOR", "NOMESETOR", 
-                    "CODIGOCARGO", "NOMECARGO", "CBOCARGO", "CCUSTO", "NOMECENTROCUSTO", 
-                    "MATRICULAFUNCIONARIO", "CPF", "RG", "UFRG", "ORGAOEMISSORRG", 
-                    "SITUACAO", "SEXO", "PIS", "CTPS", "SERIECTPS", "ESTADOCIVIL", 
-                    "TIPOCONTATACAO", "DATA_NASCIMENTO", "DATA_ADMISSAO", "DATA_DEMISSAO", 
-                    "ENDERECO", "NUMERO_ENDERECO", "BAIRRO", "CIDADE", "UF", "CEP", 
-                    "TELEFONERESIDENCIAL", "TELEFONECELULAR", "EMAIL", "DEFICIENTE", 
-                    "DEFICIENCIA", "NM_MAE_FUNCIONARIO", "DATAULTALTERACAO", "MATRICULARH", 
-                    "COR", "ESCOLARIDADE", "NATURALIDADE", "RAMAL", "REGIMEREVEZAMENTO", 
-                    "REGIMETRABALHO", "TELCOMERCIAL", "TURNOTRABALHO"
-                ) VALUES %s
-                ON CONFLICT ("CODIGOEMPRESA", "CODIGO") 
-                DO UPDATE SET
-                    empresa_id = EXCLUDED.empresa_id,
-                    "NOMEEMPRESA" = EXCLUDED."NOMEEMPRESA",
-                    "NOME" = EXCLUDED."NOME",
-                    "CODIGOUNIDADE" = EXCLUDED."CODIGOUNIDADE",
-                    "NOMEUNIDADE" = EXCLUDED."NOMEUNIDADE",
-                    "CODIGOSETOR" = EXCLUDED."CODIGOSETOR",
-                    "NOMESETOR" = EXCLUDED."NOMESETOR",
-                    "CODIGOCARGO" = EXCLUDED."CODIGOCARGO",
-                    "NOMECARGO" = EXCLUDED."NOMECARGO",
-                    "CBOCARGO" = EXCLUDED."CBOCARGO",
-                    "CCUSTO" = EXCLUDED."CCUSTO",
-                    "NOMECENTROCUSTO" = EXCLUDED."NOMECENTROCUSTO",
-                    "MATRICULAFUNCIONARIO" = 
-                        CASE 
-                            WHEN funcionarios_funcionario."MATRICULAFUNCIONARIO" IS NULL OR funcionarios_funcionario."MATRICULAFUNCIONARIO" = '' 
-                            THEN EXCLUDED."MATRICULAFUNCIONARIO"
-                            ELSE funcionarios_funcionario."MATRICULAFUNCIONARIO" 
-                        END,
-                    "CPF" = EXCLUDED."CPF",
-                    "RG" = EXCLUDED."RG",
-                    "UFRG" = EXCLUDED."UFRG",
-                    "ORGAOEMISSORRG" = EXCLUDED."ORGAOEMISSORRG",
-                    "SITUACAO" = EXCLUDED."SITUACAO",
-                    "SEXO" = EXCLUDED."SEXO",
-                    "PIS" = EXCLUDED."PIS",
-                    "CTPS" = EXCLUDED."CTPS",
-                    "SERIECTPS" = EXCLUDED."SERIECTPS",
-                    "ESTADOCIVIL" = EXCLUDED."ESTADOCIVIL",
-                    "TIPOCONTATACAO" = EXCLUDED."TIPOCONTATACAO",
-                    "DATA_NASCIMENTO" = EXCLUDED."DATA_NASCIMENTO",
-                    "DATA_ADMISSAO" = EXCLUDED."DATA_ADMISSAO",
-                    "DATA_DEMISSAO" = EXCLUDED."DATA_DEMISSAO",
-                    "ENDERECO" = EXCLUDED."ENDERECO",
-                    "NUMERO_ENDERECO" = EXCLUDED."NUMERO_ENDERECO",
-                    "BAIRRO" = EXCLUDED."BAIRRO",
-                    "CIDADE" = EXCLUDED."CIDADE",
-                    "UF" = EXCLUDED."UF",
-                    "CEP" = EXCLUDED."CEP",
-                    "TELEFONERESIDENCIAL" = EXCLUDED."TELEFONERESIDENCIAL",
-                    "TELEFONECELULAR" = EXCLUDED."TELEFONECELULAR",
-                    "EMAIL" = EXCLUDED."EMAIL",
-                    "DEFICIENTE" = EXCLUDED."DEFICIENTE",
-                    "DEFICIENCIA" = EXCLUDED."DEFICIENCIA",
-                    "NM_MAE_FUNCIONARIO" = EXCLUDED."NM_MAE_FUNCIONARIO",
-                    "DATAULTALTERACAO" = EXCLUDED."DATAULTALTERACAO",
-                    "MATRICULARH" = EXCLUDED."MATRICULARH",
-                    "COR" = EXCLUDED."COR",
-                    "ESCOLARIDADE" = EXCLUDED."ESCOLARIDADE",
-                    "NATURALIDADE" = EXCLUDED."NATURALIDADE",
-                    "RAMAL" = EXCLUDED."RAMAL",
-                    "REGIMEREVEZAMENTO" = EXCLUDED."REGIMEREVEZAMENTO",
-                    "REGIMETRABALHO" = EXCLUDED."REGIMETRABALHO",
-                    "TELCOMERCIAL" = EXCLUDED."TELCOMERCIAL",
-                    "TURNOTRABALHO" = EXCLUDED."TURNOTRABALHO";
+        with connection.cursor() as cursor:
+            snapshot_birth_dates(cursor, company_id)
+        
+        inserted, updated, rejected = copy_upsert_isolated(
+            connection,
+            "funcionarios_funcionario",
+            EMPLOYEE_COLUMNS,
+            rows(),
+            conflict_columns=['CODIGOEMPRESA', 'CODIGO'],
+            update_expressions={
+                # Never overwrite a matricula that is already filled in
+                'MATRICULAFUNCIONARIO': """
+                    CASE
+                        WHEN funcionarios_funcionario."MATRICULAFUNCIONARIO" IS NULL OR funcionarios_funcionario."MATRICULAFUNCIONARIO" = ''
+                        THEN EXCLUDED."MATRICULAFUNCIONARIO"
+                        ELSE funcionarios_funcionario."MATRICULAFUNCIONARIO"
+                    END
                 """
-                
-                # Extrair valores na ordem correta
-                values = []
-                for employee in batch:
-                    values.append((
-                        employee['empresa_id'], employee['CODIGOEMPRESA'], employee['NOMEEMPRESA'], 
-                        employee['CODIGO'], employee['NOME'], employee['CODIGOUNIDADE'], 
-                        employee['NOMEUNIDADE'], employee['CODIGOSETOR'], employee['NOMESETOR'], 
-                        employee['CODIGOCARGO'], employee['NOMECARGO'], employee['CBOCARGO'], 
-                        employee['CCUSTO'], employee['NOMECENTROCUSTO'], employee['MATRICULAFUNCIONARIO'], 
-                        employee['CPF'], employee['RG'], employee['UFRG'], employee['ORGAOEMISSORRG'], 
-                        employee['SITUACAO'], employee['SEXO'], employee['PIS'], employee['CTPS'], 
-                        employee['SERIECTPS'], employee['ESTADOCIVIL'], employee['TIPOCONTATACAO'], 
-                        employee['DATA_NASCIMENTO'], employee['DATA_ADMISSAO'], employee['DATA_DEMISSAO'], 
-                        employee['ENDERECO'], employee['NUMERO_ENDERECO'], employee['BAIRRO'], 
-                        employee['CIDADE'], employee['UF'], employee['CEP'], employee['TELEFONERESIDENCIAL'], 
-                        employee['TELEFONECELULAR'], employee['EMAIL'], employee['DEFICIENTE'], 
-                        employee['DEFICIENCIA'], employee['NM_MAE_FUNCIONARIO'], employee['DATAULTALTERACAO'], 
-                        employee['MATRICULARH'], employee['COR'], employee['ESCOLARIDADE'], 
-                        employee['NATURALIDADE'], employee['RAMAL'], employee['REGIMEREVEZAMENTO'], 
-                        employee['REGIMETRABALHO'], employee['TELCOMERCIAL'], employee['TURNOTRABALHO']
-                    ))
-                
-                # Executar a operação em lote
-                execute_values(cursor, upsert_query, values)
-                connection.commit()
-                
-                total_processed += len(batch)
-                logger.info(f"Batch processed successfully: {len(batch)} employees for company {company_code}")
-                
-            except Exception as e:
-                connection.rollback()
-                total_errors += len(batch)
-                logger.error(f"Error processing batch for company {company_code}: {str(e)}")
+            }
+        )
         
-        cursor.close()
-        connection.close()
+        with connection.cursor() as cursor:
+            refreshed_dates = refresh_rollup_for_birth_dates(cursor, company_id)
+        connection.commit()
         
-        logger.info(f"Database update completed for company {company_code}: {total_processed} processed, {total_errors} errors")
-        return (total_processed, 0, total_errors)
+        if refreshed_dates:
+            logger.info(f"Company {company_code}: daily rollup rebuilt for {refreshed_dates} dates after birth date changes")
+        logger.info(f"Database update completed for company {company_code}: {inserted} inserted, {updated} updated, {rejected} rejected")
+        return (inserted, updated, rejected)
     
-    except Exception as e:
-        logger.error(f"Database error for company {company_code}: {str(e)}")
+    except psycopg2.Error as e:
+        connection.rollback()
+        logger.error(f"Error saving employees for company {company_code}: {str(e)}")
+        return (0, 0, sent)
+    
+    except Exception:
+        # API errors raised while the records are streamed fail the company
+        connection.rollback()
         raise
+    
+    finally:
+        connection.close()
+
+def bump_company_data_version(company_id):
+    """
+    Increment dashboard_empresa.versao_dados so cached dashboard pages of the
+    company are recomputed on the next request.
+    
+    Args:
+        company_id (int): Company ID.
+    """
+    connection = get_database_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE dashboard_empresa SET versao_dados = versao_dados + 1
+                WHERE id = %s
+            """, (company_id,))
+        connection.commit()
+    finally:
+        connection.close()
 
 def process_company(company, include_inactive=False):
     """
@@ -599,23 +626,38 @@ def process_company(company, include_inactive=False):
     company_code = company['CODIGO']
     
     try:
-        api_data = get_employee_data(
+        known_hashes, watermark = ({}, None) if args.full else load_employee_state(company_id)
+        
+        records = get_employee_data(
             company_code=company_code,
             tipo_saida='json',
-            include_inactive=include_inactive
+            include_inactive=include_inactive,
+            changed_since=watermark
         )
         
-        employees = map_api_to_db_schema(api_data, company_id, company_code)
-        
-        if employees:
-            processed, updated, errors = save_employees_to_database(employees, company_code)
-            return company_code, processed, updated, errors
-        else:
-            return company_code, 0, 0, 0
+        # API records are parsed, mapped, filtered and copied to the
+        # database one at a time, so memory does not grow with the export
+        skipped = 0
+        
+        def changed_employees():
+            nonlocal skipped
+            for employee in map_api_to_db_schema(records, company_id, company_code):
+                employee['hash_conteudo'] = employee_content_hash(employee)
+                if known_hashes.get(employee['CODIGO']) == employee['hash_conteudo']:
+                    skipped += 1
+                    continue
+                yield employee
+        
+        processed, updated, errors = save_employees_to_database(changed_employees(), company_id, company_code)
+        if skipped:
+            logger.info(f"Company {company_code}: {skipped} unchanged employees skipped")
+        if processed or updated:
+            bump_company_data_version(company_id)
+        return company_code, processed, updated, errors
     
     except Exception as e:
         logger.error(f"Failed to process company {company_code}: {str(e)}")
-        return company_code, 0, 0, 0
+        raise
 
 def main():
     """Main job execution function"""
@@ -625,30 +667,39 @@ def main():
     try:
         companies = get_companies_from_db(args.empresa) if args.empresa else get_companies_from_db()
         
+        logger.info(f"Processing {len(companies)} companies with {args.workers} worker(s)")
+        
         total_processed = 0
         total_updated = 0
         total_errors = 0
         processed_companies = 0
+        failed_companies = []
         
-        for company in companies:
-            if not company:
-                continue
-                
-            company_code, processed, updated, errors = process_company(
-                company, include_inactive=args.all
-            )
-            
-            total_processed += processed
-            total_updated += updated
-            total_errors += errors
+        results = process_companies(
+            lambda company: process_company(company, include_inactive=args.all),
+            companies,
+            workers=args.workers
+        )
+        
+        for company, result, error in results:
             processed_companies += 1
             
+            if error:
+                failed_companies.append(company['CODIGO'])
+            else:
+                company_code, processed, updated, errors = result
+                total_processed += processed
+                total_updated += updated
+                total_errors += errors
+            
             logger.info(f"Progress: {processed_companies}/{len(companies)} companies processed")
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         logger.info(f"Import completed in {duration:.2f} seconds")
-        logger.info(f"Total employees: {total_processed} processed, {total_errors} errors")
+        logger.info(f"Total employees: {total_processed} inserted, {total_updated} updated, {total_errors} errors")
+        if failed_companies:
+            logger.error(f"{len(failed_companies)} companies failed: {', '.join(map(str, failed_companies))}")
         
     except Exception as e:
         logger.error(f"Import failed: {str(e)}")
@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 """
-Populate NTEP Data Job
+Importar NTEP Job
 
-Este script lê um dicionário JSON com dados de CNAE e CIDs associados (NTEP)
-e faz inserção/atualização (upsert) diretamente no banco usando psycopg2.
+Lê a lista oficial do NTEP (CNAE -> CIDs) de um arquivo local, compara com
+as tabelas cnae/ntep em memória e aplica só as diferenças, com comandos em
+lote (COPY para uma tabela temporária + upsert, ver bulk_loader). Depois
+refaz ntep_cid, a marca ntep_positivo dos atestados e o cache das empresas
+vinculadas aos CNAEs alterados.
 
 Uso:
-    python PopulateNTEPData.py
+    python ImportarNtep.py ARQUIVO [--dry-run] [--manter-ausentes]
 
 Opções:
-    --dry-run (se quiser implementar, similar ao padrão anterior)
+    ARQUIVO            Lista NTEP em JSON ou CSV
+    --dry-run          Apenas mostra as diferenças, sem alterar o banco
+    --manter-ausentes  Não remove o NTEP dos CNAEs que não constam no arquivo
+
+Formatos aceitos:
+    JSON: {"CNAE": {"descricao": "...", "cids": ["M54", ...]}, ...}
+          ou [{"cnae": "...", "descricao": "...", "cids": [...]}, ...]
+    CSV (separador , ou ;, com cabeçalho): colunas cnae, descricao e
+          cids (CIDs separados por vírgula, ponto e vírgula ou espaço)
+          ou cid (um CID por linha, repetindo o CNAE)
 
 Env Vars:
     DATABASE_URL ou EXTERNAL_URL_DB - string de conexão Postgres.
@@ -18,11 +30,25 @@ Env Vars:
 import os
 import sys
 import logging
+import argparse
 from pathlib import Path
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from bulk_loader import copy_upsert
+from lista_ntep import comparar_ntep, ler_arquivo_ntep
+
+# Regras compartilhadas com o app Django (absenteismo.regras não importa o Django)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from absenteismo.regras import RECALCULAR_NTEP, normalizar_cid
+
+parser = argparse.ArgumentParser(description="Importar a lista NTEP (CNAE -> CIDs) de um arquivo JSON ou CSV")
+parser.add_argument("arquivo", type=str, help="Arquivo JSON ou CSV com a lista NTEP")
+parser.add_argument("--dry-run", action="store_true", help="Apenas mostrar as diferenças, sem alterar o banco de dados")
+parser.add_argument("--manter-ausentes", action="store_true", help="Não remover o NTEP dos CNAEs ausentes do arquivo")
+args = parser.parse_args()
+
 # =============================================
 # ============ CONFIGURAÇÕES INICIAIS =========
 # =============================================
@@ -63,11 +89,6 @@ if '://' in DATABASE_URL:
     masked_db_url = prefix + '://***:***@' + suffix.split('@')[-1]
 logger.info(f"Usando database URL: {masked_db_url}")
 
-# =============================================
-# ============ DICIONÁRIO JSON DE EXEMPLO =====
-# =============================================
-json_data = ''
-
 # =============================================
 # ============ FUNÇÕES AUXILIARES =============
 # =============================================
@@ -75,66 +96,149 @@ def get_connection():
     """Retorna uma conexão psycopg2 baseada em DATABASE_URL."""
     return psycopg2.connect(DATABASE_URL)
 
-def upsert_cnae(codigo, descricao, cursor):
-    """
-    Faz upsert na tabela cnae:
-      - Inserir se não existir
-      - Se existir, atualizar descrição
-    Retorna o ID do registro na tabela cnae.
+def carregar_ntep_atual(cursor):
     """
-    upsert_query = """
-        INSERT INTO cnae (codigo, descricao)
-        VALUES (%s, %s)
-        ON CONFLICT (codigo) DO UPDATE
-        SET descricao = EXCLUDED.descricao
-        RETURNING id
+    Estado atual das tabelas cnae e ntep, com os CIDs normalizados como os do arquivo.
+
+    Retorna {codigo_cnae: {'descricao': str, 'ntep': bool, 'ntep_descricao': str, 'cids': set}}.
     """
-    cursor.execute(upsert_query, (codigo, descricao))
-    cnae_id = cursor.fetchone()['id']
-    return cnae_id
+    cursor.execute("""
+        SELECT c.codigo, c.descricao, n.id IS NOT NULL AS tem_ntep,
+               n.descricao AS ntep_descricao, n.cids
+        FROM cnae c
+        LEFT JOIN ntep n ON n.cnae_id = c.id
+    """)
+    return {
+        linha['codigo']: {
+            'descricao': linha['descricao'],
+            'ntep': linha['tem_ntep'],
+            'ntep_descricao': linha['ntep_descricao'] or '',
+            'cids': {normalizar_cid(cid) for cid in linha['cids'] or []} - {''},
+        }
+        for linha in cursor.fetchall()
+    }
+
+def relatar_diferencas(diferencas):
+    def amostra(codigos):
+        return f" ({', '.join(codigos[:10])}{', ...' if len(codigos) > 10 else ''})" if codigos else ''
+
+    logger.info(f"CNAEs novos: {len(diferencas['cnaes_novos'])}{amostra(diferencas['cnaes_novos'])}")
+    logger.info(f"CNAEs com descrição alterada: {len(diferencas['cnaes_alterados'])}{amostra(diferencas['cnaes_alterados'])}")
+    logger.info(f"NTEP novos: {len(diferencas['ntep_novos'])}{amostra(diferencas['ntep_novos'])}")
+    logger.info(f"NTEP alterados: {len(diferencas['ntep_alterados'])}{amostra(diferencas['ntep_alterados'])}")
+    logger.info(f"NTEP removidos: {len(diferencas['ntep_removidos'])}{amostra(diferencas['ntep_removidos'])}")
+    logger.info(f"CIDs incluídos: {diferencas['cids_incluidos']}, excluídos: {diferencas['cids_excluidos']}")
 
-def upsert_ntep(cnae_id, descricao, cids, cursor):
+def array_postgres(valores):
+    """Literal de array do PostgreSQL para uma lista de textos (usado no COPY)."""
+    itens = ('"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in valores)
+    return '{' + ','.join(itens) + '}'
+
+def aplicar_diferencas(arquivo, diferencas, cursor, conn):
+    """Grava em lote as diferenças de cnae e ntep e remove os NTEP ausentes."""
+    cnaes = diferencas['cnaes_novos'] + diferencas['cnaes_alterados']
+    if cnaes:
+        copy_upsert(
+            conn, 'cnae', ['codigo', 'descricao'],
+            ((codigo, arquivo[codigo]['descricao']) for codigo in cnaes),
+            conflict_columns=['codigo'],
+        )
+
+    nteps = diferencas['ntep_novos'] + diferencas['ntep_alterados']
+    if nteps:
+        cursor.execute("SELECT codigo, id FROM cnae WHERE codigo = ANY(%s)", (nteps,))
+        ids = {linha['codigo']: linha['id'] for linha in cursor.fetchall()}
+        copy_upsert(
+            conn, 'ntep', ['cnae_id', 'descricao', 'cids'],
+            (
+                (ids[codigo], arquivo[codigo]['descricao'], array_postgres(sorted(arquivo[codigo]['cids'])))
+                for codigo in nteps
+            ),
+            conflict_columns=['cnae_id'],
+        )
+
+    if diferencas['ntep_removidos']:
+        cursor.execute("""
+            DELETE FROM ntep
+            WHERE cnae_id IN (SELECT id FROM cnae WHERE codigo = ANY(%s))
+        """, (diferencas['ntep_removidos'],))
+
+def sincronizar_ntep_cids(codigos, cursor):
+    """
+    Refaz as linhas de ntep_cid (CIDs normalizados de ntep.cids, ver
+    absenteismo.regras.normalizar_cid) dos CNAEs informados.
     """
-    Faz upsert na tabela ntep:
-      - Inserir se não existir (por cnae_id único)
-      - Se existir, atualizar campos
+    cursor.execute("""
+        DELETE FROM ntep_cid
+        WHERE cnae_id IN (SELECT id FROM cnae WHERE codigo = ANY(%s))
+    """, (codigos,))
+    cursor.execute("""
+        INSERT INTO ntep_cid (cnae_id, cid)
+        SELECT DISTINCT n.cnae_id, UPPER(REPLACE(TRIM(c.cid), '.', ''))
+        FROM ntep n
+        JOIN cnae ON cnae.id = n.cnae_id
+        CROSS JOIN unnest(n.cids) AS c(cid)
+        WHERE cnae.codigo = ANY(%s) AND TRIM(c.cid) <> ''
+    """, (codigos,))
+    logger.info(f"{cursor.rowcount} CIDs NTEP indexados em ntep_cid.")
+
+def recalcular_ntep_empresas_dos_cnaes(codigos, cursor):
     """
-    upsert_query = """
-        INSERT INTO ntep (cnae_id, descricao, cids)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (cnae_id)
-        DO UPDATE SET 
-            descricao = EXCLUDED.descricao,
-            cids = EXCLUDED.cids
+    Refaz absenteismo_absenteismo.ntep_positivo das empresas vinculadas aos
+    CNAEs e incrementa dashboard_empresa.versao_dados delas, descartando o
+    cache dos CIDs NTEP (absenteismo.regras.RECALCULAR_NTEP, a mesma do app).
     """
-    cursor.execute(upsert_query, (cnae_id, descricao, cids))
+    cursor.execute("""
+        SELECT DISTINCT ce.empresa_id
+        FROM cnae_empresas ce
+        JOIN cnae c ON c.id = ce.cnae_id
+        WHERE c.codigo = ANY(%s)
+    """, (codigos,))
+    empresas = [linha['empresa_id'] for linha in cursor.fetchall()]
+    if not empresas:
+        return
+
+    cursor.execute(RECALCULAR_NTEP, {'empresas': empresas})
+    logger.info(f"Marca NTEP recalculada em {cursor.rowcount} atestados.")
+
+    cursor.execute("""
+        UPDATE dashboard_empresa SET versao_dados = versao_dados + 1
+        WHERE id = ANY(%s)
+    """, (empresas,))
+    logger.info(f"Cache NTEP invalidado para {len(empresas)} empresas.")
 
-def populate_ntep_data():
+def importar_ntep(caminho, dry_run=False, manter_ausentes=False):
     """
-    Percorre o dicionário json_data e faz o upsert em cnae e ntep.
+    Lê o arquivo, compara com o banco e aplica apenas as diferenças.
     """
+    arquivo = ler_arquivo_ntep(caminho)
+    logger.info(f"{len(arquivo)} CNAEs lidos de {caminho}")
+
     conn = None
     try:
         conn = get_connection()
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            logger.info("Iniciando processo de upsert em CNAE e NTEP...")
-            for codigo, valores in json_data.items():
-                descricao_cnae = valores.get("descricao", "")
-                lista_cids = valores.get("cids", [])
+            diferencas = comparar_ntep(arquivo, carregar_ntep_atual(cursor), manter_ausentes)
+            relatar_diferencas(diferencas)
 
-                # Upsert na tabela cnae
-                cnae_id = upsert_cnae(codigo, descricao_cnae, cursor)
+            alterados = diferencas['ntep_novos'] + diferencas['ntep_alterados'] + diferencas['ntep_removidos']
+            if dry_run:
+                logger.info("SIMULAÇÃO: nenhuma alteração foi feita no banco de dados")
+                return
+            if not alterados and not diferencas['cnaes_alterados']:
+                logger.info("Tabelas NTEP já estão atualizadas.")
+                return
 
-                # Upsert na tabela ntep
-                upsert_ntep(cnae_id, descricao_cnae, lista_cids, cursor)
+            aplicar_diferencas(arquivo, diferencas, cursor, conn)
+            if alterados:
+                sincronizar_ntep_cids(alterados, cursor)
+                recalcular_ntep_empresas_dos_cnaes(alterados, cursor)
 
-                logger.info(f"CNAE {codigo} - dados NTEP inseridos/atualizados com sucesso.")
-            
             conn.commit()
             logger.info("Transação concluída com sucesso.")
-    
+
     except Exception as e:
-        logger.error(f"Erro ao popular dados NTEP: {e}")
+        logger.error(f"Erro ao importar dados NTEP: {e}")
         if conn:
             conn.rollback()
         raise
@@ -147,7 +251,7 @@ def populate_ntep_data():
 # =============================================
 def main():
     try:
-        populate_ntep_data()
+        importar_ntep(args.arquivo, args.dry_run, args.manter_ausentes)
     except Exception as e:
         logger.error(f"O job falhou: {str(e)}")
         sys.exit(1)
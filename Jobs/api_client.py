@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the SOC and Connect APIs
+
+All import jobs go through one pooled requests.Session, so TCP/TLS
+connections are kept alive between calls, responses are requested
+compressed, and failed calls (timeouts, connection errors, 5xx) are retried
+with exponential backoff plus random jitter.
+
+Large exports can be read with stream=True and iter_json_records, which
+parses the body incrementally with ijson when it is installed, so only one
+record at a time is held in memory. Without ijson the whole body is parsed
+with response.json(), as before, and a warning is logged: install ijson on
+every host that runs the jobs.
+
+Environment variables:
+    API_TIMEOUT - Default request timeout in seconds (default: 60)
+    API_MAX_RETRIES - Retries after the first attempt (default: 3)
+    API_BACKOFF - Base backoff in seconds, doubled on each retry (default: 1)
+    API_BACKOFF_JITTER - Maximum random seconds added to each backoff (default: 1)
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+try:
+    import ijson
+except ImportError:  # records are then parsed from the full body (see iter_json_records)
+    ijson = None
+
+from concurrency import API_CONCURRENCY
+
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', '60'))
+API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', '3'))
+API_BACKOFF = float(os.getenv('API_BACKOFF', '1'))
+API_BACKOFF_JITTER = float(os.getenv('API_BACKOFF_JITTER', '1'))
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+_warned_missing_ijson = False
+
+
+def get_session():
+    """Process-wide session with a connection pool sized for the fetch threads"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(API_CONCURRENCY, 10))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive',
+            })
+            _session = session
+    return _session
+
+
+def get(url, params=None, timeout=None, limiter=None, stream=False, retry_timeouts=True):
+    """
+    GET a URL with retries on timeouts, connection errors and 5xx responses
+
+    Args:
+        url (str): Request URL
+        params (dict): Query string parameters
+        timeout (float): Timeout in seconds (default: API_TIMEOUT)
+        limiter: Optional rate limiter with a wait() method, called before every attempt
+        stream (bool): Leave the body unread (see iter_json_records)
+        retry_timeouts (bool): Retry read timeouts; callers that react to a
+            timeout themselves (e.g. by asking for less data) pass False
+
+    Returns:
+        requests.Response: The last response received (4xx and 2xx are not retried)
+    """
+    timeout = timeout or API_TIMEOUT
+    for attempt in range(API_MAX_RETRIES + 1):
+        if limiter:
+            limiter.wait()
+        try:
+            response = get_session().get(url, params=params, timeout=timeout, stream=stream)
+            if response.status_code < 500 or attempt == API_MAX_RETRIES:
+                return response
+            reason = f"HTTP {response.status_code}"
+            # Release the pooled connection of a streamed response that is discarded
+            response.close()
+        except (requests.Timeout, requests.ConnectionError) as e:
+            if attempt == API_MAX_RETRIES or (not retry_timeouts and isinstance(e, requests.ReadTimeout)):
+                raise
+            reason = str(e)
+
+        delay = API_BACKOFF * (2 ** attempt) + random.uniform(0, API_BACKOFF_JITTER)
+        logger.warning(f"API call failed ({reason}); retry {attempt + 1}/{API_MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def soc_export_url(base_url, params):
+    """URL of the SOC exportadados endpoint for the given parameter dict"""
+    param_json = json.dumps(params, separators=(',', ':'))
+    return f"{base_url}/exportadados?parametro={quote(param_json)}"
+
+
+def get_soc_export(base_url, params, timeout=None, limiter=None, stream=False, retry_timeouts=True):
+    """GET the SOC exportadados endpoint (see soc_export_url) with retries"""
+    return get(soc_export_url(base_url, params), timeout=timeout, limiter=limiter, stream=stream,
+               retry_timeouts=retry_timeouts)
+
+
+def extract_records(data):
+    """
+    Get the list of records out of the different export response formats
+
+    Args:
+        data (dict or list): Parsed response body
+
+    Returns:
+        list: Records of the response
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and 'data' in data:
+        return data.get('data') or []
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, list):
+                return value
+        if data:
+            # Single record as a dict
+            return [data]
+    return []
+
+
+class _PeekableStream:
+    """Wraps a raw response so its first significant byte can be inspected"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._head = b''
+
+    def first_byte(self):
+        while not self._head.strip():
+            chunk = self._raw.read(1024)
+            if not chunk:
+                return b''
+            self._head += chunk
+        return self._head.lstrip()[:1]
+
+    def read(self, size=-1):
+        if self._head:
+            data, self._head = self._head, b''
+            return data + self._raw.read() if size < 0 else data
+        return self._raw.read(size)
+
+
+def _warn_missing_ijson():
+    global _warned_missing_ijson
+    if not _warned_missing_ijson:
+        _warned_missing_ijson = True
+        logger.warning("ijson is not installed: SOC export responses are loaded whole into memory "
+                       "instead of streamed. Install it with 'pip install ijson'.")
+
+
+def iter_json_records(response):
+    """
+    Yield the records of a JSON export response one at a time
+
+    With ijson a top-level array is parsed incrementally from the socket;
+    other shapes (an error or a single record as an object) are small and
+    are parsed whole. The response is closed when the generator finishes.
+
+    Args:
+        response (requests.Response): Response obtained with stream=True
+
+    Yields:
+        dict: One record of the export
+    """
+    try:
+        if ijson is None:
+            _warn_missing_ijson()
+            yield from extract_records(response.json())
+            return
+        response.raw.decode_content = True
+        body = _PeekableStream(response.raw)
+        if body.first_byte() == b'[':
+            yield from ijson.items(body, 'item', use_float=True)
+        elif body.first_byte():
+            yield from extract_records(json.load(body))
+    except ReadTimeoutError as e:
+        raise requests.ReadTimeout(str(e)) from e
+    finally:
+        response.close()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Staging-table bulk loader shared by the import jobs
+
+Records are streamed into a temporary table with COPY FROM STDIN (CSV) and
+merged into the target table with a single INSERT ... SELECT ... ON CONFLICT.
+Inserted and updated rows are told apart with RETURNING (xmax = 0).
+
+copy_upsert_isolated does the same in batches under savepoints: a batch that
+PostgreSQL rejects because of its data is retried in halves, so only the
+offending rows are lost and the caller's transaction stays usable.
+
+Usage:
+    from bulk_loader import copy_upsert
+
+    inserted, updated = copy_upsert(
+        connection, "dashboard_empresa", columns, rows,
+        conflict_columns=["CODIGO"],
+    )
+    connection.commit()
+"""
+
+import logging
+from itertools import islice
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Rows encoded per chunk handed to COPY
+COPY_CHUNK_ROWS = 1000
+
+# Rows upserted per savepoint by copy_upsert_isolated
+ISOLATED_BATCH_ROWS = 5000
+
+
+def _csv_field(value):
+    """Encode a value as a PostgreSQL CSV field (unquoted empty = NULL)"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class _CsvStream:
+    """File-like object that encodes rows to CSV lazily as COPY reads it"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.count = 0
+
+    def _fill(self):
+        lines = []
+        for row in self._rows:
+            lines.append(','.join(_csv_field(v) for v in row) + '\n')
+            if len(lines) >= COPY_CHUNK_ROWS:
+                break
+        self.count += len(lines)
+        self._buffer += ''.join(lines)
+        return bool(lines)
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+
+def _quote(column):
+    return f'"{column}"'
+
+
+def copy_upsert(connection, table, columns, rows, conflict_columns, update_columns=None,
+                update_expressions=None, insert_expressions=None):
+    """
+    Load rows into table through a COPY-filled staging table and upsert them
+
+    When several rows share the same conflict key, the last one wins. The
+    caller owns the transaction: nothing is committed here.
+
+    Args:
+        connection: psycopg2 connection
+        table (str): Target table name
+        columns (list): Column names, in the order of each row
+        rows (iterable): Tuples of values, one per record
+        conflict_columns (list): Columns of the unique constraint used by ON CONFLICT
+        update_columns (list): Columns overwritten on conflict; defaults to every
+            column that is not part of the key. An empty list means DO NOTHING
+        update_expressions (dict): SQL expression per column for DO UPDATE SET,
+            replacing the default EXCLUDED."column" (e.g. {"data_atualizacao": "NOW()"})
+        insert_expressions (dict): Extra columns filled only by SQL expressions
+            on INSERT (e.g. {"data_criacao": "NOW()"})
+
+    Returns:
+        tuple: (inserted, updated) counts
+    """
+    update_expressions = update_expressions or {}
+    insert_expressions = insert_expressions or {}
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in conflict_columns]
+
+    staging = f"staging_{table}"
+    column_list = ", ".join(_quote(c) for c in columns)
+    key_list = ", ".join(_quote(c) for c in conflict_columns)
+
+    target_columns = column_list
+    select_columns = column_list
+    if insert_expressions:
+        target_columns += ", " + ", ".join(_quote(c) for c in insert_expressions)
+        select_columns += ", " + ", ".join(insert_expressions.values())
+
+    assignments = [
+        f'{_quote(c)} = {update_expressions.get(c, f"EXCLUDED.{_quote(c)}")}' for c in update_columns
+    ]
+    assignments += [
+        f'{_quote(c)} = {expression}' for c, expression in update_expressions.items() if c not in update_columns
+    ]
+    conflict_action = f"DO UPDATE SET {', '.join(assignments)}" if assignments else "DO NOTHING"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(f"""
+            CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+            SELECT {column_list} FROM {table} WITH NO DATA
+        """)
+        cursor.execute(f"ALTER TABLE {staging} ADD COLUMN _row_order BIGSERIAL")
+
+        stream = _CsvStream(rows)
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", stream)
+        if not stream.count:
+            return (0, 0)
+
+        cursor.execute(f"""
+            WITH upsert AS (
+                INSERT INTO {table} ({target_columns})
+                SELECT DISTINCT ON ({key_list}) {select_columns}
+                FROM {staging}
+                ORDER BY {key_list}, _row_order DESC
+                ON CONFLICT ({key_list}) {conflict_action}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+            FROM upsert
+        """)
+        inserted, updated = cursor.fetchone()
+
+    return (inserted, updated)
+
+
+def copy_upsert_isolated(connection, table, columns, rows, conflict_columns, batch_rows=None, **options):
+    """
+    copy_upsert in batches of batch_rows rows, each under a savepoint
+
+    A batch rejected with DataError or IntegrityError (e.g. a value too long
+    for its column) is rolled back to its savepoint and retried in halves
+    down to single rows; rows that still fail are logged and skipped. Other
+    errors propagate. Rows are consumed lazily, one batch at a time. The
+    caller owns the transaction: nothing is committed here.
+
+    Args:
+        connection: psycopg2 connection
+        table (str): Target table name
+        columns (list): Column names, in the order of each row
+        rows (iterable): Tuples of values, one per record
+        conflict_columns (list): Columns of the unique constraint used by ON CONFLICT
+        batch_rows (int): Rows per savepoint (default: ISOLATED_BATCH_ROWS)
+        **options: update_columns, update_expressions and insert_expressions of copy_upsert
+
+    Returns:
+        tuple: (inserted, updated, rejected) counts
+    """
+    batch_rows = batch_rows or ISOLATED_BATCH_ROWS
+    rows = iter(rows)
+    totals = (0, 0, 0)
+    while True:
+        batch = list(islice(rows, batch_rows))
+        if not batch:
+            return totals
+        counts = _upsert_batch(connection, table, columns, batch, conflict_columns, options)
+        totals = tuple(a + b for a, b in zip(totals, counts))
+
+
+def _upsert_batch(connection, table, columns, batch, conflict_columns, options):
+    with connection.cursor() as cursor:
+        cursor.execute("SAVEPOINT copy_upsert_batch")
+    try:
+        inserted, updated = copy_upsert(connection, table, columns, batch, conflict_columns, **options)
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        with connection.cursor() as cursor:
+            cursor.execute("ROLLBACK TO SAVEPOINT copy_upsert_batch")
+            cursor.execute("RELEASE SAVEPOINT copy_upsert_batch")
+        if len(batch) == 1:
+            key = {c: batch[0][columns.index(c)] for c in conflict_columns}
+            logger.error(f"Skipping {table} row {key}: {str(e).strip()}")
+            return (0, 0, 1)
+
+        logger.warning(f"Batch of {len(batch)} {table} rows rejected, retrying in halves: {str(e).strip()}")
+        middle = len(batch) // 2
+        first = _upsert_batch(connection, table, columns, batch[:middle], conflict_columns, options)
+        second = _upsert_batch(connection, table, columns, batch[middle:], conflict_columns, options)
+        return tuple(a + b for a, b in zip(first, second))
+
+    with connection.cursor() as cursor:
+        cursor.execute("RELEASE SAVEPOINT copy_upsert_batch")
+    return (inserted, updated, 0)
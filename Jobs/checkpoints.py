@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Resumable import checkpoints shared by the import jobs
+
+Every unit of work (a company and a date interval) finished by a job is
+recorded in dashboard_checkpointimportacao with its status and row counts.
+A normal run starts by clearing the job's checkpoints for the companies it
+is about to process; a run with --resume keeps them and skips the units
+already marked as completed, so only failed or missing work is redone.
+"""
+
+CHECKPOINT_TABLE = "dashboard_checkpointimportacao"
+
+STATUS_COMPLETED = "concluido"
+STATUS_FAILED = "falhou"
+
+
+def reset_checkpoints(connection, job, company_ids):
+    """
+    Forget the previous run of a job for the given companies
+
+    Args:
+        connection: psycopg2 connection (the caller commits)
+        job (str): Job name
+        company_ids (list): Company IDs about to be processed
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            DELETE FROM {CHECKPOINT_TABLE}
+            WHERE job = %s AND empresa_id = ANY(%s)
+        """, (job, list(company_ids)))
+
+
+def load_completed_units(connection, job, company_id):
+    """
+    Units of a company completed by the last run of a job
+
+    Args:
+        connection: psycopg2 connection
+        job (str): Job name
+        company_id (int): Company ID
+
+    Returns:
+        set: {(interval_start, interval_end)} as dates
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT intervalo_inicio, intervalo_fim
+            FROM {CHECKPOINT_TABLE}
+            WHERE job = %s AND empresa_id = %s AND status = %s
+        """, (job, company_id, STATUS_COMPLETED))
+        return set(cursor.fetchall())
+
+
+def record_checkpoint(connection, job, company_id, interval_start, interval_end,
+                      status, inserted=0, updated=0, errors=0, message=''):
+    """
+    Insert or replace the checkpoint of one unit of work
+
+    Args:
+        connection: psycopg2 connection (the caller commits)
+        job (str): Job name
+        company_id (int): Company ID
+        interval_start (date): First day of the interval
+        interval_end (date): Last day of the interval
+        status (str): STATUS_COMPLETED or STATUS_FAILED
+        inserted (int): Rows inserted
+        updated (int): Rows updated
+        errors (int): Rows or requests that failed
+        message (str): Error message, if any
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {CHECKPOINT_TABLE} (
+                job, empresa_id, intervalo_inicio, intervalo_fim, status,
+                inseridos, atualizados, erros, mensagem, finalizado_em
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (job, empresa_id, intervalo_inicio, intervalo_fim) DO UPDATE SET
+                status = EXCLUDED.status,
+                inseridos = EXCLUDED.inseridos,
+                atualizados = EXCLUDED.atualizados,
+                erros = EXCLUDED.erros,
+                mensagem = EXCLUDED.mensagem,
+                finalizado_em = EXCLUDED.finalizado_em
+        """, (job, company_id, interval_start, interval_end, status,
+              inserted, updated, errors, message))
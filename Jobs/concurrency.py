@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Concurrent API fetching helpers shared by the import jobs
+
+TokenBucket is a thread-safe rate limiter: every API call takes one token,
+tokens refill at `rate` per second and up to `capacity` can accumulate, so a
+pool of threads sharing one bucket never exceeds the API quota while still
+overlapping the network latency of the calls.
+
+Environment variables:
+    SOC_API_CONCURRENCY - Number of API calls in flight at once (default: 4)
+    SOC_API_RATE - Requests per second allowed across all threads (default: 3)
+    SOC_API_BURST - Maximum burst of back-to-back requests (default: 3)
+    IMPORT_WORKERS - Default number of companies processed at once (default: 1)
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+API_CONCURRENCY = int(os.getenv('SOC_API_CONCURRENCY', '4'))
+API_RATE = float(os.getenv('SOC_API_RATE', '3'))
+API_BURST = int(os.getenv('SOC_API_BURST', '3'))
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', '1'))
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by all threads of a job"""
+
+    def __init__(self, rate=API_RATE, capacity=API_BURST):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                sleep_time = (1 - self._tokens) / self.rate
+            time.sleep(sleep_time)
+
+
+def fetch_concurrently(fetch, items, max_workers=API_CONCURRENCY):
+    """
+    Call fetch(item) for every item on a thread pool
+
+    Results are yielded as soon as each call finishes, so the caller can
+    process and save them on the main thread while other calls are in flight.
+    Items are submitted lazily: at most 2 * max_workers calls are pending or
+    waiting to be consumed, so finished payloads never pile up in memory
+    while the caller is still saving earlier ones.
+
+    Args:
+        fetch (callable): Function called with one item
+        items (iterable): Arguments for fetch
+        max_workers (int): Number of concurrent calls
+
+    Yields:
+        tuple: (item, result, error) - error is the exception raised, or None
+    """
+    max_workers = max(1, max_workers)
+    max_pending = 2 * max_workers
+    items = iter(items)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for item in islice(items, max_pending - len(pending)):
+                pending[executor.submit(fetch, item)] = item
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    yield item, None, error
+                else:
+                    yield item, future.result(), None
+
+
+def process_companies(process, companies, workers=IMPORT_WORKERS):
+    """
+    Call process(company) for every company, `workers` companies at a time
+
+    A failure in one company is returned as its error instead of stopping
+    the run. Each worker thread opens its own database connections through
+    the job's helpers, and all of them share the job's TokenBucket, so the
+    API budget stays global however many workers run.
+
+    Args:
+        process (callable): Function called with one company record
+        companies (iterable): Company records; empty entries are skipped
+        workers (int): Number of companies processed concurrently
+
+    Yields:
+        tuple: (company, result, error) - error is the exception raised, or None
+    """
+    companies = [company for company in companies if company]
+    if workers <= 1:
+        for company in companies:
+            try:
+                yield company, process(company), None
+            except Exception as e:
+                yield company, None, e
+        return
+    yield from fetch_concurrently(process, companies, max_workers=workers)
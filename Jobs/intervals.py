@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Date interval helpers shared by the import jobs
+
+plan_date_intervals splits a company's import period into windows sized
+from its stored volume; subtract_intervals removes the intervals already
+completed by a previous run (see checkpoints.py).
+
+Environment variables:
+    SOC_INTERVAL_TARGET_ROWS - Rows a planned window should hold (default: 2000)
+    SOC_INTERVAL_MIN_DAYS / SOC_INTERVAL_MAX_DAYS - Window size bounds (default: 1 / 90)
+"""
+
+import os
+from datetime import timedelta
+
+INTERVAL_TARGET_ROWS = int(os.getenv('SOC_INTERVAL_TARGET_ROWS', '2000'))
+INTERVAL_MIN_DAYS = int(os.getenv('SOC_INTERVAL_MIN_DAYS', '1'))
+INTERVAL_MAX_DAYS = int(os.getenv('SOC_INTERVAL_MAX_DAYS', '90'))
+
+
+def plan_date_intervals(start_date, end_date, rows_per_day):
+    """
+    Split a date range into windows expected to hold about INTERVAL_TARGET_ROWS rows
+
+    Low-volume companies get wide windows (fewer empty calls), high-volume
+    ones narrow windows (smaller payloads), always within
+    INTERVAL_MIN_DAYS..INTERVAL_MAX_DAYS.
+
+    Args:
+        start_date (date): First day of the range
+        end_date (date): Last day of the range
+        rows_per_day (float): Expected rows per day (see get_company_daily_volume)
+
+    Returns:
+        list: (start_date, end_date) date tuples, newest first
+    """
+    if rows_per_day > 0:
+        window_days = int(INTERVAL_TARGET_ROWS / rows_per_day)
+    else:
+        window_days = INTERVAL_MAX_DAYS
+    window_days = max(INTERVAL_MIN_DAYS, min(INTERVAL_MAX_DAYS, window_days))
+
+    intervals = []
+    interval_end = end_date
+    while interval_end >= start_date:
+        interval_start = max(start_date, interval_end - timedelta(days=window_days - 1))
+        intervals.append((interval_start, interval_end))
+        interval_end = interval_start - timedelta(days=1)
+
+    return intervals
+
+
+def subtract_intervals(period, completed):
+    """
+    Parts of a date range not covered by any completed interval
+
+    Args:
+        period (tuple): (start_date, end_date) as dates
+        completed (iterable): (start_date, end_date) date tuples already done
+
+    Returns:
+        list: (start_date, end_date) date tuples still to be imported
+    """
+    gaps = []
+    cursor_date, end_date = period
+    for done_start, done_end in sorted(completed):
+        if done_end < cursor_date or done_start > end_date:
+            continue
+        if done_start > cursor_date:
+            gaps.append((cursor_date, done_start - timedelta(days=1)))
+        cursor_date = max(cursor_date, done_end + timedelta(days=1))
+    if cursor_date <= end_date:
+        gaps.append((cursor_date, end_date))
+    return gaps
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Leitura da lista oficial do NTEP e comparação com o banco, usadas pelo
+ImportarNtep.py
+
+Funções puras, sem conexão com o banco: ler_arquivo_ntep devolve a lista do
+arquivo e comparar_ntep a diferença entre ela e o estado atual das tabelas
+cnae/ntep (ver ImportarNtep.carregar_ntep_atual).
+"""
+
+import csv
+import json
+import re
+import sys
+from pathlib import Path
+
+# Regras compartilhadas com o app Django (absenteismo.regras não importa o Django)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from absenteismo.regras import normalizar_cid
+
+
+def separar_cids(texto):
+    """Lista de CIDs de uma célula CSV ("M54, M65;G56 ...")."""
+    return [cid for cid in re.split(r'[,;\s]+', texto or '') if cid]
+
+
+def adicionar_cnae(lista, codigo, descricao, cids):
+    """Acumula em lista a descrição e os CIDs de um CNAE lido do arquivo."""
+    codigo = str(codigo or '').strip()
+    if not codigo:
+        return
+    atual = lista.setdefault(codigo, {'descricao': '', 'cids': set()})
+    if descricao:
+        atual['descricao'] = str(descricao).strip()
+    atual['cids'].update(normalizar_cid(cid) for cid in cids)
+    atual['cids'].discard('')
+
+
+def ler_arquivo_ntep(caminho):
+    """
+    Lê a lista NTEP do arquivo (JSON ou CSV).
+
+    Retorna {codigo_cnae: {'descricao': str, 'cids': set}}.
+    """
+    caminho = Path(caminho)
+    lista = {}
+
+    if caminho.suffix.lower() == '.json':
+        with open(caminho, encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        if isinstance(dados, dict):
+            for codigo, valores in dados.items():
+                adicionar_cnae(lista, codigo, valores.get('descricao'), valores.get('cids') or [])
+        else:
+            for item in dados:
+                adicionar_cnae(lista, item.get('cnae'), item.get('descricao'), item.get('cids') or [])
+        return lista
+
+    with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        amostra = arquivo.read(4096)
+        arquivo.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;')
+        for linha in csv.DictReader(arquivo, dialect=dialeto):
+            linha = {(chave or '').strip().lower(): valor for chave, valor in linha.items()}
+            cids = separar_cids(linha.get('cids')) if 'cids' in linha else [linha.get('cid') or '']
+            adicionar_cnae(lista, linha.get('cnae'), linha.get('descricao'), cids)
+    return lista
+
+
+def comparar_ntep(arquivo, atual, manter_ausentes=False):
+    """
+    Diferenças entre a lista do arquivo e as tabelas.
+
+    Retorna um dicionário com os códigos de CNAE em cada situação:
+    cnaes_novos, cnaes_alterados (descrição), ntep_novos, ntep_alterados
+    (descrição ou CIDs) e ntep_removidos (ausentes do arquivo), além de
+    cids_incluidos/cids_excluidos com o total de CIDs que mudam.
+    """
+    diferencas = {
+        'cnaes_novos': [], 'cnaes_alterados': [],
+        'ntep_novos': [], 'ntep_alterados': [], 'ntep_removidos': [],
+        'cids_incluidos': 0, 'cids_excluidos': 0,
+    }
+    for codigo, novo in sorted(arquivo.items()):
+        existente = atual.get(codigo)
+        if existente is None:
+            diferencas['cnaes_novos'].append(codigo)
+            diferencas['ntep_novos'].append(codigo)
+            diferencas['cids_incluidos'] += len(novo['cids'])
+            continue
+        if existente['descricao'] != novo['descricao']:
+            diferencas['cnaes_alterados'].append(codigo)
+        if not existente['ntep']:
+            diferencas['ntep_novos'].append(codigo)
+            diferencas['cids_incluidos'] += len(novo['cids'])
+        elif existente['cids'] != novo['cids'] or existente['ntep_descricao'] != novo['descricao']:
+            diferencas['ntep_alterados'].append(codigo)
+            diferencas['cids_incluidos'] += len(novo['cids'] - existente['cids'])
+            diferencas['cids_excluidos'] += len(existente['cids'] - novo['cids'])
+
+    if not manter_ausentes:
+        for codigo, existente in sorted(atual.items()):
+            if existente['ntep'] and codigo not in arquivo:
+                diferencas['ntep_removidos'].append(codigo)
+                diferencas['cids_excluidos'] += len(existente['cids'])
+
+    return diferencas
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Absenteismo, CNAE, NTEP
+from .regras import normalizar_cid
 from funcionarios.models import Funcionario
 
 @admin.register(Absenteismo)
@@ -155,7 +156,16 @@ class CNAEAdmin(admin.ModelAdmin):
 @admin.register(NTEP)
 class NTEPAdmin(admin.ModelAdmin):
     list_display = ('cnae', 'descricao', 'exibir_cids')
-    search_fields = ('cnae__codigo', 'descricao', 'cids')
+    search_fields = ('cnae__codigo', 'descricao')
+
+    def get_search_results(self, request, queryset, search_term):
+        # CIDs pesquisados na cópia normalizada e indexada (NTEPCid): "m54.5" encontra "M545"
+        resultado, pode_duplicar = super().get_search_results(request, queryset, search_term)
+        cid = normalizar_cid(search_term)
+        if cid:
+            resultado |= queryset.filter(cnae__ntep_cids__cid=cid)
+            pode_duplicar = True
+        return resultado, pode_duplicar
 
     def exibir_cids(self, obj):
         return ", ".join(obj.cids) if obj.cids else ''
@@ -0,0 +1,430 @@
+"""
+Agregação dos indicadores de absenteísmo em uma única passagem.
+
+Os atestados do período são carregados uma vez em colunas compactas
+(``array``), com os campos texto codificados como inteiros, e todos os
+totais usados pelo painel saem de uma só varredura sobre essas colunas.
+"""
+from array import array
+
+from absenteismo.models import Absenteismo
+
+SEM_VALOR = -1
+
+DURACOES = ("horas", "1-3", "4-7", "8-14", "15+")
+ROTULOS_DURACOES = ["Horas", "1-3 dias", "4-7 dias", "8-14 dias", "15+ dias"]
+
+FAIXAS_ETARIAS = (
+    (0, 25, "18-25"),
+    (26, 35, "26-35"),
+    (36, 45, "36-45"),
+    (46, 55, "46-55"),
+    (56, 100, "56+"),
+)
+
+PREFIXOS_SETOR = ("F", "M", "S", "T")
+
+DIAS_SEMANA = ["Domingo", "Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
+NOMES_MESES = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+
+CAMPOS = (
+    "MATRICULA_FUNC", "NOME_FUNCIONARIO", "DIAS_AFASTADOS", "TIPO_ATESTADO", "SETOR",
+    "CID_PRINCIPAL", "DESCRICAO_CID", "SEXO", "DT_INICIO_ATESTADO", "GRUPO_PATOLOGICO",
+    "funcionario__DATA_NASCIMENTO",
+)
+
+
+def faixa_duracao(tipo_atestado, dias):
+    """Índice em DURACOES do atestado, ou SEM_VALOR se não se encaixar em nenhuma."""
+    if tipo_atestado == 1:
+        return 0
+    dias = dias or 0
+    if 1 <= dias <= 3:
+        return 1
+    if 4 <= dias <= 7:
+        return 2
+    if 8 <= dias <= 14:
+        return 3
+    if dias >= 15:
+        return 4
+    return SEM_VALOR
+
+
+def dia_semana(data):
+    """Dia da semana no padrão do painel: 1 = Domingo ... 7 = Sábado."""
+    d = data.isoweekday()
+    return d + 1 if d < 7 else 1
+
+
+def faixa_etaria(nascimento, data):
+    """Índice em FAIXAS_ETARIAS pela idade na data do atestado, ou SEM_VALOR."""
+    if not nascimento or not data:
+        return SEM_VALOR
+    idade = data.year - nascimento.year - ((data.month, data.day) < (nascimento.month, nascimento.day))
+    for i, (minimo, maximo, _) in enumerate(FAIXAS_ETARIAS):
+        if minimo <= idade <= maximo:
+            return i
+    return SEM_VALOR
+
+
+class _Dicionario:
+    """Codifica valores categóricos como inteiros na ordem em que aparecem."""
+
+    def __init__(self):
+        self.valores = []
+        self._codigos = {}
+
+    def codigo(self, valor):
+        c = self._codigos.get(valor)
+        if c is None:
+            c = self._codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return c
+
+    def __len__(self):
+        return len(self.valores)
+
+
+class ColunasAbsenteismo:
+    """
+    Atestados de um período armazenados por coluna.
+
+    Cada linha vira um inteiro por coluna; textos repetidos (matrícula,
+    setor, CID, grupo patológico) ficam uma única vez nos dicionários.
+    """
+
+    def __init__(self):
+        self.matriculas = _Dicionario()
+        self.setores = _Dicionario()
+        self.cids = _Dicionario()
+        self.grupos = _Dicionario()
+        self.sexos = _Dicionario()
+        self.nomes = []
+        self.descricoes = []
+
+        self.matricula = array("l")
+        self.setor = array("l")
+        self.cid = array("l")
+        self.grupo = array("l")
+        self.sexo = array("l")
+        self.dias = array("l")
+        self.mes = array("l")
+        self.dia = array("b")
+        self.duracao = array("b")
+        self.faixa = array("b")
+
+    @classmethod
+    def do_queryset(cls, queryset):
+        colunas = cls()
+        for linha in queryset.values_list(*CAMPOS).iterator(chunk_size=2000):
+            colunas.adicionar(*linha)
+        return colunas
+
+    def adicionar(self, matricula, nome, dias, tipo_atestado, setor, cid, descricao,
+                  sexo, inicio, grupo, nascimento):
+        m = self.matriculas.codigo(matricula)
+        if m == len(self.nomes):
+            self.nomes.append(nome)
+        self.matricula.append(m)
+
+        self.setor.append(self.setores.codigo(setor))
+
+        if cid:
+            c = self.cids.codigo(cid)
+            if c == len(self.descricoes):
+                self.descricoes.append(descricao or "")
+        else:
+            c = SEM_VALOR
+        self.cid.append(c)
+
+        self.grupo.append(self.grupos.codigo(grupo) if grupo else SEM_VALOR)
+        self.sexo.append(self.sexos.codigo(sexo))
+        self.dias.append(dias or 0)
+        self.duracao.append(faixa_duracao(tipo_atestado, dias))
+
+        if inicio:
+            self.dia.append(dia_semana(inicio))
+            self.mes.append(inicio.year * 12 + inicio.month - 1)
+        else:
+            self.dia.append(SEM_VALOR)
+            self.mes.append(SEM_VALOR)
+
+        self.faixa.append(faixa_etaria(nascimento, inicio))
+
+    def __len__(self):
+        return len(self.matricula)
+
+    def agregar(self):
+        """
+        Percorre as colunas uma única vez e devolve os totais marginais
+        no formato consumido por ``calcular_indicadores``.
+        """
+        setor_qtd = [0] * len(self.setores)
+        setor_dias = [0] * len(self.setores)
+        cid_qtd = [0] * len(self.cids)
+        cid_dias = [0] * len(self.cids)
+        mat_qtd = [0] * len(self.matriculas)
+        mat_dias = [0] * len(self.matriculas)
+        sexo_qtd = [0] * len(self.sexos)
+        sexo_dias = [0] * len(self.sexos)
+        prefixo_setor = [_prefixo(s) for s in self.setores.valores]
+        mes_qtd = {}
+        mes_dias = {}
+        duracoes = [0] * len(DURACOES)
+        dia_qtd = [0] * 8
+        dia_duracao = [[0] * len(DURACOES) for _ in range(8)]
+        dia_grupo = {}
+        sexo_grupo = {}
+        prefixo_grupo = {}
+        faixa_grupo = {}
+        total_dias = 0
+
+        for m, s, c, g, sx, d, dur, dia, mes, faixa in zip(
+            self.matricula, self.setor, self.cid, self.grupo, self.sexo,
+            self.dias, self.duracao, self.dia, self.mes, self.faixa
+        ):
+            total_dias += d
+            mat_qtd[m] += 1
+            mat_dias[m] += d
+            setor_qtd[s] += 1
+            setor_dias[s] += d
+            sexo_qtd[sx] += 1
+            sexo_dias[sx] += d
+            if c != SEM_VALOR:
+                cid_qtd[c] += 1
+                cid_dias[c] += d
+            if dur != SEM_VALOR:
+                duracoes[dur] += 1
+            if dia != SEM_VALOR:
+                dia_qtd[dia] += 1
+                if dur != SEM_VALOR:
+                    dia_duracao[dia][dur] += 1
+                mes_qtd[mes] = mes_qtd.get(mes, 0) + 1
+                mes_dias[mes] = mes_dias.get(mes, 0) + d
+            if g != SEM_VALOR:
+                if dia != SEM_VALOR:
+                    dia_grupo[dia, g] = dia_grupo.get((dia, g), 0) + 1
+                sexo_grupo[sx, g] = sexo_grupo.get((sx, g), 0) + 1
+                p = prefixo_setor[s]
+                if p is not None:
+                    prefixo_grupo[p, g] = prefixo_grupo.get((p, g), 0) + 1
+                if faixa != SEM_VALOR:
+                    faixa_grupo[faixa, g] = faixa_grupo.get((faixa, g), 0) + 1
+
+        grupos = self.grupos.valores
+        sexos = self.sexos.valores
+        return {
+            "total_atestados": len(self),
+            "total_dias": total_dias,
+            "funcionarios": {
+                mat: [self.nomes[i], mat_qtd[i], mat_dias[i]]
+                for i, mat in enumerate(self.matriculas.valores)
+            },
+            "setores": {
+                setor: [setor_qtd[i], setor_dias[i]]
+                for i, setor in enumerate(self.setores.valores)
+            },
+            "cids": {
+                cid: [cid_qtd[i], cid_dias[i], self.descricoes[i]]
+                for i, cid in enumerate(self.cids.valores)
+            },
+            "meses": {
+                (mes // 12, mes % 12 + 1): [qtd, mes_dias[mes]]
+                for mes, qtd in mes_qtd.items()
+            },
+            "sexos": {
+                sexo: [sexo_qtd[i], sexo_dias[i]]
+                for i, sexo in enumerate(sexos)
+            },
+            "duracoes": duracoes,
+            "dias_semana": dia_qtd,
+            "dia_duracao": dia_duracao,
+            "dia_grupo": _aninhar(dia_grupo, lambda dia: dia, grupos),
+            "sexo_grupo": _aninhar(sexo_grupo, lambda sx: sexos[sx], grupos),
+            "prefixo_grupo": _aninhar(prefixo_grupo, lambda p: p, grupos),
+            "faixa_grupo": _aninhar(faixa_grupo, lambda f: FAIXAS_ETARIAS[f][2], grupos),
+        }
+
+
+def _prefixo(setor):
+    if not setor:
+        return None
+    for p in PREFIXOS_SETOR:
+        if setor.startswith(p):
+            return p
+    return None
+
+
+def _aninhar(contagens, chave_externa, grupos):
+    resultado = {}
+    for (externa, g), qtd in contagens.items():
+        resultado.setdefault(chave_externa(externa), {})[grupos[g]] = qtd
+    return resultado
+
+
+def _mais_frequentes(contagens, limite):
+    return sorted(contagens.items(), key=lambda x: x[1], reverse=True)[:limite]
+
+
+def _rotulo_cid(item):
+    cid = item.get("CID_PRINCIPAL", "")
+    desc = item.get("DESCRICAO_CID", "")
+    if not cid and not desc:
+        return "Não classificado"
+    if not desc:
+        return cid
+    return f"{cid} - {desc[:20]}"
+
+
+def calcular_indicadores(marginais, total_funcionarios, dias_periodo):
+    """
+    Transforma os totais marginais nos KPIs, listas e séries de gráfico
+    exibidos na página de absenteísmo.
+    """
+    total_atestados = marginais["total_atestados"]
+    total_dias = marginais["total_dias"]
+
+    media_dias = total_dias / total_atestados if total_atestados else 0
+    media_atestados = total_atestados / total_funcionarios if total_funcionarios else 0
+    impacto_financeiro = total_dias * 8 * 8.02
+    dias_uteis = int(dias_periodo * 5 / 7) if dias_periodo else 0
+    taxa_absenteismo = (total_dias / (total_funcionarios * dias_uteis) * 100) if total_funcionarios and dias_uteis else 0
+
+    bradford_list = []
+    reincidentes = 0
+    for mat, (nome, episodios, dias) in marginais["funcionarios"].items():
+        b = episodios * episodios * dias
+        if b >= 500:
+            risco = "ALTO"
+        elif b >= 200:
+            risco = "MÉDIO"
+        else:
+            risco = "BAIXO"
+        if episodios > 1:
+            reincidentes += 1
+        bradford_list.append({
+            "MATRICULA_FUNC": mat,
+            "NOME_FUNCIONARIO": nome,
+            "episodios": episodios,
+            "total_dias": dias,
+            "bradford": b,
+            "risco": risco,
+        })
+    bradford_list.sort(key=lambda x: x["bradford"], reverse=True)
+    bradford_critico_count = sum(1 for x in bradford_list if x["risco"] == "ALTO")
+    funcionarios = len(marginais["funcionarios"])
+    taxa_reincidencia = (reincidentes / funcionarios * 100) if funcionarios else 0
+
+    dias_semana = marginais["dias_semana"]
+    cids_por_dia_semana = []
+    duracao_por_dia_semana = []
+    for d in range(1, 8):
+        grupos_dia = marginais["dia_grupo"].get(d, {})
+        top_grupo = None
+        max_grupo = 0
+        for grupo, qtd in grupos_dia.items():
+            if qtd > max_grupo:
+                max_grupo = qtd
+                top_grupo = grupo
+        if top_grupo and dias_semana[d]:
+            cids_por_dia_semana.append({
+                "GRUPO_PATOLOGICO": top_grupo,
+                "count": max_grupo,
+                "percentage": round(100 * max_grupo / dias_semana[d], 1),
+            })
+        else:
+            cids_por_dia_semana.append({"GRUPO_PATOLOGICO": "Não disponível", "count": 0, "percentage": 0})
+
+        if dias_semana[d]:
+            duracoes_dia = marginais["dia_duracao"][d]
+            i = max(range(len(DURACOES)), key=lambda k: duracoes_dia[k])
+            duracao_por_dia_semana.append({
+                "tipo": DURACOES[i],
+                "count": duracoes_dia[i],
+                "percentage": round(100 * duracoes_dia[i] / dias_semana[d], 1),
+            })
+        else:
+            duracao_por_dia_semana.append({"tipo": "Não disponível", "count": 0, "percentage": 0})
+
+    setores_top = sorted(marginais["setores"].items(), key=lambda x: x[1][1], reverse=True)[:10]
+    absenteismo_por_setor = [{"SETOR": s, "count": qtd, "dias": dias} for s, (qtd, dias) in setores_top]
+
+    cids_top = sorted(marginais["cids"].items(), key=lambda x: x[1][0], reverse=True)[:10]
+    if cids_top:
+        absenteismo_por_cid = [
+            {"CID_PRINCIPAL": c, "DESCRICAO_CID": desc, "count": qtd, "dias": dias}
+            for c, (qtd, dias, desc) in cids_top
+        ]
+    else:
+        absenteismo_por_cid = [{"CID_PRINCIPAL": "Sem dados", "DESCRICAO_CID": "", "count": 0, "dias": 0}]
+
+    evolucao_mensal = {"labels": [], "data_count": [], "data_dias": []}
+    for (ano, mes), (qtd, dias) in sorted(marginais["meses"].items()):
+        evolucao_mensal["labels"].append(f"{NOMES_MESES[mes - 1]} {ano}")
+        evolucao_mensal["data_count"].append(qtd)
+        evolucao_mensal["data_dias"].append(dias)
+
+    genero = {"labels": ["Masculino", "Feminino", "Não informado"], "count": [0, 0, 0], "dias": [0, 0, 0]}
+    for sexo, (qtd, dias) in marginais["sexos"].items():
+        idx = {1: 0, 2: 1}.get(sexo, 2)
+        genero["count"][idx] += qtd
+        genero["dias"][idx] += dias
+
+    rotulos_sexo = dict(Absenteismo.SEXO_CHOICES)
+    grupos_por_genero = {}
+    for sexo, grupos in marginais["sexo_grupo"].items():
+        destino = grupos_por_genero.setdefault(rotulos_sexo.get(sexo, "Não informado"), {})
+        for grupo, qtd in grupos.items():
+            destino[grupo] = destino.get(grupo, 0) + qtd
+    cids_por_genero = {
+        rotulo: [{"GRUPO_PATOLOGICO": g, "count": qtd} for g, qtd in _mais_frequentes(grupos, 5)]
+        for rotulo, grupos in grupos_por_genero.items()
+    }
+
+    cids_por_prefixo_setor = {}
+    for p in PREFIXOS_SETOR:
+        top = _mais_frequentes(marginais["prefixo_grupo"].get(p, {}), 5)
+        if top:
+            cids_por_prefixo_setor[p] = [{"GRUPO_PATOLOGICO": g, "count": qtd} for g, qtd in top]
+
+    age_cid_correlation = []
+    for _, _, rotulo in FAIXAS_ETARIAS:
+        for g, qtd in _mais_frequentes(marginais["faixa_grupo"].get(rotulo, {}), 3):
+            age_cid_correlation.append({"age_range": rotulo, "cid": g, "count": qtd})
+
+    chart_data = {
+        "duracao_patterns": {"labels": ROTULOS_DURACOES, "data": list(marginais["duracoes"])},
+        "dia_semana": {"labels": DIAS_SEMANA, "data": list(dias_semana[1:8])},
+        "absenteismo_por_setor": {
+            "labels": [x["SETOR"] for x in absenteismo_por_setor],
+            "data_count": [x["count"] for x in absenteismo_por_setor],
+            "data_dias": [x["dias"] for x in absenteismo_por_setor],
+        },
+        "absenteismo_por_cid": {
+            "labels": [_rotulo_cid(x) for x in absenteismo_por_cid],
+            "data_count": [x["count"] for x in absenteismo_por_cid],
+            "data_dias": [x["dias"] for x in absenteismo_por_cid],
+        },
+        "evolucao_mensal": evolucao_mensal,
+        "genero": genero,
+        "age_cid_correlation": {"data": age_cid_correlation},
+        "cids_por_dia_semana": cids_por_dia_semana,
+        "duracao_por_dia_semana": duracao_por_dia_semana,
+    }
+
+    return {
+        "setores": sorted(s for s in marginais["setores"] if s is not None),
+        "total_atestados": total_atestados,
+        "total_dias": total_dias,
+        "media_dias": media_dias,
+        "media_atestados": media_atestados,
+        "impacto_financeiro": impacto_financeiro,
+        "taxa_absenteismo": taxa_absenteismo,
+        "bradford_detalhado": bradford_list[:20],
+        "bradford_critico_count": bradford_critico_count,
+        "taxa_reincidencia": taxa_reincidencia,
+        "absenteismo_por_cid": absenteismo_por_cid,
+        "cids_por_genero": cids_por_genero,
+        "cids_por_prefixo_setor": cids_por_prefixo_setor,
+        "chart_data": chart_data,
+    }
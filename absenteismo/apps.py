@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AbsenteismoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'absenteismo'
+
+    def ready(self):
+        from absenteismo import signals  # noqa: F401
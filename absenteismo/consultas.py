@@ -0,0 +1,253 @@
+"""
+Agregação dos indicadores de absenteísmo dentro do PostgreSQL.
+
+As quebras do painel (setor, mês, sexo, dia da semana, duração e faixa
+etária) saem de uma única consulta com GROUPING SETS sobre o resumo diário
+``AbsenteismoDiario``; apenas as linhas já agregadas trafegam para o
+Python. A quebra por CID vem do resumo ``AbsenteismoCidDiario`` ou, com
+filtro de setor ou duração, dos atestados. O índice de Bradford, que
+depende de cada funcionário, é agrupado direto na tabela de atestados.
+"""
+from django.db import connection, connections
+from django.db.models import Case, CharField, Count, F, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, ExtractMonth, ExtractWeekDay, ExtractYear, NullIf
+
+from absenteismo.agregacao import DURACOES, FAIXAS_ETARIAS, PREFIXOS_SETOR, ColunasAbsenteismo
+from absenteismo.models import Absenteismo, AbsenteismoCidDiario, AbsenteismoDiario
+from absenteismo.regras import ATUALIZAR_RESUMOS
+
+DIMENSOES = (
+    "setor", "ano", "mes", "sexo",
+    "duracao", "dia", "grupo", "prefixo", "faixa",
+)
+
+CONJUNTOS = {
+    "total": (),
+    "setores": ("setor",),
+    "meses": ("ano", "mes"),
+    "sexos": ("sexo",),
+    "duracoes": ("duracao",),
+    "dias_semana": ("dia",),
+    "dia_duracao": ("dia", "duracao"),
+    "dia_grupo": ("dia", "grupo"),
+    "sexo_grupo": ("sexo", "grupo"),
+    "prefixo_grupo": ("prefixo", "grupo"),
+    "faixa_grupo": ("faixa", "grupo"),
+}
+
+
+def _mascara(conjunto):
+    """Valor de GROUPING(...) sobre DIMENSOES para um conjunto de agrupamento."""
+    n = len(DIMENSOES)
+    return sum(1 << (n - 1 - i) for i, d in enumerate(DIMENSOES) if d not in conjunto)
+
+
+def filtrar_atestados(empresa, data_inicio, grupo="", setor="", tipo_duracao=""):
+    """Atestados considerados no painel de absenteísmo, já com os filtros da tela."""
+    base = Absenteismo.objects.filter(
+        empresa=empresa,
+        DT_INICIO_ATESTADO__gte=data_inicio,
+        funcionario__isnull=False
+    ).exclude(NOME_FUNCIONARIO__icontains="nomegenerico")
+
+    if grupo:
+        base = base.filter(SETOR__startswith=grupo)
+    if setor:
+        base = base.filter(SETOR=setor)
+    if tipo_duracao:
+        if tipo_duracao == "horas":
+            base = base.filter(TIPO_ATESTADO=1)
+        elif tipo_duracao == "1-3":
+            base = base.filter(DIAS_AFASTADOS__gte=1, DIAS_AFASTADOS__lte=3, TIPO_ATESTADO=0)
+        elif tipo_duracao == "4-7":
+            base = base.filter(DIAS_AFASTADOS__gte=4, DIAS_AFASTADOS__lte=7, TIPO_ATESTADO=0)
+        elif tipo_duracao == "8-14":
+            base = base.filter(DIAS_AFASTADOS__gte=8, DIAS_AFASTADOS__lte=14, TIPO_ATESTADO=0)
+        elif tipo_duracao == "15+":
+            base = base.filter(DIAS_AFASTADOS__gte=15, TIPO_ATESTADO=0)
+    return base
+
+
+def filtrar_resumo(empresa, data_inicio, grupo="", setor="", tipo_duracao=""):
+    """Linhas do resumo diário equivalentes a ``filtrar_atestados``."""
+    resumo = AbsenteismoDiario.objects.filter(empresa=empresa, data__gte=data_inicio)
+
+    if grupo:
+        resumo = resumo.filter(SETOR__startswith=grupo)
+    if setor:
+        resumo = resumo.filter(SETOR=setor)
+    if tipo_duracao in DURACOES:
+        resumo = resumo.filter(faixa_duracao=DURACOES.index(tipo_duracao))
+    return resumo
+
+
+def anotar_dimensoes(resumo):
+    """Acrescenta ao queryset do resumo diário as colunas de dimensão do painel."""
+    prefixo = Case(
+        *[When(SETOR__startswith=p, then=Value(p)) for p in PREFIXOS_SETOR],
+        default=None,
+        output_field=CharField(),
+    )
+    return resumo.annotate(
+        setor=F("SETOR"),
+        grupo=NullIf("GRUPO_PATOLOGICO", Value("")),
+        sexo=F("SEXO"),
+        # EXTRACT devolve numeric no PostgreSQL (Decimal no Python); as
+        # marginais usam ano, mês e dia como chaves e índices de lista
+        ano=Cast(ExtractYear("data"), IntegerField()),
+        mes=Cast(ExtractMonth("data"), IntegerField()),
+        dia=Cast(ExtractWeekDay("data"), IntegerField()),
+        duracao=F("faixa_duracao"),
+        prefixo=prefixo,
+        faixa=F("faixa_etaria"),
+        qtd=F("quantidade"),
+        dias_val=F("dias"),
+    )
+
+
+def consultar_agrupamentos(resumo):
+    """
+    Executa a consulta com GROUPING SETS sobre o resumo diário e devolve
+    os totais marginais no mesmo formato de ``ColunasAbsenteismo.agregar``
+    (exceto as chaves ``funcionarios`` e ``cids``).
+    """
+    base = anotar_dimensoes(resumo).order_by().values(*DIMENSOES, "qtd", "dias_val")
+    sql_base, params = base.query.sql_with_params()
+    conjuntos = ", ".join(
+        "(" + ", ".join(f'"{d}"' for d in colunas) + ")" for colunas in CONJUNTOS.values()
+    )
+    colunas = ", ".join(f'"{d}"' for d in DIMENSOES)
+    sql = f"""
+        SELECT GROUPING({colunas}) AS conjunto, {colunas},
+               COALESCE(SUM("qtd"), 0), COALESCE(SUM("dias_val"), 0)
+        FROM ({sql_base}) AS base
+        GROUP BY GROUPING SETS ({conjuntos})
+        ORDER BY conjunto, SUM("qtd") DESC
+    """
+
+    with connections[resumo.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        linhas = cursor.fetchall()
+
+    return _montar_marginais(linhas)
+
+
+def consultar_cids(cids):
+    """
+    Quantidade, dias e descrição por CID, agrupados no banco a partir do
+    resumo ``AbsenteismoCidDiario`` ou de um queryset de atestados.
+    """
+    if cids.model is AbsenteismoCidDiario:
+        totais = dict(qtd=Sum("quantidade"), dias_val=Sum("dias"))
+    else:
+        cids = cids.exclude(CID_PRINCIPAL__isnull=True).exclude(CID_PRINCIPAL="")
+        totais = dict(qtd=Count("id"), dias_val=Coalesce(Sum("DIAS_AFASTADOS"), 0))
+    linhas = (
+        cids.order_by()
+        .values("CID_PRINCIPAL")
+        .annotate(descricao=Max("DESCRICAO_CID"), **totais)
+    )
+    return {
+        linha["CID_PRINCIPAL"]: [linha["qtd"], linha["dias_val"], linha["descricao"] or ""]
+        for linha in linhas
+    }
+
+
+def consultar_funcionarios(atestados):
+    """Episódios e dias por matrícula, agrupados no banco."""
+    linhas = (
+        atestados.order_by()
+        .values("MATRICULA_FUNC")
+        .annotate(
+            nome=Max("NOME_FUNCIONARIO"),
+            episodios=Count("id"),
+            total_dias=Coalesce(Sum("DIAS_AFASTADOS"), 0),
+        )
+    )
+    return {
+        linha["MATRICULA_FUNC"]: [linha["nome"], linha["episodios"], linha["total_dias"]]
+        for linha in linhas
+    }
+
+
+def _montar_marginais(linhas):
+    nomes_conjuntos = {_mascara(colunas): nome for nome, colunas in CONJUNTOS.items()}
+    marginais = {
+        "total_atestados": 0,
+        "total_dias": 0,
+        "funcionarios": {},
+        "setores": {},
+        "cids": {},
+        "meses": {},
+        "sexos": {},
+        "duracoes": [0] * len(DURACOES),
+        "dias_semana": [0] * 8,
+        "dia_duracao": [[0] * len(DURACOES) for _ in range(8)],
+        "dia_grupo": {},
+        "sexo_grupo": {},
+        "prefixo_grupo": {},
+        "faixa_grupo": {},
+    }
+
+    for mascara, *valores, qtd, dias in linhas:
+        v = dict(zip(DIMENSOES, valores))
+        conjunto = nomes_conjuntos.get(mascara)
+        if conjunto == "total":
+            marginais["total_atestados"] = qtd
+            marginais["total_dias"] = dias
+        elif conjunto == "setores":
+            marginais["setores"][v["setor"]] = [qtd, dias]
+        elif conjunto == "meses" and v["ano"] is not None:
+            marginais["meses"][v["ano"], v["mes"]] = [qtd, dias]
+        elif conjunto == "sexos":
+            marginais["sexos"][v["sexo"]] = [qtd, dias]
+        elif conjunto == "duracoes" and v["duracao"] is not None:
+            marginais["duracoes"][v["duracao"]] = qtd
+        elif conjunto == "dias_semana" and v["dia"] is not None:
+            marginais["dias_semana"][v["dia"]] = qtd
+        elif conjunto == "dia_duracao" and None not in (v["dia"], v["duracao"]):
+            marginais["dia_duracao"][v["dia"]][v["duracao"]] = qtd
+        elif conjunto == "dia_grupo" and None not in (v["dia"], v["grupo"]):
+            marginais["dia_grupo"].setdefault(v["dia"], {})[v["grupo"]] = qtd
+        elif conjunto == "sexo_grupo" and v["grupo"] is not None:
+            marginais["sexo_grupo"].setdefault(v["sexo"], {})[v["grupo"]] = qtd
+        elif conjunto == "prefixo_grupo" and None not in (v["prefixo"], v["grupo"]):
+            marginais["prefixo_grupo"].setdefault(v["prefixo"], {})[v["grupo"]] = qtd
+        elif conjunto == "faixa_grupo" and None not in (v["faixa"], v["grupo"]):
+            rotulo = FAIXAS_ETARIAS[v["faixa"]][2]
+            marginais["faixa_grupo"].setdefault(rotulo, {})[v["grupo"]] = qtd
+
+    return marginais
+
+
+def agregar_absenteismo(empresa, data_inicio, grupo="", setor="", tipo_duracao=""):
+    """
+    Totais marginais do painel de absenteísmo. No PostgreSQL vêm do resumo
+    diário; nos demais bancos, das colunas compactas montadas a partir dos
+    atestados.
+    """
+    atestados = filtrar_atestados(empresa, data_inicio, grupo, setor, tipo_duracao)
+    if connections[atestados.db].vendor != "postgresql":
+        return ColunasAbsenteismo.do_queryset(atestados).agregar()
+
+    marginais = consultar_agrupamentos(filtrar_resumo(empresa, data_inicio, grupo, setor, tipo_duracao))
+    marginais["funcionarios"] = consultar_funcionarios(atestados)
+    if grupo or setor or tipo_duracao:
+        marginais["cids"] = consultar_cids(atestados)
+    else:
+        marginais["cids"] = consultar_cids(
+            AbsenteismoCidDiario.objects.filter(empresa=empresa, data__gte=data_inicio)
+        )
+    return marginais
+
+
+def atualizar_resumos(empresa_id, datas):
+    """
+    Refaz ``AbsenteismoDiario`` e ``AbsenteismoCidDiario`` da empresa nas
+    datas de início de atestado informadas.
+    """
+    datas = sorted({d for d in datas if d})
+    if not empresa_id or not datas or connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(ATUALIZAR_RESUMOS, {"empresa": empresa_id, "datas": datas})
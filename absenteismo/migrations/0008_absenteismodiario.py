@@ -0,0 +1,103 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Cópia congelada de absenteismo.regras.ATUALIZAR_RESUMOS, para todas as empresas e datas
+PREENCHER_RESUMO = """
+INSERT INTO absenteismo_absenteismodiario (
+    empresa_id, data, "SETOR", "GRUPO_PATOLOGICO", "SEXO",
+    faixa_duracao, faixa_etaria, quantidade, dias
+)
+SELECT
+    a.empresa_id,
+    a."DT_INICIO_ATESTADO",
+    a."SETOR",
+    a."GRUPO_PATOLOGICO",
+    a."SEXO",
+    CASE
+        WHEN a."TIPO_ATESTADO" = 1 THEN 0
+        WHEN COALESCE(a."DIAS_AFASTADOS", 0) BETWEEN 1 AND 3 THEN 1
+        WHEN a."DIAS_AFASTADOS" BETWEEN 4 AND 7 THEN 2
+        WHEN a."DIAS_AFASTADOS" BETWEEN 8 AND 14 THEN 3
+        WHEN a."DIAS_AFASTADOS" >= 15 THEN 4
+    END,
+    CASE
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 0 AND 25 THEN 0
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 26 AND 35 THEN 1
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 36 AND 45 THEN 2
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 46 AND 55 THEN 3
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 56 AND 100 THEN 4
+    END,
+    COUNT(*),
+    COALESCE(SUM(a."DIAS_AFASTADOS"), 0)
+FROM absenteismo_absenteismo a
+JOIN funcionarios_funcionario f ON f.id = a.funcionario_id
+WHERE COALESCE(a."NOME_FUNCIONARIO", '') NOT ILIKE '%nomegenerico%'
+GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+INSERT INTO absenteismo_absenteismociddiario (
+    empresa_id, data, "CID_PRINCIPAL", "DESCRICAO_CID", quantidade, dias
+)
+SELECT
+    a.empresa_id,
+    a."DT_INICIO_ATESTADO",
+    a."CID_PRINCIPAL",
+    MAX(a."DESCRICAO_CID"),
+    COUNT(*),
+    COALESCE(SUM(a."DIAS_AFASTADOS"), 0)
+FROM absenteismo_absenteismo a
+JOIN funcionarios_funcionario f ON f.id = a.funcionario_id
+WHERE COALESCE(a."CID_PRINCIPAL", '') <> ''
+  AND COALESCE(a."NOME_FUNCIONARIO", '') NOT ILIKE '%nomegenerico%'
+GROUP BY 1, 2, 3;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absenteismo', '0007_cnae_empresas'),
+        ('dashboard', '0003_empresaativausuario'),
+        ('funcionarios', '0002_alter_funcionario_bairro_alter_funcionario_cbocargo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AbsenteismoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('SETOR', models.CharField(blank=True, max_length=130, null=True)),
+                ('GRUPO_PATOLOGICO', models.CharField(blank=True, max_length=80, null=True)),
+                ('SEXO', models.IntegerField(blank=True, choices=[(0, 'Não preenchido'), (1, 'Masculino'), (2, 'Feminino')], null=True)),
+                ('faixa_duracao', models.SmallIntegerField(blank=True, null=True)),
+                ('faixa_etaria', models.SmallIntegerField(blank=True, null=True)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('dias', models.IntegerField(default=0)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='absenteismos_diarios', to='dashboard.empresa')),
+            ],
+            options={
+                'verbose_name': 'Absenteísmo diário',
+                'verbose_name_plural': 'Absenteísmos diários',
+                'indexes': [models.Index(fields=['empresa', 'data'], name='absenteismo_empresa_ebed71_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AbsenteismoCidDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('CID_PRINCIPAL', models.CharField(max_length=10)),
+                ('DESCRICAO_CID', models.CharField(blank=True, max_length=264, null=True)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('dias', models.IntegerField(default=0)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='absenteismos_cid_diarios', to='dashboard.empresa')),
+            ],
+            options={
+                'verbose_name': 'Absenteísmo diário por CID',
+                'verbose_name_plural': 'Absenteísmos diários por CID',
+                'indexes': [models.Index(fields=['empresa', 'data'], name='absenteismo_cid_diario_idx')],
+            },
+        ),
+        migrations.RunSQL(PREENCHER_RESUMO, reverse_sql=migrations.RunSQL.noop),
+    ]
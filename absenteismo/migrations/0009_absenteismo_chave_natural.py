@@ -0,0 +1,85 @@
+from django.db import migrations, models
+
+# Resumos diários são recalculados porque a remoção de duplicatas altera os
+# totais; cópia congelada da mesma consulta de 0008_absenteismodiario
+PREENCHER_RESUMO = """
+INSERT INTO absenteismo_absenteismodiario (
+    empresa_id, data, "SETOR", "GRUPO_PATOLOGICO", "SEXO",
+    faixa_duracao, faixa_etaria, quantidade, dias
+)
+SELECT
+    a.empresa_id,
+    a."DT_INICIO_ATESTADO",
+    a."SETOR",
+    a."GRUPO_PATOLOGICO",
+    a."SEXO",
+    CASE
+        WHEN a."TIPO_ATESTADO" = 1 THEN 0
+        WHEN COALESCE(a."DIAS_AFASTADOS", 0) BETWEEN 1 AND 3 THEN 1
+        WHEN a."DIAS_AFASTADOS" BETWEEN 4 AND 7 THEN 2
+        WHEN a."DIAS_AFASTADOS" BETWEEN 8 AND 14 THEN 3
+        WHEN a."DIAS_AFASTADOS" >= 15 THEN 4
+    END,
+    CASE
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 0 AND 25 THEN 0
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 26 AND 35 THEN 1
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 36 AND 45 THEN 2
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 46 AND 55 THEN 3
+        WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 56 AND 100 THEN 4
+    END,
+    COUNT(*),
+    COALESCE(SUM(a."DIAS_AFASTADOS"), 0)
+FROM absenteismo_absenteismo a
+JOIN funcionarios_funcionario f ON f.id = a.funcionario_id
+WHERE COALESCE(a."NOME_FUNCIONARIO", '') NOT ILIKE '%nomegenerico%'
+GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+INSERT INTO absenteismo_absenteismociddiario (
+    empresa_id, data, "CID_PRINCIPAL", "DESCRICAO_CID", quantidade, dias
+)
+SELECT
+    a.empresa_id,
+    a."DT_INICIO_ATESTADO",
+    a."CID_PRINCIPAL",
+    MAX(a."DESCRICAO_CID"),
+    COUNT(*),
+    COALESCE(SUM(a."DIAS_AFASTADOS"), 0)
+FROM absenteismo_absenteismo a
+JOIN funcionarios_funcionario f ON f.id = a.funcionario_id
+WHERE COALESCE(a."CID_PRINCIPAL", '') <> ''
+  AND COALESCE(a."NOME_FUNCIONARIO", '') NOT ILIKE '%nomegenerico%'
+GROUP BY 1, 2, 3;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absenteismo', '0008_absenteismodiario'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            UPDATE absenteismo_absenteismo SET "MATRICULA_FUNC" = '' WHERE "MATRICULA_FUNC" IS NULL;
+            UPDATE absenteismo_absenteismo SET "CID_PRINCIPAL" = '' WHERE "CID_PRINCIPAL" IS NULL;
+
+            DELETE FROM absenteismo_absenteismo a
+            USING absenteismo_absenteismo b
+            WHERE a.empresa_id = b.empresa_id
+              AND a."MATRICULA_FUNC" = b."MATRICULA_FUNC"
+              AND a."DT_INICIO_ATESTADO" = b."DT_INICIO_ATESTADO"
+              AND a."DT_FIM_ATESTADO" = b."DT_FIM_ATESTADO"
+              AND a."CID_PRINCIPAL" = b."CID_PRINCIPAL"
+              AND a.id < b.id;
+
+            DELETE FROM absenteismo_absenteismodiario;
+            DELETE FROM absenteismo_absenteismociddiario;
+            """ + PREENCHER_RESUMO,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='absenteismo',
+            constraint=models.UniqueConstraint(fields=('empresa', 'MATRICULA_FUNC', 'DT_INICIO_ATESTADO', 'DT_FIM_ATESTADO', 'CID_PRINCIPAL'), name='absenteismo_chave_natural'),
+        ),
+    ]
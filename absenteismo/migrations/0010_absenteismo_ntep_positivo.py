@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absenteismo', '0009_absenteismo_chave_natural'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='absenteismo',
+            name='ntep_positivo',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='absenteismo',
+            index=models.Index(fields=['empresa', 'ntep_positivo', 'DT_INICIO_ATESTADO'], name='absenteismo_ntep_idx'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE absenteismo_absenteismo a
+            SET ntep_positivo = TRUE
+            WHERE COALESCE(a."CID_PRINCIPAL", '') <> ''
+              AND EXISTS (
+                SELECT 1
+                FROM cnae_empresas ce
+                JOIN ntep n ON n.cnae_id = ce.cnae_id
+                CROSS JOIN unnest(n.cids) AS c(cid)
+                WHERE ce.empresa_id = a.empresa_id
+                  AND UPPER(REPLACE(TRIM(c.cid), '.', '')) = UPPER(REPLACE(TRIM(a."CID_PRINCIPAL"), '.', ''))
+            );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
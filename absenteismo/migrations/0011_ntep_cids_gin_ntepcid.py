@@ -0,0 +1,40 @@
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absenteismo', '0010_absenteismo_ntep_positivo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ntep',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['cids'], name='ntep_cids_gin'),
+        ),
+        migrations.CreateModel(
+            name='NTEPCid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cid', models.CharField(max_length=100)),
+                ('cnae', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ntep_cids', to='absenteismo.cnae')),
+            ],
+            options={
+                'db_table': 'ntep_cid',
+                'indexes': [models.Index(fields=['cid'], name='ntep_cid_cid_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cnae', 'cid'), name='ntep_cid_unico')],
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO ntep_cid (cnae_id, cid)
+            SELECT DISTINCT n.cnae_id, UPPER(REPLACE(TRIM(c.cid), '.', ''))
+            FROM ntep n
+            CROSS JOIN unnest(n.cids) AS c(cid)
+            WHERE TRIM(c.cid) <> '';
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from dashboard.models import Empresa
 from funcionarios.models import Funcionario
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 
 
 class Absenteismo(models.Model):
@@ -53,6 +54,9 @@ class Absenteismo(models.Model):
     DESCRICAO_CID = models.CharField(max_length=264, null=True, blank=True)
     GRUPO_PATOLOGICO = models.CharField(max_length=80, null=True, blank=True)
     TIPO_LICENCA = models.CharField(max_length=100, null=True, blank=True)
+
+    # CID_PRINCIPAL consta no NTEP de algum CNAE da empresa (absenteismo.ntep)
+    ntep_positivo = models.BooleanField(default=False, editable=False)
     
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
@@ -68,6 +72,14 @@ class Absenteismo(models.Model):
             models.Index(fields=['DT_INICIO_ATESTADO']),
             models.Index(fields=['DT_FIM_ATESTADO']),
             models.Index(fields=['CID_PRINCIPAL']),
+            models.Index(fields=['empresa', 'ntep_positivo', 'DT_INICIO_ATESTADO'], name='absenteismo_ntep_idx'),
+        ]
+        constraints = [
+            # Chave natural usada pelo ON CONFLICT do job de importação
+            models.UniqueConstraint(
+                fields=['empresa', 'MATRICULA_FUNC', 'DT_INICIO_ATESTADO', 'DT_FIM_ATESTADO', 'CID_PRINCIPAL'],
+                name='absenteismo_chave_natural',
+            ),
         ]
     
     def __str__(self):
@@ -103,10 +115,80 @@ class Absenteismo(models.Model):
                 self.SEXO = self.funcionario.SEXO
             if not self.MATRICULA_FUNC:
                 self.MATRICULA_FUNC = self.funcionario.MATRICULAFUNCIONARIO
+
+        if self.empresa_id:
+            from absenteismo.ntep import cids_ntep_empresa, normalizar_cid
+            self.ntep_positivo = normalizar_cid(self.CID_PRINCIPAL) in cids_ntep_empresa(self.empresa)
         
         super().save(*args, **kwargs)
 
 
+class AbsenteismoDiario(models.Model):
+    """
+    Totais diários de atestados por empresa e pelas dimensões do painel
+    de absenteísmo, sem o CID (ver ``AbsenteismoCidDiario``). O painel lê
+    daqui em vez da tabela de atestados; as datas alteradas são refeitas
+    pelo job de importação e pelos sinais de ``absenteismo.signals``
+    (``absenteismo.regras.ATUALIZAR_RESUMOS``).
+    """
+    empresa = models.ForeignKey(
+        Empresa,
+        on_delete=models.CASCADE,
+        related_name='absenteismos_diarios'
+    )
+    data = models.DateField()
+
+    SETOR = models.CharField(max_length=130, null=True, blank=True)
+    GRUPO_PATOLOGICO = models.CharField(max_length=80, null=True, blank=True)
+    SEXO = models.IntegerField(choices=Absenteismo.SEXO_CHOICES, null=True, blank=True)
+    # Índices em absenteismo.agregacao.DURACOES e FAIXAS_ETARIAS (idade na data do atestado)
+    faixa_duracao = models.SmallIntegerField(null=True, blank=True)
+    faixa_etaria = models.SmallIntegerField(null=True, blank=True)
+
+    quantidade = models.IntegerField(default=0)
+    dias = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Absenteísmo diário"
+        verbose_name_plural = "Absenteísmos diários"
+        indexes = [
+            models.Index(fields=['empresa', 'data']),
+        ]
+
+    def __str__(self):
+        return f"{self.empresa_id} - {self.data}: {self.quantidade} atestados"
+
+
+class AbsenteismoCidDiario(models.Model):
+    """
+    Totais diários de atestados por empresa e CID, mantidos junto com
+    ``AbsenteismoDiario``. Alimenta a quebra por CID do painel quando não
+    há filtro de setor ou duração.
+    """
+    empresa = models.ForeignKey(
+        Empresa,
+        on_delete=models.CASCADE,
+        related_name='absenteismos_cid_diarios'
+    )
+    data = models.DateField()
+
+    CID_PRINCIPAL = models.CharField(max_length=10)
+    DESCRICAO_CID = models.CharField(max_length=264, null=True, blank=True)
+
+    quantidade = models.IntegerField(default=0)
+    dias = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Absenteísmo diário por CID"
+        verbose_name_plural = "Absenteísmos diários por CID"
+        indexes = [
+            models.Index(fields=['empresa', 'data'], name='absenteismo_cid_diario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.empresa_id} - {self.data} - {self.CID_PRINCIPAL}: {self.quantidade} atestados"
+
+
 class CNAE(models.Model):
     """
     Cadastro de CNAEs.
@@ -141,4 +223,34 @@ class NTEP(models.Model):
         return f"NTEP - {self.cnae.codigo} | {self.descricao}"
     
     class Meta:
-        db_table = 'ntep'
\ No newline at end of file
+        db_table = 'ntep'
+        indexes = [
+            GinIndex(fields=['cids'], name='ntep_cids_gin'),
+        ]
+
+
+class NTEPCid(models.Model):
+    """
+    Um CID (normalizado, ver ``absenteismo.regras.normalizar_cid``) da lista
+    NTEP de um CNAE. Cópia relacional de ``NTEP.cids`` para as consultas
+    CID -> CNAE; mantida pelos sinais de ``absenteismo.signals`` e pelo
+    ``Jobs/ImportarNtep.py``.
+    """
+    cnae = models.ForeignKey(
+        CNAE,
+        on_delete=models.CASCADE,
+        related_name='ntep_cids'
+    )
+    cid = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.cnae.codigo} - {self.cid}"
+
+    class Meta:
+        db_table = 'ntep_cid'
+        indexes = [
+            models.Index(fields=['cid'], name='ntep_cid_cid_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['cnae', 'cid'], name='ntep_cid_unico'),
+        ]
\ No newline at end of file
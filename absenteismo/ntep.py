@@ -0,0 +1,67 @@
+"""
+CIDs com nexo NTEP por empresa.
+
+As listas ``NTEP.cids`` têm uma cópia normalizada (``normalizar_cid``) e
+indexada em ``NTEPCid``, de onde saem as consultas nos dois sentidos:
+``cids_ntep_empresa`` (empresa -> CIDs) e ``cnaes_do_cid`` (CID -> CNAEs).
+
+O conjunto de CIDs de uma empresa é guardado em cache como ``frozenset``;
+a chave segue ``Empresa.versao_dados`` (ver ``core.cache``), incrementada
+pelos sinais de ``absenteismo.signals`` e pelo ``Jobs/ImportarNtep.py``.
+
+Cada atestado guarda o resultado em ``Absenteismo.ntep_positivo``: o job de
+importação calcula a marca ao gravar e ``recalcular_ntep_empresas`` refaz as
+empresas cujos CNAEs ou listas NTEP mudaram.
+"""
+from django.db import connection, transaction
+
+from absenteismo.models import CNAE, NTEPCid
+from absenteismo.regras import RECALCULAR_NTEP, normalizar_cid
+from core.cache import invalidar_empresas, obter_ou_calcular
+
+# O conjunto só muda com a versão dos dados da empresa
+TEMPO_CIDS_NTEP = 60 * 60 * 24
+
+
+def cids_ntep_empresa(empresa):
+    """``frozenset`` com os CIDs normalizados do NTEP dos CNAEs da empresa."""
+    def calcular():
+        return frozenset(
+            NTEPCid.objects.filter(cnae__empresas=empresa).values_list("cid", flat=True).distinct()
+        )
+
+    return obter_ou_calcular("ntep_cids", empresa, calcular, timeout=TEMPO_CIDS_NTEP)
+
+
+def cnaes_do_cid(cid, empresa=None):
+    """CNAEs cuja lista NTEP contém o CID, opcionalmente só os da empresa."""
+    cnaes = CNAE.objects.filter(ntep_cids__cid=normalizar_cid(cid))
+    if empresa is not None:
+        cnaes = cnaes.filter(empresas=empresa)
+    return cnaes.order_by("codigo")
+
+
+def sincronizar_ntep_cids(cnae_id, cids):
+    """Substitui as linhas de ``NTEPCid`` do CNAE pela lista ``cids``."""
+    normalizados = {normalizar_cid(cid) for cid in cids or ()} - {""}
+    with transaction.atomic():
+        NTEPCid.objects.filter(cnae_id=cnae_id).exclude(cid__in=normalizados).delete()
+        NTEPCid.objects.bulk_create(
+            [NTEPCid(cnae_id=cnae_id, cid=cid) for cid in normalizados],
+            ignore_conflicts=True,
+        )
+
+
+def recalcular_ntep_empresas(empresa_ids):
+    """
+    Refaz ``ntep_positivo`` dos atestados das empresas e descarta o cache
+    delas. Devolve o número de atestados alterados.
+    """
+    empresa_ids = list(empresa_ids)
+    if not empresa_ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(RECALCULAR_NTEP, {"empresas": empresa_ids})
+        alterados = cursor.rowcount
+    invalidar_empresas(empresa_ids)
+    return alterados
@@ -0,0 +1,99 @@
+"""
+Regras de cálculo compartilhadas entre o app e os jobs de ``Jobs/``.
+
+Os jobs são scripts psycopg2 que rodam fora do Django, por isso este
+módulo não importa nada do Django: apenas SQL e funções puras.
+"""
+
+
+def normalizar_cid(cid):
+    """Código do CID em maiúsculas, sem espaços nas pontas e sem ponto (``m54.5`` -> ``M545``)."""
+    return (cid or "").strip().replace(".", "").upper()
+
+
+# Refaz absenteismo_absenteismo.ntep_positivo das empresas %(empresas)s (lista
+# de ids) a partir de ntep_cid; só as linhas cuja marca muda são reescritas
+RECALCULAR_NTEP = """
+    WITH cids AS (
+        SELECT DISTINCT ce.empresa_id, nc.cid
+        FROM cnae_empresas ce
+        JOIN ntep_cid nc ON nc.cnae_id = ce.cnae_id
+        WHERE ce.empresa_id = ANY(%(empresas)s)
+    ),
+    calculado AS (
+        SELECT a.id, (x.cid IS NOT NULL) AS positivo
+        FROM absenteismo_absenteismo a
+        LEFT JOIN cids x
+          ON x.empresa_id = a.empresa_id
+         AND x.cid = UPPER(REPLACE(TRIM(a."CID_PRINCIPAL"), '.', ''))
+        WHERE a.empresa_id = ANY(%(empresas)s)
+    )
+    UPDATE absenteismo_absenteismo a
+    SET ntep_positivo = calculado.positivo
+    FROM calculado
+    WHERE a.id = calculado.id AND a.ntep_positivo <> calculado.positivo
+"""
+
+
+# Refaz os resumos ``AbsenteismoDiario`` e ``AbsenteismoCidDiario`` de uma
+# empresa nas datas informadas. Parâmetros: %(empresa)s (id) e %(datas)s
+# (lista de datas de início de atestado, não vazia). As faixas seguem
+# ``absenteismo.agregacao.DURACOES`` e ``FAIXAS_ETARIAS``.
+ATUALIZAR_RESUMOS = """
+    DELETE FROM absenteismo_absenteismodiario
+    WHERE empresa_id = %(empresa)s AND data = ANY(%(datas)s);
+
+    DELETE FROM absenteismo_absenteismociddiario
+    WHERE empresa_id = %(empresa)s AND data = ANY(%(datas)s);
+
+    INSERT INTO absenteismo_absenteismodiario (
+        empresa_id, data, "SETOR", "GRUPO_PATOLOGICO", "SEXO",
+        faixa_duracao, faixa_etaria, quantidade, dias
+    )
+    SELECT
+        a.empresa_id,
+        a."DT_INICIO_ATESTADO",
+        a."SETOR",
+        a."GRUPO_PATOLOGICO",
+        a."SEXO",
+        CASE
+            WHEN a."TIPO_ATESTADO" = 1 THEN 0
+            WHEN COALESCE(a."DIAS_AFASTADOS", 0) BETWEEN 1 AND 3 THEN 1
+            WHEN a."DIAS_AFASTADOS" BETWEEN 4 AND 7 THEN 2
+            WHEN a."DIAS_AFASTADOS" BETWEEN 8 AND 14 THEN 3
+            WHEN a."DIAS_AFASTADOS" >= 15 THEN 4
+        END,
+        CASE
+            WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 0 AND 25 THEN 0
+            WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 26 AND 35 THEN 1
+            WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 36 AND 45 THEN 2
+            WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 46 AND 55 THEN 3
+            WHEN date_part('year', age(a."DT_INICIO_ATESTADO", f."DATA_NASCIMENTO")) BETWEEN 56 AND 100 THEN 4
+        END,
+        COUNT(*),
+        COALESCE(SUM(a."DIAS_AFASTADOS"), 0)
+    FROM absenteismo_absenteismo a
+    JOIN funcionarios_funcionario f ON f.id = a.funcionario_id
+    WHERE a.empresa_id = %(empresa)s
+      AND a."DT_INICIO_ATESTADO" = ANY(%(datas)s)
+      AND COALESCE(a."NOME_FUNCIONARIO", '') NOT ILIKE '%%nomegenerico%%'
+    GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+    INSERT INTO absenteismo_absenteismociddiario (
+        empresa_id, data, "CID_PRINCIPAL", "DESCRICAO_CID", quantidade, dias
+    )
+    SELECT
+        a.empresa_id,
+        a."DT_INICIO_ATESTADO",
+        a."CID_PRINCIPAL",
+        MAX(a."DESCRICAO_CID"),
+        COUNT(*),
+        COALESCE(SUM(a."DIAS_AFASTADOS"), 0)
+    FROM absenteismo_absenteismo a
+    JOIN funcionarios_funcionario f ON f.id = a.funcionario_id
+    WHERE a.empresa_id = %(empresa)s
+      AND a."DT_INICIO_ATESTADO" = ANY(%(datas)s)
+      AND COALESCE(a."CID_PRINCIPAL", '') <> ''
+      AND COALESCE(a."NOME_FUNCIONARIO", '') NOT ILIKE '%%nomegenerico%%'
+    GROUP BY 1, 2, 3;
+"""
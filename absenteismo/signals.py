@@ -0,0 +1,146 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from absenteismo.consultas import atualizar_resumos
+from absenteismo.models import CNAE, NTEP, Absenteismo
+from absenteismo.ntep import recalcular_ntep_empresas, sincronizar_ntep_cids
+from core.cache import invalidar_empresas
+from dashboard.models import Empresa
+from funcionarios.models import Funcionario
+
+
+def _empresas_do_cnae(cnae_id):
+    return list(Empresa.objects.filter(cnaes=cnae_id).values_list("pk", flat=True))
+
+
+def _cnae_empresas_adicionadas(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() grava os vínculos com bulk_create, sem post_save; remove() e
+    # clear() apagam um a um e passam por _vinculo_cnae_removido
+    if action != "post_add":
+        return
+    if reverse:
+        recalcular_ntep_empresas([instance.pk])
+    else:
+        recalcular_ntep_empresas(pk_set or [])
+
+
+def _vinculo_cnae_salvando(sender, instance, raw=False, **kwargs):
+    # O inline do CNAEAdmin pode trocar a empresa de um vínculo existente
+    instance._empresa_anterior = None
+    if instance.pk and not raw:
+        instance._empresa_anterior = (
+            sender.objects.filter(pk=instance.pk).values_list("empresa_id", flat=True).first()
+        )
+
+
+def _vinculo_cnae_salvo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recalcular_ntep_empresas({instance.empresa_id, getattr(instance, "_empresa_anterior", None)} - {None})
+
+
+def _vinculo_cnae_removido(sender, instance, **kwargs):
+    recalcular_ntep_empresas([instance.empresa_id])
+
+
+def _ntep_salvo(sender, instance, **kwargs):
+    sincronizar_ntep_cids(instance.cnae_id, instance.cids)
+    recalcular_ntep_empresas(_empresas_do_cnae(instance.cnae_id))
+
+
+def _ntep_removido(sender, instance, **kwargs):
+    sincronizar_ntep_cids(instance.cnae_id, [])
+    recalcular_ntep_empresas(_empresas_do_cnae(instance.cnae_id))
+
+
+def _cnae_removendo(sender, instance, **kwargs):
+    instance._empresas_ntep = _empresas_do_cnae(instance.pk)
+
+
+def _cnae_removido(sender, instance, **kwargs):
+    recalcular_ntep_empresas(getattr(instance, "_empresas_ntep", []))
+
+
+def _atualizar_resumos(datas_por_empresa):
+    """
+    Refaz os resumos diários das datas afetadas e só então incrementa a
+    versão das empresas, para que o cache não guarde totais antigos sob a
+    versão nova.
+    """
+    for empresa_id, datas in datas_por_empresa.items():
+        atualizar_resumos(empresa_id, datas)
+    invalidar_empresas([empresa_id for empresa_id in datas_por_empresa if empresa_id])
+
+
+def _absenteismo_salvando(sender, instance, raw=False, **kwargs):
+    instance._resumo_anterior = None
+    if instance.pk and not raw:
+        instance._resumo_anterior = (
+            Absenteismo.objects.filter(pk=instance.pk)
+            .values_list("empresa_id", "DT_INICIO_ATESTADO")
+            .first()
+        )
+
+
+def _absenteismo_salvo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    datas_por_empresa = {instance.empresa_id: {instance.DT_INICIO_ATESTADO}}
+    anterior = getattr(instance, "_resumo_anterior", None)
+    if anterior:
+        datas_por_empresa.setdefault(anterior[0], set()).add(anterior[1])
+    _atualizar_resumos(datas_por_empresa)
+
+
+def _absenteismo_removido(sender, instance, **kwargs):
+    _atualizar_resumos({instance.empresa_id: {instance.DT_INICIO_ATESTADO}})
+
+
+def _datas_atestados_funcionario(funcionario_id):
+    datas_por_empresa = {}
+    atestados = Absenteismo.objects.filter(funcionario_id=funcionario_id).values_list(
+        "empresa_id", "DT_INICIO_ATESTADO"
+    ).distinct()
+    for empresa_id, data in atestados:
+        datas_por_empresa.setdefault(empresa_id, set()).add(data)
+    return datas_por_empresa
+
+
+def _funcionario_salvando(sender, instance, raw=False, **kwargs):
+    # A faixa etária do resumo depende da data de nascimento do funcionário
+    instance._nascimento_anterior = None
+    if instance.pk and not raw:
+        instance._nascimento_anterior = (
+            Funcionario.objects.filter(pk=instance.pk).values_list("DATA_NASCIMENTO", flat=True).first()
+        )
+
+
+def _funcionario_salvo(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance._nascimento_anterior == instance.DATA_NASCIMENTO:
+        return
+    _atualizar_resumos(_datas_atestados_funcionario(instance.pk))
+
+
+def _funcionario_removendo(sender, instance, **kwargs):
+    # Os atestados ficam sem funcionário (SET_NULL) e saem do resumo
+    instance._resumo_atestados = _datas_atestados_funcionario(instance.pk)
+
+
+def _funcionario_removido(sender, instance, **kwargs):
+    _atualizar_resumos(getattr(instance, "_resumo_atestados", {}))
+
+
+m2m_changed.connect(_cnae_empresas_adicionadas, sender=CNAE.empresas.through, dispatch_uid="ntep_cnae_empresas_alteradas")
+pre_save.connect(_vinculo_cnae_salvando, sender=CNAE.empresas.through, dispatch_uid="ntep_vinculo_cnae_salvando")
+post_save.connect(_vinculo_cnae_salvo, sender=CNAE.empresas.through, dispatch_uid="ntep_vinculo_cnae_salvo")
+post_delete.connect(_vinculo_cnae_removido, sender=CNAE.empresas.through, dispatch_uid="ntep_vinculo_cnae_removido")
+post_save.connect(_ntep_salvo, sender=NTEP, dispatch_uid="ntep_alterado_save")
+post_delete.connect(_ntep_removido, sender=NTEP, dispatch_uid="ntep_alterado_delete")
+pre_delete.connect(_cnae_removendo, sender=CNAE, dispatch_uid="ntep_cnae_removendo")
+post_delete.connect(_cnae_removido, sender=CNAE, dispatch_uid="ntep_cnae_removido")
+pre_save.connect(_absenteismo_salvando, sender=Absenteismo, dispatch_uid="resumo_absenteismo_salvando")
+post_save.connect(_absenteismo_salvo, sender=Absenteismo, dispatch_uid="resumo_absenteismo_salvo")
+post_delete.connect(_absenteismo_removido, sender=Absenteismo, dispatch_uid="resumo_absenteismo_removido")
+pre_save.connect(_funcionario_salvando, sender=Funcionario, dispatch_uid="resumo_funcionario_salvando")
+post_save.connect(_funcionario_salvo, sender=Funcionario, dispatch_uid="resumo_funcionario_salvo")
+pre_delete.connect(_funcionario_removendo, sender=Funcionario, dispatch_uid="resumo_funcionario_removendo")
+post_delete.connect(_funcionario_removido, sender=Funcionario, dispatch_uid="resumo_funcionario_removido")
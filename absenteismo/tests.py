@@ -1,3 +1,262 @@
-from django.test import TestCase
+import json
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from absenteismo.agregacao import ColunasAbsenteismo, calcular_indicadores
+from absenteismo.consultas import agregar_absenteismo, filtrar_atestados
+from absenteismo.models import CNAE, NTEP, Absenteismo
+from dashboard.models import Empresa, EmpresaAtivaUsuario, UsuarioEmpresa
+from funcionarios.models import Funcionario
+
+# Os jobs de importação são scripts soltos em Jobs/, sem pacote
+sys.path.insert(0, str(settings.BASE_DIR / "Jobs"))
+
+from lista_ntep import comparar_ntep, ler_arquivo_ntep
+
+CACHE_LOCAL = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+KPIS = (
+    "total_atestados", "total_dias", "media_dias", "media_atestados",
+    "impacto_financeiro", "taxa_absenteismo", "bradford_critico_count",
+    "taxa_reincidencia", "setores",
+)
+
+
+def criar_empresa(codigo="100"):
+    return Empresa.objects.create(
+        CODIGO=codigo, RAZAOSOCIAL=f"Empresa {codigo}", ENDERECO="Rua A",
+        NUMEROENDERECO="1", COMPLEMENTOENDERECO="", BAIRRO="Centro",
+        CIDADE="Cidade", CEP="00000000", UF="SP", CNPJ="00000000000100",
+    )
+
+
+def criar_funcionario(empresa, codigo, sexo, nascimento, setor):
+    return Funcionario.objects.create(
+        CODIGOEMPRESA=empresa.CODIGO, NOMEEMPRESA=empresa.RAZAOSOCIAL, empresa=empresa,
+        CODIGO=codigo, NOME=f"Funcionario {codigo}", CPF=f"000000000{codigo}",
+        SEXO=sexo, DATA_NASCIMENTO=nascimento, DATA_ADMISSAO=date(2015, 1, 1),
+        MATRICULAFUNCIONARIO=f"M{codigo}", NOMESETOR=setor,
+    )
+
+
+def criar_atestado(funcionario, inicio, dias, cid, grupo, tipo=0):
+    return Absenteismo.objects.create(
+        empresa=funcionario.empresa, funcionario=funcionario,
+        MATRICULA_FUNC=funcionario.MATRICULAFUNCIONARIO, SETOR=funcionario.NOMESETOR,
+        SEXO=funcionario.SEXO, TIPO_ATESTADO=tipo,
+        DT_INICIO_ATESTADO=inicio, DT_FIM_ATESTADO=inicio + timedelta(days=max(dias - 1, 0)),
+        DIAS_AFASTADOS=dias, CID_PRINCIPAL=cid, DESCRICAO_CID=f"Descricao {cid}",
+        GRUPO_PATOLOGICO=grupo,
+    )
+
+
+@skipUnless(connection.vendor == "postgresql", "resumos diários existem só no PostgreSQL")
+@override_settings(CACHES=CACHE_LOCAL)
+class PainelAbsenteismoTests(TestCase):
+    """Os totais vindos dos resumos no banco batem com a varredura dos atestados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        hoje = date.today()
+        cls.empresa = criar_empresa()
+        ana = criar_funcionario(cls.empresa, "1", 2, date(1990, 5, 10), "FABRICA")
+        bruno = criar_funcionario(cls.empresa, "2", 1, date(1970, 1, 20), "MANUTENCAO")
+        carla = criar_funcionario(cls.empresa, "3", 2, date(2001, 8, 3), "SUPORTE")
+        criar_funcionario(cls.empresa, "4", 1, date(1985, 3, 15), "FABRICA")
+
+        criar_atestado(ana, hoje - timedelta(days=10), 3, "M545", "Osteomuscular")
+        criar_atestado(ana, hoje - timedelta(days=40), 5, "M545", "Osteomuscular")
+        criar_atestado(ana, hoje - timedelta(days=75), 10, "F32", "Mental")
+        criar_atestado(bruno, hoje - timedelta(days=12), 20, "F32", "Mental")
+        criar_atestado(bruno, hoje - timedelta(days=100), 1, "J11", "Respiratorio", tipo=1)
+        criar_atestado(carla, hoje - timedelta(days=3), 2, "J11", "Respiratorio")
+        criar_atestado(carla, hoje - timedelta(days=400), 7, "J11", "Respiratorio")
+
+    def setUp(self):
+        self.usuario = User.objects.create_user("analista", password="senha")
+        UsuarioEmpresa.objects.create(usuario=self.usuario, empresa=self.empresa)
+        EmpresaAtivaUsuario.objects.create(usuario=self.usuario, empresa=self.empresa)
+        self.client.force_login(self.usuario)
+
+    def varredura(self, data_inicio, **filtros):
+        return ColunasAbsenteismo.do_queryset(filtrar_atestados(self.empresa, data_inicio, **filtros)).agregar()
+
+    def test_marginais_iguais_a_varredura_dos_atestados(self):
+        data_inicio = date.today() - timedelta(days=180)
+        for filtros in ({}, {"grupo": "F"}, {"setor": "MANUTENCAO"}, {"tipo_duracao": "4-7"}):
+            with self.subTest(**filtros):
+                self.assertEqual(
+                    agregar_absenteismo(self.empresa, data_inicio, **filtros),
+                    self.varredura(data_inicio, **filtros),
+                )
+
+    def test_chaves_de_dimensao_sao_inteiras(self):
+        marginais = agregar_absenteismo(self.empresa, date.today() - timedelta(days=180))
+        for ano, mes in marginais["meses"]:
+            self.assertIs(type(ano), int)
+            self.assertIs(type(mes), int)
+        for dia in marginais["dia_grupo"]:
+            self.assertIs(type(dia), int)
+
+    def test_view_exibe_os_kpis_da_varredura(self):
+        for periodo, dias_periodo in (("semestre", 180), ("trimestre", 90), ("mes", 30)):
+            with self.subTest(periodo=periodo):
+                resposta = self.client.get(reverse("absenteismo"), {"periodo": periodo})
+                self.assertEqual(resposta.status_code, 200)
+
+                esperado = calcular_indicadores(
+                    self.varredura(date.today() - timedelta(days=dias_periodo)), 4, dias_periodo
+                )
+                for kpi in KPIS:
+                    self.assertEqual(resposta.context[kpi], esperado[kpi], kpi)
+
+    def test_view_segue_as_formulas_originais(self):
+        resposta = self.client.get(reverse("absenteismo"), {"periodo": "semestre"})
+
+        # Dentro do semestre: 6 atestados e 41 dias; o de 400 dias atrás fica de fora
+        self.assertEqual(resposta.context["total_funcionarios"], 4)
+        self.assertEqual(resposta.context["total_atestados"], 6)
+        self.assertEqual(resposta.context["total_dias"], 41)
+        self.assertAlmostEqual(resposta.context["impacto_financeiro"], 41 * 8 * 8.02)
+        self.assertAlmostEqual(resposta.context["taxa_absenteismo"], 41 / (4 * int(180 * 5 / 7)) * 100)
+        # Bradford = episódios² x dias: Ana 3² x 18 = 162, Bruno 2² x 21 = 84, Carla 1 x 2
+        bradford = {b["MATRICULA_FUNC"]: b["bradford"] for b in resposta.context["bradford_detalhado"]}
+        self.assertEqual(bradford, {"M1": 162, "M2": 84, "M3": 2})
+        self.assertEqual(resposta.context["bradford_critico_count"], 0)
+        self.assertAlmostEqual(resposta.context["taxa_reincidencia"], 2 / 3 * 100)
+
+
+@skipUnless(connection.vendor == "postgresql", "NTEP usa ArrayField do PostgreSQL")
+class VinculoCnaeEmpresaTests(TestCase):
+    """Vínculos CNAE-empresa gravados pelo inline do admin refazem o NTEP."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = criar_empresa("100")
+        cls.outra = criar_empresa("200")
+        funcionario = criar_funcionario(cls.empresa, "1", 1, date(1990, 1, 1), "FABRICA")
+        cls.atestado = criar_atestado(funcionario, date.today(), 3, "M54.5", "Osteomuscular")
+        cls.cnae = CNAE.objects.create(codigo="2512-8/00")
+        NTEP.objects.create(cnae=cls.cnae, cids=["M545"])
+        cls.Vinculo = CNAE.empresas.through
+
+    def ntep_positivo(self):
+        self.atestado.refresh_from_db()
+        return self.atestado.ntep_positivo
+
+    def test_vinculo_salvo_e_removido_como_no_inline(self):
+        vinculo = self.Vinculo.objects.create(cnae=self.cnae, empresa=self.empresa)
+        self.assertTrue(self.ntep_positivo())
+
+        vinculo.delete()
+        self.assertFalse(self.ntep_positivo())
+
+    def test_troca_de_empresa_no_vinculo(self):
+        vinculo = self.Vinculo.objects.create(cnae=self.cnae, empresa=self.empresa)
+        vinculo.empresa = self.outra
+        vinculo.save()
+        self.assertFalse(self.ntep_positivo())
+
+    def test_add_e_remove(self):
+        self.cnae.empresas.add(self.empresa)
+        self.assertTrue(self.ntep_positivo())
+
+        self.cnae.empresas.remove(self.empresa)
+        self.assertFalse(self.ntep_positivo())
+
+        self.empresa.cnaes.add(self.cnae)
+        self.assertTrue(self.ntep_positivo())
+
+        self.empresa.cnaes.clear()
+        self.assertFalse(self.ntep_positivo())
+
+
+@skipUnless(connection.vendor == "postgresql", "NTEP usa ArrayField do PostgreSQL")
+class BuscaNtepAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ntep = NTEP.objects.create(cnae=CNAE.objects.create(codigo="2512-8/00"), cids=["M54.5", "F32"])
+        NTEP.objects.create(cnae=CNAE.objects.create(codigo="4711-3/02"), cids=["J11"])
+
+    def buscar(self, termo):
+        modelo_admin = admin.site._registry[NTEP]
+        resultado, _ = modelo_admin.get_search_results(None, NTEP.objects.all(), termo)
+        return list(resultado.distinct())
+
+    def test_cid_digitado_com_ponto_e_minusculas(self):
+        self.assertEqual(self.buscar("m54.5"), [self.ntep])
+        self.assertEqual(self.buscar(" M545 "), [self.ntep])
+
+    def test_busca_pelo_codigo_do_cnae_continua(self):
+        self.assertEqual(self.buscar("2512"), [self.ntep])
+
+
+class ListaNtepTests(SimpleTestCase):
+    """Leitura do arquivo NTEP e diferença contra as tabelas (Jobs/ImportarNtep.py)."""
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+
+    def arquivo(self, nome, conteudo):
+        caminho = self.pasta / nome
+        caminho.write_text(conteudo, encoding="utf-8")
+        return caminho
+
+    def test_json_e_csv_normalizam_os_cids(self):
+        esperado = {"0111-3/01": {"descricao": "Cultivo de arroz", "cids": {"M545", "G560"}}}
+        json_dict = self.arquivo("a.json", json.dumps(
+            {"0111-3/01": {"descricao": "Cultivo de arroz", "cids": ["m54.5", " G56.0", ""]}}
+        ))
+        json_lista = self.arquivo("b.json", json.dumps(
+            [{"cnae": "0111-3/01", "descricao": "Cultivo de arroz", "cids": ["M54.5", "g560"]}]
+        ))
+        csv_cids = self.arquivo("c.csv", 'cnae;descricao;cids\n0111-3/01;Cultivo de arroz;"m54.5, G56.0"\n')
+        csv_cid = self.arquivo("d.csv", "CNAE,Descricao,CID\n0111-3/01,Cultivo de arroz,M54.5\n0111-3/01,,g56.0\n")
+        for caminho in (json_dict, json_lista, csv_cids, csv_cid):
+            with self.subTest(arquivo=caminho.name):
+                self.assertEqual(ler_arquivo_ntep(caminho), esperado)
+
+    def test_diferencas(self):
+        arquivo = {
+            "A": {"descricao": "Novo", "cids": {"M545", "F32"}},
+            "B": {"descricao": "B renomeado", "cids": {"J11"}},
+            "C": {"descricao": "C", "cids": {"M545", "G560"}},
+            "D": {"descricao": "D", "cids": {"F32"}},
+            "E": {"descricao": "E", "cids": {"J11"}},
+        }
+        atual = {
+            "B": {"descricao": "B", "ntep": True, "ntep_descricao": "B", "cids": {"J11"}},
+            "C": {"descricao": "C", "ntep": True, "ntep_descricao": "C", "cids": {"M545", "F32", "J11"}},
+            "D": {"descricao": "D", "ntep": False, "ntep_descricao": "", "cids": set()},
+            "E": {"descricao": "E", "ntep": True, "ntep_descricao": "E", "cids": {"J11"}},
+            "F": {"descricao": "F", "ntep": True, "ntep_descricao": "F", "cids": {"M545", "F32"}},
+            "G": {"descricao": "G", "ntep": False, "ntep_descricao": "", "cids": set()},
+        }
+        self.assertEqual(comparar_ntep(arquivo, atual), {
+            "cnaes_novos": ["A"],
+            "cnaes_alterados": ["B"],
+            "ntep_novos": ["A", "D"],
+            "ntep_alterados": ["B", "C"],
+            "ntep_removidos": ["F"],
+            # A: 2, D: 1, C: +G560; C: -F32 -J11, F: 2
+            "cids_incluidos": 4,
+            "cids_excluidos": 4,
+        })
+
+    def test_manter_ausentes(self):
+        atual = {"F": {"descricao": "F", "ntep": True, "ntep_descricao": "F", "cids": {"M545"}}}
+        diferencas = comparar_ntep({}, atual, manter_ausentes=True)
+        self.assertEqual(diferencas["ntep_removidos"], [])
+        self.assertEqual(diferencas["cids_excluidos"], 0)
@@ -3,16 +3,14 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Count, Case, When, Value, IntegerField
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from dashboard.models import EmpresaAtivaUsuario
+from dashboard.decorators import empresa_ativa_requerida
 from convocacao.models import Convocacao
 from funcionarios.models import Funcionario
 
 @login_required
+@empresa_ativa_requerida
 def convocacao(request):
-    try:
-        empresa_ativa = EmpresaAtivaUsuario.objects.get(usuario=request.user).empresa
-    except EmpresaAtivaUsuario.DoesNotExist:
-        return redirect('login')
+    empresa_ativa = request.empresa_ativa
     
     status_filter = request.GET.get('status', '')
     busca = request.GET.get('q', '')
@@ -144,11 +142,9 @@ def convocacao(request):
     return render(request, 'convocacao.html', context)
 
 @login_required
+@empresa_ativa_requerida
 def convocacao_detalhes(request, id):
-    try:
-        empresa_ativa = EmpresaAtivaUsuario.objects.get(usuario=request.user).empresa
-    except EmpresaAtivaUsuario.DoesNotExist:
-        return redirect('login')
+    empresa_ativa = request.empresa_ativa
 
     funcionario_codigo = id
     funcionario = None
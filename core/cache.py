@@ -0,0 +1,148 @@
+"""
+Cache dos painéis analíticos por empresa.
+
+As chaves são formadas pela empresa, pelos filtros da tela e pela versão
+dos dados da empresa (``Empresa.versao_dados``). Todos os usuários da mesma
+empresa compartilham as entradas, e qualquer alteração nos dados incrementa
+a versão, de modo que as entradas antigas simplesmente deixam de ser lidas
+e expiram sozinhas.
+
+Acertos e falhas são contados por processo (cada worker tem os seus), sem
+acesso ao cache, e registrados no log ``core.cache`` a cada
+``INTERVALO_LOG_METRICAS`` consultas. Com o ``RedisCache``, ``metricas_redis``
+lê os totais do servidor, somados entre todos os workers.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import zlib
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import F
+
+TEMPO_PADRAO = 300
+
+# Valores serializados acima deste tamanho (bytes) são gravados comprimidos no Redis
+LIMITE_COMPRESSAO = 1024
+_MARCA_COMPRIMIDO = b"z"
+
+# Consultas de obter_ou_calcular entre dois registros das métricas no log
+INTERVALO_LOG_METRICAS = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class SerializadorCompactado:
+    """
+    Serializador para o ``RedisCache`` que comprime com zlib os valores
+    grandes (contextos dos painéis, ``chart_data``). Inteiros continuam
+    gravados sem serialização para que ``incr`` funcione.
+    """
+
+    def __init__(self, protocol=None):
+        self.protocol = pickle.HIGHEST_PROTOCOL if protocol is None else protocol
+
+    def dumps(self, obj):
+        if type(obj) is int:
+            return obj
+        dados = pickle.dumps(obj, self.protocol)
+        if len(dados) > LIMITE_COMPRESSAO:
+            return _MARCA_COMPRIMIDO + zlib.compress(dados)
+        return dados
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            pass
+        if data[:1] == _MARCA_COMPRIMIDO:
+            data = zlib.decompress(data[1:])
+        return pickle.loads(data)
+
+
+_trava_metricas = threading.Lock()
+_metricas = {"acertos": 0, "falhas": 0}
+
+
+def _contar(chave):
+    with _trava_metricas:
+        _metricas[chave] += 1
+        registrar = (_metricas["acertos"] + _metricas["falhas"]) % INTERVALO_LOG_METRICAS == 0
+    if registrar:
+        logger.info("Métricas do cache: %s", metricas_cache())
+
+
+def metricas_cache():
+    """Acertos e falhas de ``obter_ou_calcular`` neste processo desde que ele subiu."""
+    with _trava_metricas:
+        acertos = _metricas["acertos"]
+        falhas = _metricas["falhas"]
+    total = acertos + falhas
+    return {
+        "escopo": "worker",
+        "pid": os.getpid(),
+        "acertos": acertos,
+        "falhas": falhas,
+        "taxa_acerto": round(acertos / total * 100, 1) if total else 0,
+    }
+
+
+def metricas_redis():
+    """
+    ``keyspace_hits`` e ``keyspace_misses`` do ``INFO stats`` do Redis, de
+    todos os workers desde que o servidor subiu, ou None se o cache não for
+    Redis ou não responder. Contam todas as leituras do servidor, não só as
+    de ``obter_ou_calcular``.
+    """
+    backend = caches["default"]
+    if not isinstance(backend, RedisCache):
+        return None
+    try:
+        info = backend._cache.get_client().info("stats")
+    except Exception:
+        logger.warning("Não foi possível ler INFO stats do Redis", exc_info=True)
+        return None
+    acertos = info.get("keyspace_hits", 0)
+    falhas = info.get("keyspace_misses", 0)
+    total = acertos + falhas
+    return {
+        "escopo": "servidor",
+        "acertos": acertos,
+        "falhas": falhas,
+        "taxa_acerto": round(acertos / total * 100, 1) if total else 0,
+    }
+
+
+def chave_empresa(prefixo, empresa, **filtros):
+    """Chave de cache para ``prefixo`` na versão atual dos dados da empresa."""
+    partes = "&".join(f"{nome}={filtros[nome]}" for nome in sorted(filtros))
+    resumo = hashlib.md5(partes.encode("utf-8")).hexdigest()
+    return f"{prefixo}:{empresa.pk}:v{empresa.versao_dados}:{resumo}"
+
+
+def obter_ou_calcular(prefixo, empresa, calcular, timeout=TEMPO_PADRAO, **filtros):
+    """Devolve o valor em cache ou executa ``calcular()`` e guarda o resultado."""
+    chave = chave_empresa(prefixo, empresa, **filtros)
+    dados = cache.get(chave)
+    if dados is None:
+        _contar("falhas")
+        dados = calcular()
+        cache.set(chave, dados, timeout)
+    else:
+        _contar("acertos")
+    return dados
+
+
+def invalidar_empresa(empresa_id):
+    """Incrementa a versão dos dados da empresa, descartando o cache dela."""
+    invalidar_empresas([empresa_id])
+
+
+def invalidar_empresas(empresa_ids):
+    """``invalidar_empresa`` para várias empresas em um único UPDATE."""
+    from dashboard.models import Empresa
+
+    Empresa.objects.filter(pk__in=list(empresa_ids)).update(versao_dados=F("versao_dados") + 1)
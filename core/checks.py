@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.database)
+def verificar_conexoes_banco(app_configs, **kwargs):
+    """Avisa quando, fora do DEBUG, o banco não usa o pool de conexões do psycopg 3."""
+    if settings.DEBUG:
+        return []
+
+    avisos = []
+    for alias, banco in settings.DATABASES.items():
+        if not banco.get('OPTIONS', {}).get('pool'):
+            if banco.get('CONN_MAX_AGE'):
+                situacao = "reaproveita conexões apenas por worker (CONN_MAX_AGE), sem pool"
+            else:
+                situacao = "não usa pool nem conexões persistentes; cada requisição abrirá uma conexão nova"
+            avisos.append(Warning(
+                f"O banco '{alias}' {situacao}.",
+                hint="Defina DB_POOL=True (psycopg 3) em produção.",
+                id='core.W001',
+            ))
+    return avisos
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+
+
+class RenovacaoSessaoMiddleware:
+    """
+    Expiração deslizante da sessão sem regravá-la a cada requisição.
+
+    A sessão só é marcada como modificada (e portanto salva, renovando o
+    prazo de SESSION_COOKIE_AGE) quando já se passou a fração
+    SESSION_REFRESH_FRACTION desse prazo desde a última gravação. Deve vir
+    depois de SessionMiddleware.
+    """
+
+    CHAVE = "_sessao_renovada_em"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.intervalo = settings.SESSION_COOKIE_AGE * settings.SESSION_REFRESH_FRACTION
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        sessao = getattr(request, "session", None)
+        if sessao is None or sessao.is_empty():
+            return response
+
+        agora = int(time.time())
+        if sessao.modified or agora - sessao.get(self.CHAVE, 0) >= self.intervalo:
+            sessao[self.CHAVE] = agora
+        return response
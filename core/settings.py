@@ -42,14 +42,17 @@ INSTALLED_APPS = [
     'funcionarios',
     'absenteismo',
     'convocacao',
+    'core',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.RenovacaoSessaoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dashboard.middleware.EmpresaAtivaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'dashboard.context_processors.empresas_usuario',
             ],
         },
     },
@@ -80,10 +84,25 @@ WSGI_APPLICATION = 'core.wsgi.application'
 from decouple import config
 import dj_database_url
 
+# Conexões persistentes (DB_CONN_MAX_AGE, em segundos) ou pool do psycopg 3
+# (DB_POOL=True). O pool exige CONN_MAX_AGE = 0, então os dois são exclusivos.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
-    'default': dj_database_url.parse(config('DATABASE_URL'))
+    'default': dj_database_url.parse(
+        config('DATABASE_URL'),
+        conn_max_age=0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        conn_health_checks=config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+    )
 }
 
+if DB_POOL:
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,6 +153,49 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Cache
+# Compartilhado entre os workers: Redis quando REDIS_URL estiver definido,
+# senão arquivos em disco (já comprimidos com zlib pelo próprio backend).
+
+CACHE_KEY_PREFIX = config('CACHE_KEY_PREFIX', default='portal')
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'OPTIONS': {
+                'serializer': 'core.cache.SerializadorCompactado',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=os.path.join(BASE_DIR, 'cache')),
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'OPTIONS': {
+                'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+            },
+        }
+    }
+
+# Métricas de acerto do cache (core.cache) vão para o console dos workers
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.cache': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+
 #Messages
 from django.contrib.messages import constants
 
@@ -152,8 +214,15 @@ SESSION_COOKIE_AGE = 1800
 # Se True, a sessão expira quando o navegador é fechado
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
-# Se True, renova o tempo da sessão a cada requisição
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessões em cache com gravação no banco; 'django.contrib.sessions.backends.signed_cookies'
+# dispensa o banco por completo
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+# A sessão não é regravada a cada requisição: RenovacaoSessaoMiddleware renova o
+# prazo de SESSION_COOKIE_AGE quando esta fração dele já passou desde a última
+# gravação. Com 0.1, o tempo ocioso até expirar fica entre 27 e 30 minutos.
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_FRACTION = config('SESSION_REFRESH_FRACTION', default=0.1, cast=float)
 
 
 LOGIN_URL = '/usuarios/login/'
@@ -0,0 +1,123 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.cache import (
+    LIMITE_COMPRESSAO, SerializadorCompactado, chave_empresa, invalidar_empresa,
+    invalidar_empresas, obter_ou_calcular,
+)
+from dashboard.models import Empresa
+from funcionarios.models import Funcionario
+
+CACHE_LOCAL = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def criar_empresa(codigo):
+    return Empresa.objects.create(
+        CODIGO=codigo, RAZAOSOCIAL=f"Empresa {codigo}", ENDERECO="Rua A",
+        NUMEROENDERECO="1", COMPLEMENTOENDERECO="", BAIRRO="Centro",
+        CIDADE="Cidade", CEP="00000000", UF="SP", CNPJ="00000000000100",
+    )
+
+
+class SerializadorCompactadoTests(SimpleTestCase):
+    def setUp(self):
+        self.serializador = SerializadorCompactado()
+
+    def test_inteiros_nao_sao_serializados(self):
+        self.assertEqual(self.serializador.dumps(7), 7)
+        self.assertEqual(self.serializador.loads(b"7"), 7)
+
+    def test_valores_grandes_sao_comprimidos(self):
+        valor = {"chart_data": "x" * (LIMITE_COMPRESSAO * 4)}
+        dados = self.serializador.dumps(valor)
+        self.assertLess(len(dados), LIMITE_COMPRESSAO)
+        self.assertEqual(self.serializador.loads(dados), valor)
+
+    def test_valores_pequenos_voltam_iguais(self):
+        valor = {"total_atestados": 3, "setores": ["A", "B"]}
+        self.assertEqual(self.serializador.loads(self.serializador.dumps(valor)), valor)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CacheEmpresaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = criar_empresa("100")
+        cls.outra = criar_empresa("200")
+
+    def setUp(self):
+        cache.clear()
+        self.chamadas = 0
+
+    def calcular(self):
+        self.chamadas += 1
+        return {"chamada": self.chamadas}
+
+    def test_chave_nao_depende_da_ordem_dos_filtros(self):
+        self.assertEqual(
+            chave_empresa("absenteismo", self.empresa, periodo="mes", setor="A"),
+            chave_empresa("absenteismo", self.empresa, setor="A", periodo="mes"),
+        )
+
+    def test_chave_separa_filtros_empresas_e_versoes(self):
+        chave = chave_empresa("absenteismo", self.empresa, periodo="mes")
+        self.assertNotEqual(chave, chave_empresa("absenteismo", self.empresa, periodo="trimestre"))
+        self.assertNotEqual(chave, chave_empresa("absenteismo", self.outra, periodo="mes"))
+        self.assertNotEqual(chave, chave_empresa("convocacao", self.empresa, periodo="mes"))
+        self.assertIn(f":v{self.empresa.versao_dados}:", chave)
+
+    def test_segunda_consulta_vem_do_cache(self):
+        primeira = obter_ou_calcular("absenteismo", self.empresa, self.calcular, periodo="mes")
+        segunda = obter_ou_calcular("absenteismo", self.empresa, self.calcular, periodo="mes")
+        self.assertEqual(primeira, segunda)
+        self.assertEqual(self.chamadas, 1)
+
+    def test_filtros_diferentes_nao_compartilham_entrada(self):
+        obter_ou_calcular("absenteismo", self.empresa, self.calcular, periodo="mes")
+        obter_ou_calcular("absenteismo", self.empresa, self.calcular, periodo="semestre")
+        self.assertEqual(self.chamadas, 2)
+
+    def test_invalidar_empresa_recalcula_so_a_empresa(self):
+        obter_ou_calcular("absenteismo", self.empresa, self.calcular)
+        obter_ou_calcular("absenteismo", self.outra, self.calcular)
+
+        invalidar_empresa(self.empresa.pk)
+        empresa = Empresa.objects.get(pk=self.empresa.pk)
+        outra = Empresa.objects.get(pk=self.outra.pk)
+        self.assertEqual(empresa.versao_dados, self.empresa.versao_dados + 1)
+        self.assertEqual(outra.versao_dados, self.outra.versao_dados)
+
+        obter_ou_calcular("absenteismo", empresa, self.calcular)
+        obter_ou_calcular("absenteismo", outra, self.calcular)
+        self.assertEqual(self.chamadas, 3)
+
+    def test_invalidar_empresas_incrementa_cada_uma_uma_vez(self):
+        invalidar_empresas([self.empresa.pk, self.outra.pk])
+        self.assertEqual(
+            sorted(Empresa.objects.values_list("versao_dados", flat=True)),
+            [self.empresa.versao_dados + 1, self.outra.versao_dados + 1],
+        )
+
+    def test_salvar_instancia_antiga_nao_desfaz_a_versao(self):
+        antiga = Empresa.objects.get(pk=self.empresa.pk)
+        invalidar_empresa(self.empresa.pk)
+
+        antiga.RAZAOSOCIAL = "Empresa renomeada"
+        antiga.save()
+
+        atual = Empresa.objects.get(pk=self.empresa.pk)
+        self.assertEqual(atual.RAZAOSOCIAL, "Empresa renomeada")
+        self.assertEqual(atual.versao_dados, self.empresa.versao_dados + 1)
+
+    def test_alterar_funcionario_invalida_a_empresa(self):
+        Funcionario.objects.create(
+            CODIGOEMPRESA=self.empresa.CODIGO, NOMEEMPRESA=self.empresa.RAZAOSOCIAL,
+            empresa=self.empresa, CODIGO="1", NOME="Funcionario 1", CPF="00000000001",
+            SEXO=1, DATA_NASCIMENTO=date(1990, 1, 1), DATA_ADMISSAO=date(2015, 1, 1),
+        )
+        self.assertEqual(
+            Empresa.objects.get(pk=self.empresa.pk).versao_dados,
+            self.empresa.versao_dados + 1,
+        )
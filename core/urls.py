@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
-from core.views import landing
+from core.views import landing, metricas_cache_view
 
 urlpatterns = [
     path('', landing, name='landing'),
     path('admin/', admin.site.urls),
+    path('metricas/cache/', metricas_cache_view, name='metricas_cache'),
     path('usuarios/', include('usuarios.urls')),
     path('dashboard/', include('dashboard.urls')),
     path('funcionarios/', include('funcionarios.urls')),
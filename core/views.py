@@ -1,4 +1,13 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core.cache import metricas_cache, metricas_redis
+
 def landing(request):
     return render(request, "landing.html")
+
+@staff_member_required
+def metricas_cache_view(request):
+    # "worker" vale só para o processo que atendeu a requisição; "servidor" soma todos
+    return JsonResponse({"worker": metricas_cache(), "servidor": metricas_redis()})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Empresa, UsuarioEmpresa, EmpresaAtivaUsuario
+from .models import Empresa, UsuarioEmpresa, EmpresaAtivaUsuario, CheckpointImportacao
 from funcionarios.models import Funcionario
 
 class UsuarioEmpresaInline(admin.TabularInline):
@@ -34,3 +34,9 @@ class EmpresaAtivaUsuarioAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'empresa')
     search_fields = ('usuario__username', 'empresa__RAZAOSOCIAL')
     list_filter = ('empresa',)
+
+@admin.register(CheckpointImportacao)
+class CheckpointImportacaoAdmin(admin.ModelAdmin):
+    list_display = ('job', 'empresa', 'intervalo_inicio', 'intervalo_fim', 'status', 'inseridos', 'atualizados', 'erros', 'finalizado_em')
+    list_filter = ('job', 'status')
+    search_fields = ('empresa__CODIGO', 'empresa__RAZAOSOCIAL')
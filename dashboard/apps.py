@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        from django.apps import apps
+        from dashboard.signals import conectar_invalidacao
+
+        # Absenteismo é invalidado por absenteismo.signals, depois de refazer o resumo diário
+        conectar_invalidacao(
+            apps.get_model('funcionarios', 'Funcionario'),
+        )
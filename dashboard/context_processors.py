@@ -0,0 +1,30 @@
+from django.core.cache import cache
+
+from dashboard.models import UsuarioEmpresa
+
+TEMPO_EMPRESAS_USUARIO = 3600
+
+
+def chave_empresas_usuario(usuario_id):
+    return f"empresas_usuario:{usuario_id}"
+
+
+def empresas_usuario(request):
+    """
+    Empresas vinculadas ao usuário, como lista de (id, RAZAOSOCIAL), para o
+    seletor de empresa da navbar. Fica em cache até um vínculo ou a razão
+    social de uma das empresas mudar (ver dashboard.signals).
+    """
+    if not request.user.is_authenticated:
+        return {}
+
+    chave = chave_empresas_usuario(request.user.pk)
+    empresas = cache.get(chave)
+    if empresas is None:
+        empresas = list(
+            UsuarioEmpresa.objects.filter(usuario=request.user)
+            .order_by('empresa__RAZAOSOCIAL')
+            .values_list('empresa_id', 'empresa__RAZAOSOCIAL')
+        )
+        cache.set(chave, empresas, TEMPO_EMPRESAS_USUARIO)
+    return {"empresas_usuario": empresas}
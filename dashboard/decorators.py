@@ -0,0 +1,20 @@
+from functools import wraps
+
+from django.contrib import auth, messages
+from django.contrib.messages import constants
+from django.shortcuts import redirect
+
+
+def empresa_ativa_requerida(view):
+    """
+    Garante que ``request.empresa_ativa`` exista antes de chamar a view.
+    Sem empresa ativa o usuário é desconectado e volta ao login com aviso.
+    """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if not request.empresa_ativa:
+            auth.logout(request)
+            messages.add_message(request, constants.ERROR, 'Empresa ativa não encontrada.')
+            return redirect('login')
+        return view(request, *args, **kwargs)
+    return _view
@@ -0,0 +1,49 @@
+from django.utils.functional import SimpleLazyObject
+
+from dashboard.models import Empresa, EmpresaAtivaUsuario
+
+SESSAO_EMPRESA_ATIVA = "empresa_ativa_id"
+
+
+def obter_empresa_ativa(request):
+    """
+    Empresa ativa do usuário autenticado, ou None.
+
+    O id fica memorizado na sessão; só na primeira requisição da sessão
+    (ou se a empresa deixar de existir) o vínculo EmpresaAtivaUsuario é lido.
+    """
+    if not request.user.is_authenticated:
+        return None
+
+    empresa_id = request.session.get(SESSAO_EMPRESA_ATIVA)
+    if empresa_id:
+        empresa = Empresa.objects.filter(pk=empresa_id).first()
+        if empresa:
+            return empresa
+
+    ativa = EmpresaAtivaUsuario.objects.select_related("empresa").filter(usuario=request.user).first()
+    empresa = ativa.empresa if ativa else None
+    if empresa:
+        request.session[SESSAO_EMPRESA_ATIVA] = empresa.pk
+    return empresa
+
+
+def definir_empresa_ativa(request, empresa):
+    """Grava a empresa ativa do usuário e atualiza a sessão."""
+    EmpresaAtivaUsuario.objects.update_or_create(
+        usuario=request.user,
+        defaults={'empresa': empresa}
+    )
+    request.session[SESSAO_EMPRESA_ATIVA] = empresa.pk
+    request.empresa_ativa = empresa
+
+
+class EmpresaAtivaMiddleware:
+    """Disponibiliza ``request.empresa_ativa``, resolvida só quando usada."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.empresa_ativa = SimpleLazyObject(lambda: obter_empresa_ativa(request))
+        return self.get_response(request)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_empresaativausuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='versao_dados',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_empresa_versao_dados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50)),
+                ('intervalo_inicio', models.DateField()),
+                ('intervalo_fim', models.DateField()),
+                ('status', models.CharField(choices=[('concluido', 'Concluído'), ('falhou', 'Falhou')], max_length=10)),
+                ('inseridos', models.IntegerField(default=0)),
+                ('atualizados', models.IntegerField(default=0)),
+                ('erros', models.IntegerField(default=0)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('finalizado_em', models.DateTimeField()),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints_importacao', to='dashboard.empresa')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de importação',
+                'verbose_name_plural': 'Checkpoints de importação',
+                'constraints': [models.UniqueConstraint(fields=('job', 'empresa', 'intervalo_inicio', 'intervalo_fim'), name='checkpoint_importacao_unidade')],
+            },
+        ),
+    ]
@@ -13,11 +13,23 @@ class Empresa(models.Model):
     UF = models.CharField(max_length=2)
     CNPJ = models.CharField(max_length=20)
     ATIVO = models.BooleanField(default=True)
+    # Incrementada a cada alteração nos dados da empresa; compõe as chaves de cache (core.cache).
+    # Só muda por UPDATE com F('versao_dados') + 1 (core.cache.invalidar_empresas)
+    versao_dados = models.PositiveIntegerField(default=0, db_default=0, editable=False)
     usuarios = models.ManyToManyField(User, through='UsuarioEmpresa')
     
     def __str__(self):
         return self.RAZAOSOCIAL
 
+    def save(self, *args, **kwargs):
+        # Uma instância carregada antes de um incremento traria a versão antiga de volta
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'versao_dados'
+            ]
+        super().save(*args, **kwargs)
+
 class UsuarioEmpresa(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
@@ -36,4 +48,39 @@ class EmpresaAtivaUsuario(models.Model):
         verbose_name_plural = "Empresas ativas dos usuários"
 
     def __str__(self):
-        return f"{self.usuario.username} → {self.empresa.RAZAOSOCIAL if self.empresa else 'Nenhuma'}"
\ No newline at end of file
+        return f"{self.usuario.username} → {self.empresa.RAZAOSOCIAL if self.empresa else 'Nenhuma'}"
+
+class CheckpointImportacao(models.Model):
+    """
+    Unidade de trabalho (empresa e intervalo) concluída ou com falha na
+    última execução de um job de importação. Gravado pelos scripts em Jobs/
+    para que ``--resume`` refaça apenas o que faltou.
+    """
+    STATUS_CHOICES = (
+        ('concluido', 'Concluído'),
+        ('falhou', 'Falhou'),
+    )
+
+    job = models.CharField(max_length=50)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='checkpoints_importacao')
+    intervalo_inicio = models.DateField()
+    intervalo_fim = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    inseridos = models.IntegerField(default=0)
+    atualizados = models.IntegerField(default=0)
+    erros = models.IntegerField(default=0)
+    mensagem = models.TextField(blank=True, default='')
+    finalizado_em = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Checkpoint de importação"
+        verbose_name_plural = "Checkpoints de importação"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job', 'empresa', 'intervalo_inicio', 'intervalo_fim'],
+                name='checkpoint_importacao_unidade',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.job} - {self.empresa_id} ({self.intervalo_inicio} a {self.intervalo_fim}): {self.status}"
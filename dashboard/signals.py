@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from core.cache import invalidar_empresa
+from dashboard.context_processors import chave_empresas_usuario
+from dashboard.models import Empresa, UsuarioEmpresa
+
+
+def _invalidar_cache_empresa(sender, instance, **kwargs):
+    if instance.empresa_id:
+        invalidar_empresa(instance.empresa_id)
+
+
+def conectar_invalidacao(*modelos):
+    """Invalida o cache da empresa sempre que um registro dos modelos mudar."""
+    for modelo in modelos:
+        post_save.connect(_invalidar_cache_empresa, sender=modelo, dispatch_uid=f"invalidar_cache_{modelo._meta.label_lower}_save")
+        post_delete.connect(_invalidar_cache_empresa, sender=modelo, dispatch_uid=f"invalidar_cache_{modelo._meta.label_lower}_delete")
+
+
+def _invalidar_empresas_usuario(sender, instance, **kwargs):
+    cache.delete(chave_empresas_usuario(instance.usuario_id))
+
+
+def _invalidar_empresas_usuarios_da_empresa(sender, instance, **kwargs):
+    usuarios = UsuarioEmpresa.objects.filter(empresa=instance).values_list('usuario_id', flat=True)
+    cache.delete_many([chave_empresas_usuario(usuario_id) for usuario_id in usuarios])
+
+
+post_save.connect(_invalidar_empresas_usuario, sender=UsuarioEmpresa, dispatch_uid="invalidar_empresas_usuario_save")
+post_delete.connect(_invalidar_empresas_usuario, sender=UsuarioEmpresa, dispatch_uid="invalidar_empresas_usuario_delete")
+post_save.connect(_invalidar_empresas_usuarios_da_empresa, sender=Empresa, dispatch_uid="invalidar_empresas_usuarios_empresa_save")
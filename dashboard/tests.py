@@ -1,3 +1,153 @@
-from django.test import TestCase
+import sys
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase
+
+# Os jobs de importação são scripts soltos em Jobs/, sem pacote
+sys.path.insert(0, str(settings.BASE_DIR / "Jobs"))
+
+import intervals
+from intervals import plan_date_intervals, subtract_intervals
+
+try:
+    import psycopg2
+    from bulk_loader import copy_upsert, copy_upsert_isolated
+except ImportError:
+    psycopg2 = None
+
+
+@mock.patch.multiple(intervals, INTERVAL_TARGET_ROWS=100, INTERVAL_MIN_DAYS=1, INTERVAL_MAX_DAYS=30)
+class PlanDateIntervalsTests(SimpleTestCase):
+    def assertContiguous(self, janelas, inicio, fim):
+        # Mais recentes primeiro, sem lacunas nem sobreposição
+        self.assertEqual(janelas[0][1], fim)
+        self.assertEqual(janelas[-1][0], inicio)
+        for (anterior_inicio, _), (_, seguinte_fim) in zip(janelas, janelas[1:]):
+            self.assertEqual((anterior_inicio - seguinte_fim).days, 1)
+
+    def test_janela_pelo_volume_diario(self):
+        janelas = plan_date_intervals(date(2024, 1, 1), date(2024, 1, 31), rows_per_day=10)
+        self.assertEqual(janelas[0], (date(2024, 1, 22), date(2024, 1, 31)))
+        self.assertEqual(len(janelas), 4)
+        self.assertEqual(janelas[-1], (date(2024, 1, 1), date(2024, 1, 1)))
+        self.assertContiguous(janelas, date(2024, 1, 1), date(2024, 1, 31))
+
+    def test_sem_volume_usa_a_janela_maxima(self):
+        janelas = plan_date_intervals(date(2024, 1, 1), date(2024, 3, 1), rows_per_day=0)
+        self.assertEqual([(fim - inicio).days + 1 for inicio, fim in janelas], [30, 30, 1])
+        self.assertContiguous(janelas, date(2024, 1, 1), date(2024, 3, 1))
+
+    def test_volume_alto_usa_a_janela_minima(self):
+        janelas = plan_date_intervals(date(2024, 1, 1), date(2024, 1, 5), rows_per_day=1000)
+        self.assertEqual(janelas, [(date(2024, 1, d), date(2024, 1, d)) for d in range(5, 0, -1)])
+
+    def test_periodo_de_um_dia(self):
+        self.assertEqual(
+            plan_date_intervals(date(2024, 1, 1), date(2024, 1, 1), rows_per_day=1),
+            [(date(2024, 1, 1), date(2024, 1, 1))],
+        )
+
+
+class SubtractIntervalsTests(SimpleTestCase):
+    PERIODO = (date(2024, 1, 1), date(2024, 1, 31))
+
+    def test_sem_concluidos(self):
+        self.assertEqual(subtract_intervals(self.PERIODO, set()), [self.PERIODO])
+
+    def test_tudo_concluido(self):
+        self.assertEqual(subtract_intervals(self.PERIODO, {self.PERIODO}), [])
+
+    def test_lacunas_entre_concluidos(self):
+        concluidos = {(date(2024, 1, 21), date(2024, 1, 31)), (date(2024, 1, 5), date(2024, 1, 10))}
+        self.assertEqual(
+            subtract_intervals(self.PERIODO, concluidos),
+            [(date(2024, 1, 1), date(2024, 1, 4)), (date(2024, 1, 11), date(2024, 1, 20))],
+        )
+
+    def test_concluidos_sobrepostos_e_fora_do_periodo(self):
+        concluidos = {
+            (date(2023, 12, 1), date(2023, 12, 31)),
+            (date(2023, 12, 20), date(2024, 1, 10)),
+            (date(2024, 1, 5), date(2024, 1, 15)),
+            (date(2024, 2, 1), date(2024, 2, 28)),
+        }
+        self.assertEqual(subtract_intervals(self.PERIODO, concluidos), [(date(2024, 1, 16), date(2024, 1, 31))])
+
+    def test_janelas_planejadas_voltam_a_cobrir_o_periodo(self):
+        janelas = plan_date_intervals(*self.PERIODO, rows_per_day=50)
+        self.assertEqual(subtract_intervals(self.PERIODO, janelas[1:]), [janelas[0]])
+
+
+@skipUnless(psycopg2 and connection.vendor == "postgresql", "os jobs usam psycopg2 e PostgreSQL")
+class BulkLoaderTests(SimpleTestCase):
+    """copy_upsert em uma tabela temporária, descartada no rollback de cada teste."""
+
+    COLUNAS = ["codigo", "nome", "n"]
+
+    def setUp(self):
+        dados = connection.settings_dict
+        self.conexao = psycopg2.connect(
+            dbname=dados["NAME"], user=dados["USER"], password=dados["PASSWORD"],
+            host=dados["HOST"] or None, port=dados["PORT"] or None,
+        )
+        self.addCleanup(self.conexao.close)
+        self.addCleanup(self.conexao.rollback)
+        self.executar("""
+            CREATE TEMP TABLE carga (
+                codigo varchar(10) PRIMARY KEY,
+                nome varchar(5),
+                n integer,
+                criado_em timestamp
+            )
+        """)
+
+    def executar(self, sql):
+        with self.conexao.cursor() as cursor:
+            cursor.execute(sql)
+            if cursor.description:
+                return cursor.fetchall()
+
+    def carregar(self, linhas, **opcoes):
+        return copy_upsert(self.conexao, "carga", self.COLUNAS, linhas, ["codigo"], **opcoes)
+
+    def tabela(self):
+        return {codigo: (nome, n) for codigo, nome, n in self.executar("SELECT codigo, nome, n FROM carga")}
+
+    def test_conta_inseridos_e_atualizados(self):
+        self.assertEqual(self.carregar([("a", "A", 1), ("b", "B", 2), ("c", "C", 3)]), (3, 0))
+        self.assertEqual(self.carregar([("b", "B2", 20), ("c", "C2", 30), ("d", "D", 4)]), (1, 2))
+        self.assertEqual(
+            self.tabela(),
+            {"a": ("A", 1), "b": ("B2", 20), "c": ("C2", 30), "d": ("D", 4)},
+        )
+
+    def test_chave_repetida_fica_com_a_ultima_linha(self):
+        self.assertEqual(self.carregar([("a", "A1", 1), ("b", "B", 2), ("a", "A2", 3)]), (2, 0))
+        self.assertEqual(self.tabela(), {"a": ("A2", 3), "b": ("B", 2)})
+
+    def test_sem_linhas(self):
+        self.assertEqual(self.carregar([]), (0, 0))
+
+    def test_update_columns_vazio_nao_altera_existentes(self):
+        self.carregar([("a", "A", 1)])
+        self.assertEqual(self.carregar([("a", "X", 9), ("b", "B", 2)], update_columns=[]), (1, 0))
+        self.assertEqual(self.tabela(), {"a": ("A", 1), "b": ("B", 2)})
+
+    def test_expressoes_de_insert_e_update(self):
+        self.carregar([("a", "A", 1)], insert_expressions={"criado_em": "NOW()"})
+        self.carregar([("a", "A", 5)], update_expressions={"n": "carga.n + EXCLUDED.n"})
+        self.assertEqual(self.tabela(), {"a": ("A", 6)})
+        self.assertEqual(self.executar("SELECT COUNT(*) FROM carga WHERE criado_em IS NOT NULL"), [(1,)])
+
+    def test_isolado_descarta_so_a_linha_recusada(self):
+        linhas = [("a", "A", 1), ("b", "B", 2), ("c", "longo demais", 3), ("d", "D", 4), ("e", "E", 5)]
+        with self.assertLogs("bulk_loader", "ERROR"):
+            contagem = copy_upsert_isolated(self.conexao, "carga", self.COLUNAS, linhas, ["codigo"], batch_rows=4)
+        self.assertEqual(contagem, (4, 0, 1))
+        self.assertEqual(sorted(self.tabela()), ["a", "b", "d", "e"])
+
+        # A transação do chamador continua utilizável depois da recusa
+        self.assertEqual(self.carregar([("a", "A2", 10)]), (0, 1))
@@ -1,31 +1,42 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from dashboard.models import EmpresaAtivaUsuario, UsuarioEmpresa, Empresa
+from dashboard.decorators import empresa_ativa_requerida
+from dashboard.middleware import definir_empresa_ativa
+from dashboard.models import UsuarioEmpresa, Empresa
 from funcionarios.models import Funcionario
 from datetime import timedelta, date
-from django.db.models import Count, Sum, F
+from django.db.models import Count, Sum, F, Q
 from absenteismo.models import Absenteismo
+from core.cache import obter_ou_calcular
 
 @login_required
+@empresa_ativa_requerida
 def dashboard(request):
-    try:
-        empresa_ativa = EmpresaAtivaUsuario.objects.get(usuario=request.user).empresa
-    except EmpresaAtivaUsuario.DoesNotExist:
-        return redirect('login')
+    empresa_ativa = request.empresa_ativa
 
     funcionarios = Funcionario.objects.filter(
         empresa=empresa_ativa
     ).exclude(NOME__istartswith='nomegenerico')
-
-    total_funcionarios = funcionarios.count()
-    total_ferias = funcionarios.filter(SITUACAO="Férias").count()
-    total_afastados = funcionarios.filter(SITUACAO="Afastado").count()
     sem_matricula = funcionarios.filter(MATRICULAFUNCIONARIO__startswith='semmatricula')
 
+    headcount = obter_ou_calcular(
+        "headcount", empresa_ativa,
+        lambda: funcionarios.aggregate(
+            total=Count('id'),
+            ferias=Count('id', filter=Q(SITUACAO="Férias")),
+            afastados=Count('id', filter=Q(SITUACAO="Afastado")),
+            sem_matricula=Count('id', filter=Q(MATRICULAFUNCIONARIO__startswith='semmatricula')),
+        ),
+    )
+    total_funcionarios = headcount['total']
+    total_ferias = headcount['ferias']
+    total_afastados = headcount['afastados']
+    total_sem_matricula = headcount['sem_matricula']
+
     perc_ferias = round((total_ferias / total_funcionarios) * 100, 1) if total_funcionarios else 0
     perc_afastados = round((total_afastados / total_funcionarios) * 100, 1) if total_funcionarios else 0
-    perc_sem_matricula = round((sem_matricula.count() / total_funcionarios) * 100, 1) if total_funcionarios else 0
+    perc_sem_matricula = round((total_sem_matricula / total_funcionarios) * 100, 1) if total_funcionarios else 0
 
     filtro_periodo = request.GET.get('periodo', 'semestre')
     dias_por_periodo = {
@@ -84,7 +95,7 @@ def dashboard(request):
                 "perc_ferias": perc_ferias,
                 "total_afastados": total_afastados,
                 "perc_afastados": perc_afastados,
-                "total_sem_matricula": sem_matricula.count(),
+                "total_sem_matricula": total_sem_matricula,
                 "perc_sem_matricula": perc_sem_matricula,
                 "colaboradores_sem_matricula": sem_matricula,
                 "hiperatestadistas": hiperatestadistas,
@@ -108,9 +119,6 @@ def trocar_empresa(request):
     if not UsuarioEmpresa.objects.filter(usuario=request.user, empresa=empresa).exists():
         return redirect('dashboard')
 
-    EmpresaAtivaUsuario.objects.update_or_create(
-        usuario=request.user,
-        defaults={'empresa': empresa}
-    )
+    definir_empresa_ativa(request, empresa)
 
     return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
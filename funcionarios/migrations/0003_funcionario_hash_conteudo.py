@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funcionarios', '0002_alter_funcionario_bairro_alter_funcionario_cbocargo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcionario',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+    ]
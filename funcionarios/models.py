@@ -70,6 +70,10 @@ class Funcionario(models.Model):
     REGIMETRABALHO = models.CharField(max_length=500, null=True, blank=True)
     TELCOMERCIAL = models.CharField(max_length=20, null=True, blank=True)
     TURNOTRABALHO = models.IntegerField(null=True, blank=True)
+
+    # MD5 dos dados recebidos da API na última importação (Jobs/ImportarFuncionarios.py).
+    # Limpo a cada save() local, para que a próxima importação regrave o registro
+    hash_conteudo = models.CharField(max_length=32, null=True, blank=True, editable=False)
     
     class Meta:
         unique_together = ['CODIGOEMPRESA', 'CODIGO']
@@ -78,6 +82,11 @@ class Funcionario(models.Model):
         if self.empresa:
             self.CODIGOEMPRESA = self.empresa.CODIGO
             self.NOMEEMPRESA = self.empresa.RAZAOSOCIAL
+        # O registro deixou de ser o que a API enviou
+        self.hash_conteudo = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'hash_conteudo'}
         super().save(*args, **kwargs)
         
     def __str__(self):
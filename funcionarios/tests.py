@@ -1,3 +1,39 @@
+from datetime import date
+
 from django.test import TestCase
 
-# Create your tests here.
+from dashboard.models import Empresa
+from funcionarios.models import Funcionario
+
+
+class HashConteudoTests(TestCase):
+    """Alterações locais descartam o hash da última importação."""
+
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(
+            CODIGO="100", RAZAOSOCIAL="Empresa 100", ENDERECO="Rua A",
+            NUMEROENDERECO="1", COMPLEMENTOENDERECO="", BAIRRO="Centro",
+            CIDADE="Cidade", CEP="00000000", UF="SP", CNPJ="00000000000100",
+        )
+        cls.funcionario = Funcionario.objects.create(
+            empresa=empresa, CODIGO="1", NOME="Funcionario 1", CPF="00000000001",
+            SEXO=1, DATA_NASCIMENTO=date(1990, 1, 1), DATA_ADMISSAO=date(2015, 1, 1),
+        )
+
+    def setUp(self):
+        # Como se o job tivesse gravado o registro
+        Funcionario.objects.filter(pk=self.funcionario.pk).update(hash_conteudo="a" * 32)
+        self.funcionario.refresh_from_db()
+
+    def test_save_limpa_o_hash(self):
+        self.funcionario.NOME = "Outro nome"
+        self.funcionario.save()
+        self.assertIsNone(Funcionario.objects.get(pk=self.funcionario.pk).hash_conteudo)
+
+    def test_save_com_update_fields_limpa_o_hash(self):
+        self.funcionario.NOME = "Outro nome"
+        self.funcionario.save(update_fields=["NOME"])
+        funcionario = Funcionario.objects.get(pk=self.funcionario.pk)
+        self.assertEqual(funcionario.NOME, "Outro nome")
+        self.assertIsNone(funcionario.hash_conteudo)
@@ -1,17 +1,15 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from dashboard.models import EmpresaAtivaUsuario
+from dashboard.decorators import empresa_ativa_requerida
 from .models import Funcionario
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 from django.db.models import Q
 
 @login_required
+@empresa_ativa_requerida
 def funcionarios(request):
-    try:
-        empresa_ativa = EmpresaAtivaUsuario.objects.get(usuario=request.user).empresa
-    except EmpresaAtivaUsuario.DoesNotExist:
-        return redirect('login')
+    empresa_ativa = request.empresa_ativa
         
     busca = request.GET.get('q', '')
     situacao = request.GET.get('situacao', '')
@@ -56,11 +54,9 @@ def funcionarios(request):
 
 
 @login_required
+@empresa_ativa_requerida
 def detalhes_funcionario(request, id):
-    try:
-        empresa_ativa = EmpresaAtivaUsuario.objects.get(usuario=request.user).empresa
-    except EmpresaAtivaUsuario.DoesNotExist:
-        return redirect('login')
+    empresa_ativa = request.empresa_ativa
         
     funcionario = Funcionario.objects.get(id=id, empresa=empresa_ativa)
     
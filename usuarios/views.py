@@ -5,7 +5,8 @@ from django.contrib.messages import constants
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login
 from django.contrib import auth
-from dashboard.models import UsuarioEmpresa, EmpresaAtivaUsuario
+from dashboard.middleware import definir_empresa_ativa
+from dashboard.models import UsuarioEmpresa
 
 def login(request):
     if request.user.is_authenticated:
@@ -28,10 +29,7 @@ def login(request):
                 return redirect('login')
 
             empresa_padrao = vinculos.first().empresa
-            EmpresaAtivaUsuario.objects.update_or_create(
-                usuario=user,
-                defaults={'empresa': empresa_padrao}
-            )
+            definir_empresa_ativa(request, empresa_padrao)
 
             return redirect('/dashboard/')
         